@@ -0,0 +1,85 @@
+"""
+asyncio execution mode for the API-bound pipeline calls (ASYNC_IO_ENABLED).
+
+Each worker process runs one event loop in a background thread. Transcription,
+embedding and chat-completion requests are coroutines on that loop, sharing
+pooled AsyncOpenAI/httpx clients, so a process can keep hundreds of requests
+in flight instead of one per prefork child. Blocking callers (Celery tasks on
+a `threads` pool) hand coroutines over with run() / submit().
+
+Concurrency per provider is capped by ASYNC_PROVIDER_CONCURRENCY; requests
+beyond it wait on the provider's semaphore instead of opening connections.
+"""
+import asyncio
+import os
+import threading
+import logging
+import openai
+import httpx
+from .constants import ASYNC_PROVIDER_CONCURRENCY, LLM_BASE_URL
+
+logger = logging.getLogger(__name__)
+
+PROVIDER_BASE_URLS = {
+    "openai": None,
+    "openrouter": LLM_BASE_URL,
+}
+
+_lock = threading.Lock()
+_loop = None
+_loop_pid = None
+_clients = {}
+_semaphores = {}
+
+
+def _run_loop(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def get_loop():
+    """This process's event loop, started on first use (and again after a fork)."""
+    global _loop, _loop_pid
+    with _lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            _clients.clear()
+            _semaphores.clear()
+            threading.Thread(target=_run_loop, args=(_loop,), name="aio-loop", daemon=True).start()
+        return _loop
+
+
+def submit(coro):
+    """Schedules `coro` on the loop; returns a concurrent.futures.Future (cancel() cancels the coroutine)."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run(coro, timeout=None):
+    """Runs `coro` on the loop and blocks the calling thread for its result."""
+    return submit(coro).result(timeout)
+
+
+def client(provider, api_key):
+    """
+    Pooled AsyncOpenAI client per (provider, api_key). Only call from
+    coroutines running on the loop.
+    """
+    key = (provider, api_key)
+    if key not in _clients:
+        limit = ASYNC_PROVIDER_CONCURRENCY[provider]
+        _clients[key] = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=PROVIDER_BASE_URLS[provider],
+            http_client=openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit),
+            ),
+        )
+    return _clients[key]
+
+
+def limit(provider):
+    """Semaphore capping in-flight requests to `provider` in this process."""
+    if provider not in _semaphores:
+        _semaphores[provider] = asyncio.Semaphore(ASYNC_PROVIDER_CONCURRENCY[provider])
+    return _semaphores[provider]
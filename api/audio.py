@@ -0,0 +1,281 @@
+"""
+FFmpeg/NumPy audio helpers for the transcription stage.
+"""
+import os
+import re
+import subprocess
+import tempfile
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SILENCE_START_RE = re.compile(r"silence_start:\s*(-?[\d.]+)")
+_SILENCE_END_RE = re.compile(r"silence_end:\s*(-?[\d.]+)")
+_WORD_RE = re.compile(r"[\w']+")
+
+
+def probe_duration(path):
+    """Duration of an audio file in seconds (ffprobe)."""
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1", path,
+        ],
+        capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip())
+
+
+def detect_silences(path, noise_db=-35, min_silence=0.4):
+    """(start, end) seconds of every silence FFmpeg's silencedetect finds."""
+    result = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-nostats", "-i", path,
+            "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}",
+            "-f", "null", "-",
+        ],
+        capture_output=True, text=True,
+    )
+    silences = []
+    start = None
+    for line in result.stderr.splitlines():
+        match = _SILENCE_START_RE.search(line)
+        if match:
+            start = max(0.0, float(match.group(1)))
+            continue
+        match = _SILENCE_END_RE.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+
+def plan_segments(duration, silences, target, overlap, search_window=None):
+    """
+    Splits [0, duration] into ~`target`-second segments. Each cut goes to the
+    middle of the silence nearest the ideal cut point (within `search_window`
+    seconds, default a quarter of `target`), or exactly on it when there is
+    none. Consecutive segments overlap by `overlap` seconds so no word is lost
+    at a hard cut; stitch_transcripts removes the duplicated words.
+    """
+    if search_window is None:
+        search_window = target / 4
+    midpoints = [(s + e) / 2 for s, e in silences]
+    segments = []
+    start = 0.0
+    while duration - start > target + search_window:
+        ideal = start + target
+        nearby = [m for m in midpoints if abs(m - ideal) <= search_window and m > start + overlap]
+        cut = min(nearby, key=lambda m: abs(m - ideal)) if nearby else ideal
+        segments.append((start, min(duration, cut + overlap)))
+        start = cut
+    segments.append((start, duration))
+    return segments
+
+
+def split_audio(path, segments, out_dir=None):
+    """Writes each (start, end) segment of `path` to its own file (stream copy)."""
+    _, ext = os.path.splitext(path)
+    paths = []
+    try:
+        for start, end in segments:
+            out_path = tempfile.mktemp(suffix=ext, dir=out_dir or os.path.dirname(path))
+            subprocess.run(
+                [
+                    "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+                    "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}",
+                    "-i", path, "-c", "copy", out_path,
+                ],
+                check=True,
+            )
+            paths.append(out_path)
+    except Exception:
+        remove_files(paths)
+        raise
+    return paths
+
+
+def decode_pcm(path, sample_rate=16000):
+    """Decodes any audio file to mono int16 PCM at `sample_rate`."""
+    result = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-i", path,
+            "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-",
+        ],
+        capture_output=True, check=True,
+    )
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+
+def encode_pcm(samples, out_path, sample_rate=16000, bitrate=32):
+    """Encodes mono int16 PCM to `out_path` (codec chosen by its extension)."""
+    subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+            "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-i", "-",
+            "-b:a", f"{bitrate}k", out_path,
+        ],
+        input=samples.tobytes(), check=True,
+    )
+    return out_path
+
+
+def _runs(mask):
+    """(start, end) index pairs of the True runs in a boolean array."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def detect_speech(samples, sample_rate=16000, frame_ms=30, energy_margin_db=12.0,
+                  min_energy_db=-55.0, zcr_threshold=0.25, padding_ms=300,
+                  min_gap_ms=600, min_speech_ms=150):
+    """
+    Vectorized energy / zero-crossing-rate VAD. A frame is speech when its
+    energy is `energy_margin_db` above the noise floor (10th percentile), or
+    when it's within 10 dB of that and has a high zero-crossing rate
+    (unvoiced consonants). The mask is then cleaned up: speech bursts shorter
+    than `min_speech_ms` are dropped, gaps shorter than `min_gap_ms` are
+    filled and every span is padded by `padding_ms`.
+    Returns a list of (start, end) speech spans in seconds.
+    """
+    frame = int(sample_rate * frame_ms / 1000)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return [(0.0, len(samples) / sample_rate)] if len(samples) else []
+    frames = samples[:n_frames * frame].reshape(n_frames, frame).astype(np.float32) / 32768.0
+
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+
+    threshold = max(np.percentile(energy_db, 10) + energy_margin_db, min_energy_db)
+    speech = (energy_db > threshold) | (
+        (energy_db > threshold - 10) & (zcr > zcr_threshold)
+    )
+
+    starts, ends = _runs(speech)
+    short = (ends - starts) * frame_ms < min_speech_ms
+    for s, e in zip(starts[short], ends[short]):
+        speech[s:e] = False
+    starts, ends = _runs(~speech)
+    short_gap = ((ends - starts) * frame_ms < min_gap_ms) & (starts > 0) & (ends < n_frames)
+    for s, e in zip(starts[short_gap], ends[short_gap]):
+        speech[s:e] = True
+
+    pad = int(padding_ms / frame_ms)
+    if pad:
+        speech = np.convolve(speech, np.ones(2 * pad + 1, dtype=np.int8), mode="same") > 0
+
+    starts, ends = _runs(speech)
+    seconds = frame / sample_rate
+    total = len(samples) / sample_rate
+    return [(float(s * seconds), float(min(total, e * seconds))) for s, e in zip(starts, ends)]
+
+
+def trim_to_speech(path, out_path=None, sample_rate=16000, bitrate=32, **vad_options):
+    """
+    Cuts non-speech spans out of an audio file before upload.
+    Returns (out_path, timestamp_map, stats) where timestamp_map is a list of
+    [trimmed_start, original_start, duration] entries (see to_original_time)
+    and stats reports original/kept seconds and bytes.
+    """
+    samples = decode_pcm(path, sample_rate)
+    spans = detect_speech(samples, sample_rate, **vad_options)
+    timestamp_map = []
+    pieces = []
+    position = 0.0
+    for start, end in spans:
+        timestamp_map.append([round(position, 3), round(start, 3), round(end - start, 3)])
+        pieces.append(samples[int(start * sample_rate):int(end * sample_rate)])
+        position += end - start
+
+    out_path = out_path or tempfile.mktemp(suffix=os.path.splitext(path)[1], dir=os.path.dirname(path))
+    kept = np.concatenate(pieces) if pieces else samples[:0]
+    encode_pcm(kept, out_path, sample_rate, bitrate)
+    stats = {
+        "original_seconds": len(samples) / sample_rate,
+        "kept_seconds": len(kept) / sample_rate,
+        "original_bytes": os.path.getsize(path),
+        "trimmed_bytes": os.path.getsize(out_path),
+    }
+    return out_path, timestamp_map, stats
+
+
+def to_original_time(seconds, timestamp_map):
+    """Maps an offset in trimmed audio back to the original audio."""
+    for trimmed_start, original_start, duration in reversed(timestamp_map or []):
+        if seconds >= trimmed_start:
+            return original_start + min(seconds - trimmed_start, duration)
+    return seconds
+
+
+def _normalize_words(words):
+    # Per whitespace token, so indexes line up with the original words
+    return ["".join(_WORD_RE.findall(w)).lower() for w in words]
+
+
+def stitch_transcripts(texts, max_overlap_words=40, min_overlap_words=2):
+    """
+    Joins per-segment transcripts, dropping the words at the start of each
+    segment that repeat the end of the previous one (the audio overlap).
+    Matching ignores case and punctuation. Returns (text, spans) where spans
+    holds each segment's (start, end) character range in the joined text.
+    """
+    stitched = []
+    spans = []
+    length = 0
+    previous = []
+    for text in texts:
+        words = text.split()
+        normalized = _normalize_words(words)
+        current = normalized
+        limit = min(max_overlap_words, len(previous), len(normalized))
+        for k in range(limit, min_overlap_words - 1, -1):
+            if previous[-k:] == normalized[:k]:
+                words = words[k:]
+                break
+        start = length + (1 if stitched and words else 0)
+        if words:
+            stitched.append(" ".join(words))
+            length = start + len(stitched[-1])
+        spans.append((start, length if words else start))
+        previous = current
+    return " ".join(stitched), spans
+
+
+def transcript_segments(spans, segments, timestamp_map=None):
+    """
+    [char_start, char_end, start_seconds, end_seconds] per transcribed
+    segment: where its text sits in the transcript, and where its audio
+    sits in the original (untrimmed) file. The overlap stitch_transcripts
+    dropped is left out of each segment's time range too.
+    """
+    result = []
+    previous_end = 0.0
+    for (char_start, char_end), (start, end) in zip(spans, segments):
+        start = max(start, previous_end)
+        previous_end = end
+        result.append([
+            char_start, char_end,
+            round(to_original_time(start, timestamp_map), 3),
+            round(to_original_time(end, timestamp_map), 3),
+        ])
+    return result
+
+
+def transcript_time(offset, segments):
+    """Original-audio second a transcript character offset was spoken at (approximate), or None."""
+    if not segments:
+        return None
+    for char_start, char_end, start, end in segments:
+        if offset < char_end:
+            break
+    fraction = min(max((offset - char_start) / max(char_end - char_start, 1), 0.0), 1.0)
+    return round(start + fraction * (end - start), 3)
+
+
+def remove_files(paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,130 @@
+"""
+In-process micro-batching for API calls that accept many inputs at once
+(embeddings). Concurrent callers (task threads, web request threads) add
+their inputs to a shared queue; a flusher thread waits up to `max_wait`
+seconds for more to arrive, sends one batched request per key and fans the
+results back out to the waiting callers.
+"""
+import os
+import time
+import threading
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    __slots__ = ("key", "items", "weight", "future", "enqueued_at")
+
+    def __init__(self, key, items, weight):
+        self.key = key
+        self.items = items
+        self.weight = weight
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """
+    `send(key, items)` must return one result per item, in order (anything
+    indexable). Requests only share a batch when their `key` is equal (e.g.
+    the API key). A batch is flushed when the oldest request has waited
+    `max_wait` seconds or adding the next request would exceed `max_items`
+    items or `max_weight` (sum of `weight(item)`); a single request larger
+    than the caps is sent on its own. Up to `max_concurrency` batches are in
+    flight at once.
+    """
+
+    def __init__(self, send, max_wait=0.005, max_items=2048, max_weight=None, weight=None,
+                 max_concurrency=4, name="batcher"):
+        self.send = send
+        self.max_wait = max_wait
+        self.max_items = max_items
+        self.max_weight = max_weight
+        self.weight = weight or (lambda item: 1)
+        self.max_concurrency = max_concurrency
+        self.name = name
+        self._executor = None
+        self._cond = threading.Condition()
+        self._queue = []
+        self._pid = None
+
+    def submit(self, items, key=None):
+        """Queues `items`; returns a Future resolving to their results (a list)."""
+        items = list(items)
+        request = _Request(key, items, sum(self.weight(item) for item in items))
+        if not items:
+            request.future.set_result([])
+            return request.future
+        with self._cond:
+            self._ensure_flusher()
+            self._queue.append(request)
+            self._cond.notify()
+        return request.future
+
+    def __call__(self, items, key=None, timeout=None):
+        return self.submit(items, key).result(timeout)
+
+    def _ensure_flusher(self):
+        # Started lazily, and again in a forked child (threads don't survive fork)
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._queue = []
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix=self.name)
+            threading.Thread(target=self._run, name=self.name, daemon=True).start()
+
+    def _take_batch(self):
+        """Removes and returns the requests of the next batch (call with the lock held)."""
+        key = self._queue[0].key
+        batch, items, weight = [], 0, 0
+        for request in self._queue:
+            if request.key != key:
+                continue
+            over = (
+                items + len(request.items) > self.max_items
+                or (self.max_weight is not None and weight + request.weight > self.max_weight)
+            )
+            if batch and over:
+                break
+            batch.append(request)
+            items += len(request.items)
+            weight += request.weight
+        self._queue = [r for r in self._queue if r not in batch]
+        return key, batch
+
+    def _is_full(self):
+        key = self._queue[0].key
+        same_key = [r for r in self._queue if r.key == key]
+        return (
+            sum(len(r.items) for r in same_key) >= self.max_items
+            or (self.max_weight is not None and sum(r.weight for r in same_key) >= self.max_weight)
+        )
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                deadline = self._queue[0].enqueued_at + self.max_wait
+                while not self._is_full():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                key, batch = self._take_batch()
+            self._executor.submit(self._flush, key, batch)
+
+    def _flush(self, key, batch):
+        items = [item for request in batch for item in request.items]
+        try:
+            results = self.send(key, items)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        logger.info(f"{self.name}: sent {len(items)} inputs from {len(batch)} callers in one request")
+        offset = 0
+        for request in batch:
+            request.future.set_result(list(results[offset:offset + len(request.items)]))
+            offset += len(request.items)
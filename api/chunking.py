@@ -0,0 +1,114 @@
+"""
+Token-aware, content-defined chunking of transcripts for embedding.
+
+Chunks are (start, end) offsets into the original string; text is only
+sliced once per chunk. Boundaries fall on sentence ends (or between words
+inside sentences too long for one chunk). Whether a chunk ends after a
+given sentence depends only on that sentence's own text and the running
+token count, not on its absolute position, so an edit only moves the
+boundaries next to it: re-chunking an edited transcript yields the same
+chunks, and the same chunk hashes, for the unchanged regions.
+"""
+import re
+import zlib
+import hashlib
+from collections import namedtuple
+import tiktoken
+from .constants import EMBEDDING_MODEL, EMBEDDING_MODEL_MAX_TOKENS
+
+Chunk = namedtuple("Chunk", ["start", "end", "text", "tokens", "hash"])
+
+_SENTENCE_RE = re.compile(r"\S.*?(?:[.!?]+[\"')\]]*(?=\s)|\n|$)", re.DOTALL)
+_WORD_RE = re.compile(r"\S+")
+
+_encoding = None
+
+
+def get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.encoding_for_model(EMBEDDING_MODEL)
+    return _encoding
+
+
+def count_tokens(text):
+    return len(get_encoding().encode_ordinary(text))
+
+
+def chunk_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def truncate_to_tokens(text, max_tokens=EMBEDDING_MODEL_MAX_TOKENS):
+    """`text` cut to at most `max_tokens` tokens (unchanged if it fits)."""
+    tokens = get_encoding().encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return get_encoding().decode(tokens[:max_tokens])
+
+
+def _units(text, max_unit_tokens):
+    """(start, end, tokens) of each sentence; over-long sentences are split into words."""
+    for match in _SENTENCE_RE.finditer(text):
+        start, end = match.start(), match.end()
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        tokens = count_tokens(text[start:end])
+        if tokens <= max_unit_tokens:
+            yield start, end, tokens
+            continue
+        for word in _WORD_RE.finditer(text, start, end):
+            yield word.start(), word.end(), count_tokens(word.group())
+
+
+def _is_cut_point(unit_text, unit_tokens, expected_tokens):
+    # Cut with probability unit_tokens / expected_tokens, decided by the
+    # unit's content (crc32 is stable across processes, unlike hash()).
+    return zlib.crc32(unit_text.encode("utf-8")) % 10_000 < 10_000 * unit_tokens / expected_tokens
+
+
+def chunk_spans(text, target_tokens=300, overlap_tokens=50, max_tokens=None):
+    """
+    Splits `text` into chunks of ~`target_tokens` (at least half that, at
+    most `max_tokens`, default 2x target capped by the embedding model's
+    limit). Each chunk is prefixed with up to `overlap_tokens` of the
+    sentences before it. Returns a list of Chunk(start, end, text, tokens, hash).
+    """
+    if max_tokens is None:
+        max_tokens = min(2 * target_tokens, EMBEDDING_MODEL_MAX_TOKENS)
+    max_tokens = min(max_tokens, EMBEDDING_MODEL_MAX_TOKENS - overlap_tokens)
+    min_tokens = target_tokens // 2
+    units = list(_units(text, max_tokens // 2))
+
+    groups = []  # (first unit, last unit) per chunk, before overlap
+    first = 0
+    tokens = 0
+    for i, (start, end, unit_tokens) in enumerate(units):
+        tokens += unit_tokens
+        last = i == len(units) - 1
+        next_tokens = 0 if last else units[i + 1][2]
+        if (
+            last
+            or tokens + next_tokens > max_tokens
+            or (tokens >= min_tokens and _is_cut_point(text[start:end], unit_tokens, target_tokens - min_tokens))
+        ):
+            groups.append((first, i))
+            first = i + 1
+            tokens = 0
+
+    chunks = []
+    for first, last in groups:
+        # Overlap: whole preceding units, as long as they fit the budget
+        lead = first
+        overlap = 0
+        while lead > 0 and overlap + units[lead - 1][2] <= overlap_tokens:
+            lead -= 1
+            overlap += units[lead][2]
+        start, end = units[lead][0], units[last][1]
+        chunk_text = text[start:end]
+        chunks.append(Chunk(
+            start, end, chunk_text,
+            overlap + sum(u[2] for u in units[first:last + 1]),
+            chunk_hash(chunk_text),
+        ))
+    return chunks
@@ -1,6 +1,8 @@
 from django.conf import settings
 
 EMBEDDING_MODEL="text-embedding-3-small"
+EMBEDDING_MODEL_MAX_TOKENS=8191
+EMBEDDING_DIMENSIONS=1536
 TRANSCRIPTION_MODEL="whisper-1"
 AI_MODELS=[
         "mistralai/mistral-small-3.2-24b-instruct:free",
@@ -9,6 +11,7 @@ AI_MODELS=[
         "google/gemma-3-12b-it:free",
         "deepseek/deepseek-r1-0528:free"
     ]
+LLM_BASE_URL="https://openrouter.ai/api/v1"
 
 OPENAI_API_KEY = settings.OPENAI_API_KEY
 OPENROUTER_API_KEY = settings.OPENROUTER_API_KEY
@@ -19,4 +22,63 @@ SUPABASE_KEY = settings.SUPABASE_KEY
 SUPABASE_ANON_KEY = settings.SUPABASE_ANON_KEY
 SUPBASE_ISSUER    = f"{SUPABASE_URL}/auth/v1"
 COOKIE_LOCAL_PATH = settings.COOKIE_LOCAL_PATH
-COOKIE_STORAGE_PATH = settings.COOKIE_STORAGE_PATH
\ No newline at end of file
+COOKIE_STORAGE_PATH = settings.COOKIE_STORAGE_PATH
+CLIP_WORK_DIR = settings.CLIP_WORK_DIR
+CLIP_STAGE_MAX_RETRIES = settings.CLIP_STAGE_MAX_RETRIES
+CLIP_STAGE_RETRY_BACKOFF = settings.CLIP_STAGE_RETRY_BACKOFF
+CLIP_STAGE_RETRY_BACKOFF_MAX = settings.CLIP_STAGE_RETRY_BACKOFF_MAX
+
+REDIS_URL = settings.REDIS_URL
+CLIP_SINGLE_FLIGHT_TTL = settings.CLIP_SINGLE_FLIGHT_TTL
+CLIP_SINGLE_FLIGHT_POLL = settings.CLIP_SINGLE_FLIGHT_POLL
+EMBEDDING_CACHE_REDIS_TTL = settings.EMBEDDING_CACHE_REDIS_TTL
+SUBTITLES_FIRST = settings.SUBTITLES_FIRST
+SUBTITLE_LANGUAGES = settings.SUBTITLE_LANGUAGES
+CLIP_AUDIO_PROFILE = settings.CLIP_AUDIO_PROFILE
+CLIP_AUDIO_PROFILES = settings.CLIP_AUDIO_PROFILES
+TRANSCRIPTION_SEGMENT_SECONDS = settings.TRANSCRIPTION_SEGMENT_SECONDS
+TRANSCRIPTION_SEGMENT_OVERLAP = settings.TRANSCRIPTION_SEGMENT_OVERLAP
+TRANSCRIPTION_MAX_WORKERS = settings.TRANSCRIPTION_MAX_WORKERS
+TRANSCRIPTION_MAX_UPLOAD_BYTES = settings.TRANSCRIPTION_MAX_UPLOAD_BYTES
+VAD_ENABLED = settings.VAD_ENABLED
+VAD_MIN_REMOVED_SECONDS = settings.VAD_MIN_REMOVED_SECONDS
+VAD_MIN_KEPT_FRACTION = settings.VAD_MIN_KEPT_FRACTION
+LLM_HEDGE_DELAY = settings.LLM_HEDGE_DELAY
+LLM_MAX_PARALLEL = settings.LLM_MAX_PARALLEL
+LLM_REQUEST_TIMEOUT = settings.LLM_REQUEST_TIMEOUT
+LLM_BREAKER_FAILURES = settings.LLM_BREAKER_FAILURES
+LLM_BREAKER_COOLDOWN = settings.LLM_BREAKER_COOLDOWN
+LLM_CACHE_ENABLED = settings.LLM_CACHE_ENABLED
+LLM_CACHE_TTL = settings.LLM_CACHE_TTL
+LLM_CACHE_REDIS_TTL = settings.LLM_CACHE_REDIS_TTL
+LLM_CACHE_MAX_ENTRIES = settings.LLM_CACHE_MAX_ENTRIES
+LLM_CACHE_TOUCH_INTERVAL = settings.LLM_CACHE_TOUCH_INTERVAL
+LLM_MAP_REDUCE_THRESHOLD_TOKENS = settings.LLM_MAP_REDUCE_THRESHOLD_TOKENS
+LLM_MAP_CHUNK_TOKENS = settings.LLM_MAP_CHUNK_TOKENS
+LLM_MAP_MAX_WORKERS = settings.LLM_MAP_MAX_WORKERS
+LLM_STREAMING = settings.LLM_STREAMING
+ASYNC_IO_ENABLED = settings.ASYNC_IO_ENABLED
+ASYNC_PROVIDER_CONCURRENCY = settings.ASYNC_PROVIDER_CONCURRENCY
+EMBEDDING_BATCHING = settings.EMBEDDING_BATCHING
+EMBEDDING_BATCH_WAIT_MS = settings.EMBEDDING_BATCH_WAIT_MS
+EMBEDDING_BATCH_MAX_INPUTS = settings.EMBEDDING_BATCH_MAX_INPUTS
+EMBEDDING_BATCH_MAX_TOKENS = settings.EMBEDDING_BATCH_MAX_TOKENS
+QUERY_EMBEDDING_CACHE_SIZE = settings.QUERY_EMBEDDING_CACHE_SIZE
+QUERY_EMBEDDING_CACHE_TTL = settings.QUERY_EMBEDDING_CACHE_TTL
+EMBEDDING_CHUNK_TOKENS = settings.EMBEDDING_CHUNK_TOKENS
+EMBEDDING_CHUNK_OVERLAP_TOKENS = settings.EMBEDDING_CHUNK_OVERLAP_TOKENS
+VECTOR_SEARCH_EF_SEARCH = settings.VECTOR_SEARCH_EF_SEARCH
+VECTOR_SEARCH_ITERATIVE_SCAN = settings.VECTOR_SEARCH_ITERATIVE_SCAN
+VECTOR_SEARCH_CANDIDATE_FACTOR = settings.VECTOR_SEARCH_CANDIDATE_FACTOR
+VECTOR_SEARCH_EXACT_MAX_ROWS = settings.VECTOR_SEARCH_EXACT_MAX_ROWS
+VECTOR_INDEX_MODE = settings.VECTOR_INDEX_MODE
+VECTOR_INDEX_DIMENSIONS = settings.VECTOR_INDEX_DIMENSIONS
+VECTOR_RERANK_FACTOR = settings.VECTOR_RERANK_FACTOR
+VECTOR_SEARCH_ENGINE = settings.VECTOR_SEARCH_ENGINE
+VECTOR_NUMPY_INDEX_DIR = settings.VECTOR_NUMPY_INDEX_DIR
+VECTOR_NUMPY_DTYPE = settings.VECTOR_NUMPY_DTYPE
+VECTOR_NUMPY_BLOCK_ROWS = settings.VECTOR_NUMPY_BLOCK_ROWS
+SEARCH_MODE = settings.SEARCH_MODE
+SEARCH_RRF_K = settings.SEARCH_RRF_K
+SEARCH_LEXICAL_MAX_WORDS = settings.SEARCH_LEXICAL_MAX_WORDS
+SEARCH_HEADLINE_MAX_CHARS = settings.SEARCH_HEADLINE_MAX_CHARS
\ No newline at end of file
@@ -0,0 +1,587 @@
+"""
+Chat-completion calls to the OpenRouter models in AI_MODELS.
+
+Models are tried as hedged requests: the healthiest model is called first,
+and the next one is started whenever nothing has come back within
+LLM_HEDGE_DELAY seconds (or as soon as an attempt fails). The first response
+that parses wins; the other in-flight requests are cancelled.
+
+Each model has a circuit breaker whose state lives in Redis so every worker
+sees the same picture:
+  closed    -> normal; latency (EWMA) and error counts are tracked
+  open      -> LLM_BREAKER_FAILURES consecutive failures; the model is skipped
+               for LLM_BREAKER_COOLDOWN seconds
+  half-open -> cooldown over; one worker at a time may send a probe request,
+               success closes the breaker, failure opens it again
+
+Parsed results are cached (Postgres + Redis) per transcript, curio list and
+model; see get_cached_result / store_cached_result.
+"""
+import re
+import json
+import time
+import hashlib
+import logging
+import unicodedata
+import openai
+import redis
+import json_repair
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.db import IntegrityError
+from django.db.models import F
+from django.utils import timezone
+from .models import LLMResultCache
+from . import aio
+from .constants import (
+    AI_MODELS, LLM_BASE_URL, LLM_HEDGE_DELAY, LLM_MAX_PARALLEL, LLM_REQUEST_TIMEOUT,
+    LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN, LLM_STREAMING, ASYNC_IO_ENABLED,
+    LLM_CACHE_ENABLED, LLM_CACHE_TTL, LLM_CACHE_REDIS_TTL, LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_TOUCH_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the latency moving average.
+LATENCY_EWMA_ALPHA = 0.3
+
+_STATS_KEY = "llm:model:{model}"
+_PROBE_KEY = "llm:probe:{model}"
+
+# KEYS[1] stats hash; ARGV: latency, alpha
+_RECORD_SUCCESS_SCRIPT = """
+local ewma = tonumber(redis.call('hget', KEYS[1], 'latency_ewma'))
+local sample = tonumber(ARGV[1])
+if ewma then ewma = ewma + tonumber(ARGV[2]) * (sample - ewma) else ewma = sample end
+redis.call('hset', KEYS[1], 'latency_ewma', ewma, 'failures', 0, 'opened_until', 0)
+redis.call('hincrby', KEYS[1], 'successes', 1)
+return 1
+"""
+# KEYS[1] stats hash; ARGV: now, failure threshold, cooldown
+_RECORD_FAILURE_SCRIPT = """
+local failures = redis.call('hincrby', KEYS[1], 'failures', 1)
+redis.call('hincrby', KEYS[1], 'errors', 1)
+local opened_until = tonumber(redis.call('hget', KEYS[1], 'opened_until') or '0')
+if failures >= tonumber(ARGV[2]) or opened_until > 0 then
+    redis.call('hset', KEYS[1], 'opened_until', tonumber(ARGV[1]) + tonumber(ARGV[3]))
+end
+return failures
+"""
+
+
+class AllModelsFailed(RuntimeError):
+    pass
+
+
+def _redis():
+    # Imported lazily: utils imports this module.
+    from .utils import get_redis
+    return get_redis()
+
+
+def get_model_stats(models):
+    """{model: {latency_ewma, failures, opened_until, successes, errors}} from Redis."""
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for model in models:
+            pipe.hgetall(_STATS_KEY.format(model=model))
+        raw = pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"LLM model stats unavailable: {e}")
+        raw = [{}] * len(models)
+    stats = {}
+    for model, fields in zip(models, raw):
+        fields = {k.decode(): float(v) for k, v in fields.items()}
+        stats[model] = {
+            "latency_ewma": fields.get("latency_ewma"),
+            "failures": int(fields.get("failures", 0)),
+            "opened_until": fields.get("opened_until", 0.0),
+            "successes": int(fields.get("successes", 0)),
+            "errors": int(fields.get("errors", 0)),
+        }
+    return stats
+
+
+def _try_probe(model):
+    """Half-open breaker: only one worker gets to send the probe request."""
+    try:
+        return bool(_redis().set(_PROBE_KEY.format(model=model), 1, nx=True, ex=LLM_BREAKER_COOLDOWN))
+    except redis.RedisError:
+        return True
+
+
+def order_models(models=None, now=None):
+    """
+    Models to try, best first, as (model, half_open) pairs: closed breakers
+    by latency (models without samples yet keep their configured position),
+    then half-open models. Open breakers are skipped; if no breaker is
+    closed, the one that reopens soonest is tried last rather than failing
+    outright. A half-open model may only be sent a request after
+    _try_probe() grants this worker the probe.
+    """
+    models = list(models or AI_MODELS)
+    now = now or time.time()
+    stats = get_model_stats(models)
+    closed, half_open, still_open = [], [], []
+    for model in models:
+        opened_until = stats[model]["opened_until"]
+        if not opened_until:
+            closed.append(model)
+        elif opened_until <= now:
+            half_open.append(model)
+        else:
+            still_open.append(model)
+
+    # Sampled models are sorted among the slots they occupy; unsampled
+    # ones stay where they were configured
+    sampled = iter(sorted(
+        (m for m in closed if stats[m]["latency_ewma"] is not None),
+        key=lambda m: stats[m]["latency_ewma"],
+    ))
+    closed = [m if stats[m]["latency_ewma"] is None else next(sampled) for m in closed]
+
+    ordered = [(m, False) for m in closed] + [(m, True) for m in half_open]
+    if not closed and still_open:
+        ordered.append((min(still_open, key=lambda m: stats[m]["opened_until"]), False))
+    return ordered
+
+
+def record_success(model, latency):
+    try:
+        _redis().eval(_RECORD_SUCCESS_SCRIPT, 1, _STATS_KEY.format(model=model), latency, LATENCY_EWMA_ALPHA)
+        _redis().delete(_PROBE_KEY.format(model=model))
+    except redis.RedisError as e:
+        logger.warning(f"Could not record LLM success for {model}: {e}")
+
+
+def record_failure(model):
+    try:
+        failures = _redis().eval(
+            _RECORD_FAILURE_SCRIPT, 1, _STATS_KEY.format(model=model),
+            time.time(), LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN,
+        )
+        if failures >= LLM_BREAKER_FAILURES:
+            logger.warning(f"Circuit breaker open for {model} ({failures} consecutive failures)")
+    except redis.RedisError as e:
+        logger.warning(f"Could not record LLM failure for {model}: {e}")
+
+
+class IncrementalJSONObject:
+    """
+    Incremental parser for the top-level JSON object in a streamed completion.
+    Text before the first "{" (markdown fences, preamble) is skipped. Every
+    top-level "key": value pair is decoded as soon as its value ends, so the
+    caller can stop the stream once the keys it needs are there. feed()
+    returns the text after the object's closing brace ("" before that).
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.complete = False
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._buffer = []   # current top-level key or value text
+
+    def feed(self, text):
+        for i, ch in enumerate(text):
+            if self.complete:
+                return text[i:]
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+            if self._in_string:
+                self._buffer.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._end_pair()
+                    self.complete = True
+                    return text[i + 1:]
+            elif ch == "," and self._depth == 1:
+                self._end_pair()
+                continue
+            self._buffer.append(ch)
+        return ""
+
+    def _end_pair(self):
+        text = "".join(self._buffer)
+        self._buffer = []
+        key, sep, value = text.partition(":")
+        if not sep:
+            return
+        try:
+            key = json.loads(key.strip())
+            try:
+                # strict=False: models put raw newlines inside strings
+                self.values[key] = json.loads(value.strip(), strict=False)
+            except ValueError:
+                self.values[key] = json_repair.loads(value.strip())
+        except ValueError:
+            return
+
+
+def has_required_keys(values, required):
+    """
+    True when every key in `required` ({key: type or tuple of types}) is in
+    `values` with the right type, and strings/lists are non-empty.
+    """
+    for key, types in required.items():
+        if key not in values or not isinstance(values[key], types):
+            return False
+        if isinstance(values[key], (str, list)) and not values[key]:
+            return False
+    return True
+
+
+def _feed(parser, text, required):
+    """
+    Feeds `text` to `parser`. A complete object without the `required` keys
+    (an example or preamble object before the answer) is dropped and parsing
+    restarts at the next one. Returns the parser to keep feeding.
+    """
+    rest = parser.feed(text)
+    while parser.complete and not has_required_keys(parser.values, required):
+        parser = IncrementalJSONObject()
+        rest = parser.feed(rest)
+    return parser
+
+
+def _complete(client, model, messages, parse, stream_until=None, **kwargs):
+    start = time.perf_counter()
+    if not stream_until:
+        response = client.chat.completions.create(model=model, messages=messages, **kwargs)
+        content = response.choices[0].message.content.strip()
+        logger.info(f"{model} answered in {time.perf_counter() - start:.1f}s: {content}")
+        return parse(content), time.perf_counter() - start
+
+    stream = client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+    parser = IncrementalJSONObject()
+    content = []
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            content.append(delta)
+            parser = _feed(parser, delta, stream_until)
+            if has_required_keys(parser.values, stream_until):
+                logger.info(
+                    f"{model} streamed the required keys in {time.perf_counter() - start:.1f}s: {parser.values}"
+                )
+                return parser.values, time.perf_counter() - start
+    finally:
+        # Stops generation (and billing) for whatever the model would still send
+        stream.close()
+    content = "".join(content).strip()
+    logger.info(f"{model} answered in {time.perf_counter() - start:.1f}s: {content}")
+    return parse(content), time.perf_counter() - start
+
+
+async def _complete_async(api_key, model, messages, parse, stream_until=None, **kwargs):
+    """_complete on the aio event loop, through the pooled OpenRouter client."""
+    start = time.perf_counter()
+    client = aio.client("openrouter", api_key).with_options(timeout=LLM_REQUEST_TIMEOUT, max_retries=0)
+    async with aio.limit("openrouter"):
+        if not stream_until:
+            response = await client.chat.completions.create(model=model, messages=messages, **kwargs)
+            content = response.choices[0].message.content.strip()
+            logger.info(f"{model} answered in {time.perf_counter() - start:.1f}s: {content}")
+            return parse(content), time.perf_counter() - start
+
+        stream = await client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+        parser = IncrementalJSONObject()
+        content = []
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                content.append(delta)
+                parser = _feed(parser, delta, stream_until)
+                if has_required_keys(parser.values, stream_until):
+                    logger.info(
+                        f"{model} streamed the required keys in {time.perf_counter() - start:.1f}s: {parser.values}"
+                    )
+                    return parser.values, time.perf_counter() - start
+        finally:
+            await stream.close()
+    content = "".join(content).strip()
+    logger.info(f"{model} answered in {time.perf_counter() - start:.1f}s: {content}")
+    return parse(content), time.perf_counter() - start
+
+
+def hedged_completion(messages, parse, api_key, models=None, hedge_delay=LLM_HEDGE_DELAY,
+                      max_parallel=LLM_MAX_PARALLEL, stream_until=None, **kwargs):
+    """
+    Sends `messages` to the models from order_models() as hedged requests and
+    returns (parse(content), model) for the first response that parses.
+    With `stream_until` ({key: type}, see has_required_keys) and LLM_STREAMING
+    on, responses are streamed and cut off as soon as those keys are complete;
+    the result is then the decoded top-level pairs so far.
+    Raises AllModelsFailed (chained to the last error) when none does.
+    """
+    if not LLM_STREAMING:
+        stream_until = None
+    candidates = order_models(models)
+    if not candidates:
+        raise AllModelsFailed("No LLM models configured.")
+
+    # Threaded mode: one client per attempt so a losing request can be
+    # aborted by closing it.
+    clients = {}
+    pending = {}
+    last_exception = None
+    executor = ThreadPoolExecutor(max_workers=max(1, max_parallel))
+
+    def launch():
+        """Starts the next candidate; False when none is left to start."""
+        while candidates:
+            model, half_open = candidates.pop(0)
+            # The probe token is only taken for a request actually sent
+            if half_open and not _try_probe(model):
+                continue
+            if ASYNC_IO_ENABLED:
+                # Runs on the shared event loop; cancelling the future cancels the request
+                pending[aio.submit(_complete_async(api_key, model, messages, parse, stream_until, **kwargs))] = model
+                return True
+            client = openai.OpenAI(
+                base_url=LLM_BASE_URL, api_key=api_key,
+                timeout=LLM_REQUEST_TIMEOUT, max_retries=0,
+            )
+            clients[model] = client
+            pending[executor.submit(_complete, client, model, messages, parse, stream_until, **kwargs)] = model
+            return True
+        return False
+
+    try:
+        launch()
+        while pending:
+            timeout = hedge_delay if candidates and len(pending) < max_parallel else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                logger.info(f"No LLM answer within {hedge_delay}s, hedging with {candidates[0][0]}")
+                launch()
+                continue
+            for future in done:
+                model = pending.pop(future)
+                try:
+                    result, latency = future.result()
+                except Exception as e:
+                    logger.info(f"{model} failed: {e}")
+                    record_failure(model)
+                    last_exception = e
+                    continue
+                record_success(model, latency)
+                return result, model
+            while candidates and len(pending) < max_parallel:
+                launch()
+    finally:
+        for future, model in pending.items():
+            future.cancel()
+            if model in clients:
+                clients[model].close()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    raise AllModelsFailed("All model calls failed.") from last_exception
+
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text):
+    """
+    Rough token count (~4 characters per token). The AI_MODELS use different
+    tokenizers, so this is only used for budgeting, with headroom.
+    """
+    return len(text or "") // 4 + 1
+
+
+def split_by_tokens(text, max_tokens):
+    """
+    Splits `text` into consecutive parts of at most ~`max_tokens`, on sentence
+    boundaries where possible (on words when a sentence alone is too long).
+    """
+    max_chars = max_tokens * 4
+    pieces = []
+    for sentence in _SENTENCE_END_RE.split(text.strip()):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        words = sentence.split()
+        current = []
+        length = 0
+        for word in words:
+            if current and length + len(word) + 1 > max_chars:
+                pieces.append(" ".join(current))
+                current, length = [], 0
+            current.append(word)
+            length += len(word) + 1
+        if current:
+            pieces.append(" ".join(current))
+
+    parts = []
+    current = []
+    length = 0
+    for piece in pieces:
+        if current and length + len(piece) + 1 > max_chars:
+            parts.append(" ".join(current))
+            current, length = [], 0
+        current.append(piece)
+        length += len(piece) + 1
+    if current:
+        parts.append(" ".join(current))
+    return parts
+
+
+# Bump when the summarize/categorize prompt changes, so old results stop matching.
+LLM_CACHE_VERSION = "summary-v2"
+
+_CACHE_KEY = "llm:result:{key}"
+_CACHE_STATS_KEY = "llm:cache:stats"
+_CACHE_TOUCHED_KEY = "llm:touched:{key}"
+
+
+def normalize_transcript(transcript):
+    """NFKC + collapsed whitespace, so formatting-only differences share a cache entry."""
+    return " ".join(unicodedata.normalize("NFKC", transcript or "").split())
+
+
+def llm_cache_key(transcript, curio_names, model):
+    payload = json.dumps(
+        [LLM_CACHE_VERSION, model, normalize_transcript(transcript), sorted(curio_names or [])],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _count(field):
+    try:
+        _redis().hincrby(_CACHE_STATS_KEY, field, 1)
+    except redis.RedisError:
+        pass
+
+
+def get_cached_result(transcript, curio_names, models=None):
+    """
+    (result, model) of a cached answer from any of `models` (preferring the
+    configured order), or (None, None). Redis first, then llm_result_cache
+    (rows older than LLM_CACHE_TTL are ignored); Postgres hits are copied
+    back to Redis. Either hit refreshes the row's last_used_at (Redis hits
+    at most once per LLM_CACHE_TOUCH_INTERVAL), so evict_llm_cache doesn't
+    drop entries that are only ever served from Redis.
+    """
+    if not LLM_CACHE_ENABLED:
+        return None, None
+    models = list(models or AI_MODELS)
+    keys = {model: llm_cache_key(transcript, curio_names, model) for model in models}
+
+    try:
+        cached = _redis().mget([_CACHE_KEY.format(key=k) for k in keys.values()])
+        for model, raw in zip(models, cached):
+            if raw:
+                _count("redis_hits")
+                _touch(keys[model])
+                return json.loads(raw), model
+    except redis.RedisError as e:
+        logger.warning(f"LLM cache (redis) unavailable: {e}")
+
+    rows = {
+        row.cache_key: row
+        for row in LLMResultCache.objects.filter(
+            cache_key__in=keys.values(),
+            created_at__gte=timezone.now() - timedelta(seconds=LLM_CACHE_TTL),
+        )
+    }
+    for model in models:
+        row = rows.get(keys[model])
+        if row is None:
+            continue
+        LLMResultCache.objects.filter(id=row.id).update(hits=F("hits") + 1, last_used_at=timezone.now())
+        _set_redis(row.cache_key, row.result)
+        _count("db_hits")
+        return row.result, model
+
+    _count("misses")
+    return None, None
+
+
+def _touch(key):
+    """Records a Redis hit on the llm_result_cache row, throttled per key."""
+    try:
+        if not _redis().set(_CACHE_TOUCHED_KEY.format(key=key), 1, nx=True, ex=LLM_CACHE_TOUCH_INTERVAL):
+            return
+    except redis.RedisError:
+        return
+    LLMResultCache.objects.filter(cache_key=key).update(last_used_at=timezone.now())
+
+
+def _set_redis(key, result):
+    try:
+        _redis().set(_CACHE_KEY.format(key=key), json.dumps(result), ex=LLM_CACHE_REDIS_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"LLM cache (redis) unavailable: {e}")
+
+
+def store_cached_result(transcript, curio_names, model, result):
+    if not LLM_CACHE_ENABLED:
+        return
+    key = llm_cache_key(transcript, curio_names, model)
+    try:
+        LLMResultCache.objects.update_or_create(
+            cache_key=key,
+            defaults={"model": model, "result": result, "created_at": timezone.now(), "last_used_at": timezone.now()},
+        )
+    except IntegrityError:
+        # Another worker stored the same answer first.
+        pass
+    _set_redis(key, result)
+
+
+def llm_cache_stats():
+    """Hit/miss counters since they were last reset, plus the table size."""
+    try:
+        raw = _redis().hgetall(_CACHE_STATS_KEY)
+        counters = {k.decode(): int(v) for k, v in raw.items()}
+    except redis.RedisError as e:
+        logger.warning(f"LLM cache stats unavailable: {e}")
+        counters = {}
+    stats = {field: counters.get(field, 0) for field in ("redis_hits", "db_hits", "misses")}
+    lookups = sum(stats.values())
+    stats["hit_rate"] = (stats["redis_hits"] + stats["db_hits"]) / lookups if lookups else 0.0
+    stats["entries"] = LLMResultCache.objects.count()
+    return stats
+
+
+def reset_llm_cache_stats():
+    _redis().delete(_CACHE_STATS_KEY)
+
+
+def evict_llm_cache(ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+    """
+    Deletes rows older than `ttl` seconds, then the least recently used rows
+    beyond `max_entries`. Redis entries expire on their own.
+    Returns the number of rows deleted.
+    """
+    expired, _ = LLMResultCache.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=ttl)
+    ).delete()
+    overflow = LLMResultCache.objects.order_by("-last_used_at").values("id")[max_entries:]
+    evicted, _ = LLMResultCache.objects.filter(id__in=overflow).delete()
+    if expired or evicted:
+        logger.info(f"LLM cache: {expired} expired, {evicted} evicted")
+    return expired + evicted
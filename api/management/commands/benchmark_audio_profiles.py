@@ -0,0 +1,84 @@
+import os
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from yt_dlp import YoutubeDL
+from api.utils import audio_ydl_options, ensure_cookie_file, transcribe_audio_with_openai
+from api.constants import CLIP_AUDIO_PROFILES, OPENAI_API_KEY
+
+
+class Command(BaseCommand):
+    help = (
+        "Downloads each URL's audio with every audio profile and reports bytes "
+        "transferred, file size and wall time (optionally incl. transcription)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+")
+        parser.add_argument(
+            "--profiles", nargs="+", default=list(CLIP_AUDIO_PROFILES),
+            choices=list(CLIP_AUDIO_PROFILES),
+        )
+        parser.add_argument(
+            "--transcribe", action="store_true",
+            help="Also time the transcription upload/response for each file.",
+        )
+
+    def handle(self, *args, **options):
+        cookiefile = ensure_cookie_file()
+        header = f"{'profile':<10} {'downloaded':>12} {'file':>12} {'fetch s':>8} {'transcribe s':>13}  url"
+        self.stdout.write(header)
+        totals = {p: [0, 0, 0.0, 0.0] for p in options["profiles"]}
+        for url in options["urls"]:
+            for profile in options["profiles"]:
+                downloaded, size, fetch_s, transcribe_s = self._run(
+                    url, profile, cookiefile, options["transcribe"]
+                )
+                for i, value in enumerate((downloaded, size, fetch_s, transcribe_s)):
+                    totals[profile][i] += value
+                self.stdout.write(
+                    f"{profile:<10} {downloaded:>12,} {size:>12,} {fetch_s:>8.2f} {transcribe_s:>13.2f}  {url}"
+                )
+        self.stdout.write("")
+        for profile, (downloaded, size, fetch_s, transcribe_s) in totals.items():
+            n = len(options["urls"])
+            self.stdout.write(
+                f"{profile:<10} {downloaded // n:>12,} {size // n:>12,} "
+                f"{fetch_s / n:>8.2f} {transcribe_s / n:>13.2f}  (mean per clip)"
+            )
+
+    def _run(self, url, profile, cookiefile, transcribe):
+        downloaded = {}
+
+        def progress_hook(d):
+            if d.get("status") == "finished":
+                downloaded[d.get("filename")] = d.get("total_bytes") or d.get("downloaded_bytes") or 0
+
+        ydl_opts = {
+            'outtmpl': tempfile.mktemp(suffix='.%(ext)s'),
+            'quiet': True,
+            'nocheckcertificate': True,
+            'noplaylist': True,
+            'restrictfilenames': True,
+            'cookiefile': cookiefile,
+            'progress_hooks': [progress_hook],
+            **audio_ydl_options(profile),
+        }
+        filepath = None
+        try:
+            start = time.perf_counter()
+            with YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(url, download=True)
+            fetch_s = time.perf_counter() - start
+            filepath = info['requested_downloads'][0]['filepath']
+            size = os.path.getsize(filepath)
+
+            transcribe_s = 0.0
+            if transcribe:
+                start = time.perf_counter()
+                transcribe_audio_with_openai(filepath, OPENAI_API_KEY)
+                transcribe_s = time.perf_counter() - start
+            return sum(downloaded.values()), size, fetch_s, transcribe_s
+        finally:
+            if filepath and os.path.exists(filepath):
+                os.remove(filepath)
@@ -0,0 +1,49 @@
+import time
+from django.core.management.base import BaseCommand
+from api import audio
+from api.constants import CLIP_AUDIO_PROFILE, CLIP_AUDIO_PROFILES
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the voice-activity trim on local audio files and reports seconds "
+        "removed, upload size before/after and trim time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+")
+        parser.add_argument(
+            "--bitrate", type=int, default=CLIP_AUDIO_PROFILES[CLIP_AUDIO_PROFILE]["bitrate"],
+            help="kbps of the re-encoded trimmed file (defaults to the active audio profile).",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'seconds':>9} {'kept s':>9} {'removed':>8} {'bytes':>12} {'trimmed':>12} {'trim s':>7}  file"
+        )
+        totals = [0.0, 0.0, 0, 0]
+        for path in options["files"]:
+            start = time.perf_counter()
+            trimmed_path, _, stats = audio.trim_to_speech(path, bitrate=options["bitrate"])
+            elapsed = time.perf_counter() - start
+            audio.remove_files([trimmed_path])
+
+            original_s, kept_s = stats["original_seconds"], stats["kept_seconds"]
+            removed = 1 - kept_s / original_s if original_s else 0.0
+            totals[0] += original_s
+            totals[1] += kept_s
+            totals[2] += stats["original_bytes"]
+            totals[3] += stats["trimmed_bytes"]
+            self.stdout.write(
+                f"{original_s:>9.1f} {kept_s:>9.1f} {removed:>8.1%} {stats['original_bytes']:>12,} "
+                f"{stats['trimmed_bytes']:>12,} {elapsed:>7.2f}  {path}"
+            )
+
+        original_s, kept_s, original_b, trimmed_b = totals
+        self.stdout.write("")
+        self.stdout.write(
+            f"removed {original_s - kept_s:.1f}s of {original_s:.1f}s "
+            f"({1 - kept_s / original_s if original_s else 0:.1%}); "
+            f"upload {original_b:,} -> {trimmed_b:,} bytes "
+            f"({1 - trimmed_b / original_b if original_b else 0:.1%} smaller)"
+        )
@@ -0,0 +1,76 @@
+import time
+import random
+import numpy as np
+from django.core.management.base import BaseCommand
+from api.models import Clip, ClipEmbedding
+from api.utils import vector_search_user_clips
+from api import numpy_index, vector_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares recall@k and latency of each vector index mode against exact "
+        "search. Queries are stored chunk embeddings of the users' own clips, "
+        "so no embedding API calls are made."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", nargs="*", help="User ids (default: the users with the most clips).")
+        parser.add_argument("--top-users", type=int, default=5)
+        parser.add_argument("--queries", type=int, default=20, help="Queries per user.")
+        parser.add_argument("--k", type=int, default=30)
+        parser.add_argument("--threshold", type=float, default=0.15)
+        parser.add_argument("--modes", nargs="+", default=list(vector_index.MODES),
+                            choices=[*vector_index.MODES, "numpy"],
+                            help='"numpy" is the in-process engine (api/numpy_index.py).')
+
+    def handle(self, *args, **options):
+        users = options["users"] or self._top_users(options["top_users"])
+        k, threshold = options["k"], options["threshold"]
+        latencies = {mode: [] for mode in ["exact", *options["modes"]]}
+        recalls = {mode: [] for mode in options["modes"]}
+
+        if "numpy" in options["modes"]:
+            # Build up front so the first query doesn't time the build
+            for user_id in users:
+                numpy_index.build_user_index(user_id)
+        for user_id in users:
+            for query in self._sample_queries(user_id, options["queries"]):
+                start = time.perf_counter()
+                truth = vector_search_user_clips(query, user_id, k, threshold, mode="exact")
+                latencies["exact"].append(time.perf_counter() - start)
+                truth_ids = {m["clip_id"] for m in truth}
+                for mode in options["modes"]:
+                    start = time.perf_counter()
+                    if mode == "numpy":
+                        found = numpy_index.search(query, user_id, k, threshold)
+                    else:
+                        found = vector_search_user_clips(query, user_id, k, threshold, mode=mode)
+                    latencies[mode].append(time.perf_counter() - start)
+                    if truth_ids:
+                        recalls[mode].append(len(truth_ids & {m["clip_id"] for m in found}) / len(truth_ids))
+
+        self.stdout.write(f"{'mode':<10} {'recall@' + str(k):>10} {'mean ms':>9} {'p95 ms':>9}  ({len(users)} users)")
+        for mode, samples in latencies.items():
+            if not samples:
+                continue
+            ms = np.array(samples) * 1000
+            recall = f"{np.mean(recalls[mode]):.3f}" if recalls.get(mode) else "1.000" if mode == "exact" else "-"
+            self.stdout.write(f"{mode:<10} {recall:>10} {ms.mean():>9.1f} {np.percentile(ms, 95):>9.1f}")
+
+    def _top_users(self, n):
+        from django.db.models import Count
+        return [
+            row["user_id"]
+            for row in Clip.objects.filter(content__isnull=False)
+            .values("user_id").annotate(n=Count("id")).order_by("-n")[:n]
+        ]
+
+    def _sample_queries(self, user_id, n):
+        content_ids = Clip.objects.filter(user_id=user_id, content__isnull=False).values("content_id")
+        ids = list(ClipEmbedding.objects.filter(content_id__in=content_ids).values_list("id", flat=True))
+        sample = random.sample(ids, min(n, len(ids)))
+        return [
+            np.asarray(vector, dtype=np.float32)
+            for vector in ClipEmbedding.objects.filter(id__in=sample).values_list("embedding", flat=True)
+        ]
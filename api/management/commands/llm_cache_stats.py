@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from api import llm
+
+
+class Command(BaseCommand):
+    help = "Reports LLM result cache hit/miss counters and size (optionally evicts or resets)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--evict", action="store_true", help="Run TTL/size eviction first.")
+        parser.add_argument("--reset", action="store_true", help="Reset the counters afterwards.")
+
+    def handle(self, *args, **options):
+        if options["evict"]:
+            self.stdout.write(f"evicted {llm.evict_llm_cache()} rows")
+        stats = llm.llm_cache_stats()
+        for field in ("redis_hits", "db_hits", "misses", "entries"):
+            self.stdout.write(f"{field:<12} {stats[field]:>10,}")
+        self.stdout.write(f"{'hit_rate':<12} {stats['hit_rate']:>10.1%}")
+        if options["reset"]:
+            llm.reset_llm_cache_stats()
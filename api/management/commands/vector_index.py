@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api import vector_index
+from api.constants import VECTOR_INDEX_DIMENSIONS, VECTOR_INDEX_MODE
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates or drops the ANN index for a VECTOR_INDEX_MODE on clip_embeddings "
+        "(concurrently, no table lock) and lists index sizes. The full-precision "
+        "index can be dropped once VECTOR_INDEX_MODE is a compressed mode whose "
+        "index exists; `create full` brings it back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["create", "drop", "sizes"])
+        parser.add_argument("mode", nargs="?", choices=vector_index.MODES)
+        parser.add_argument("--dimensions", type=int, default=VECTOR_INDEX_DIMENSIONS)
+        parser.add_argument("--m", type=int, default=16)
+        parser.add_argument("--ef-construction", type=int, default=64)
+
+    def handle(self, *args, **options):
+        action, mode, dimensions = options["action"], options["mode"], options["dimensions"]
+        if action != "sizes" and not mode:
+            raise CommandError("A mode is required for create/drop.")
+        active_index = vector_index.index_name(VECTOR_INDEX_MODE)
+        if action == "drop" and vector_index.index_name(mode, dimensions) == active_index:
+            raise CommandError(f"{mode} is the active VECTOR_INDEX_MODE; switch the setting first.")
+
+        with connection.cursor() as cursor:
+            if action == "drop" and mode == "full":
+                # Searches in the active mode must not fall back to a table scan
+                cursor.execute(
+                    "SELECT 1 FROM pg_indexes WHERE tablename = 'clip_embeddings' AND indexname = %s",
+                    [active_index],
+                )
+                if cursor.fetchone() is None:
+                    raise CommandError(
+                        f"Build the {VECTOR_INDEX_MODE} index (vector_index create {VECTOR_INDEX_MODE}) "
+                        "before dropping the full-precision one."
+                    )
+            if action == "create":
+                cursor.execute(vector_index.create_index_sql(
+                    mode, dimensions, options["m"], options["ef_construction"]
+                ))
+                self.stdout.write(f"created {vector_index.index_name(mode, dimensions)}")
+            elif action == "drop":
+                cursor.execute(vector_index.drop_index_sql(mode, dimensions))
+                self.stdout.write(f"dropped {vector_index.index_name(mode, dimensions)}")
+
+            cursor.execute(
+                "SELECT indexname, pg_size_pretty(pg_relation_size(indexname::regclass)) "
+                "FROM pg_indexes WHERE tablename = 'clip_embeddings' ORDER BY indexname"
+            )
+            for name, size in cursor.fetchall():
+                self.stdout.write(f"{name:<45} {size:>10}")
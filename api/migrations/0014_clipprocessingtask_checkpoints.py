@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2025-07-02 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_alter_clipembedding_embedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clipprocessingtask',
+            name='stage',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='clipprocessingtask',
+            name='audio_path',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clipprocessingtask',
+            name='metadata',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clipprocessingtask',
+            name='transcript',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clipprocessingtask',
+            name='llm_result',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
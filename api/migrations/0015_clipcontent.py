@@ -0,0 +1,111 @@
+# Generated by Django 5.2.3 on 2025-07-09 16:41
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+# Move video-level artifacts from per-user clips into one shared row per
+# (platform, platform_video_id). Every processed clip gets linked to its
+# content, tags are collected per content, and of the cloned embedding sets
+# only one per content is kept.
+BACKFILL_SQL = """
+INSERT INTO clip_contents
+    (id, platform, platform_video_id, title, description, thumbnail_url,
+     transcript, summary, created_at, updated_at)
+SELECT DISTINCT ON (platform, platform_video_id)
+    gen_random_uuid(), platform, platform_video_id, title, description,
+    thumbnail_url, transcript, summary, created_at, now()
+FROM clips
+WHERE platform_video_id IS NOT NULL
+  AND transcript <> '' AND summary <> ''
+ORDER BY platform, platform_video_id, created_at DESC
+ON CONFLICT (platform, platform_video_id) DO NOTHING;
+
+UPDATE clips c SET content_id = cc.id
+FROM clip_contents cc
+WHERE cc.platform = c.platform
+  AND cc.platform_video_id = c.platform_video_id
+  AND c.summary <> '';
+
+INSERT INTO clip_content_tags (content_id, tag_id)
+SELECT DISTINCT c.content_id, ct.tag_id
+FROM clip_tags ct JOIN clips c ON c.id = ct.clip_id
+WHERE c.content_id IS NOT NULL
+ON CONFLICT (content_id, tag_id) DO NOTHING;
+
+WITH source AS (
+    SELECT DISTINCT ON (c.content_id) c.content_id, e.clip_id
+    FROM clip_embeddings e JOIN clips c ON c.id = e.clip_id
+    WHERE c.content_id IS NOT NULL
+    ORDER BY c.content_id, e.clip_id
+)
+UPDATE clip_embeddings e SET content_id = source.content_id, clip_id = NULL
+FROM source WHERE e.clip_id = source.clip_id;
+
+DELETE FROM clip_embeddings e USING clips c
+WHERE e.clip_id = c.id AND c.content_id IS NOT NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_clipprocessingtask_checkpoints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClipContent',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('platform', models.CharField(max_length=20)),
+                ('platform_video_id', models.TextField()),
+                ('title', models.TextField(blank=True)),
+                ('description', models.TextField(blank=True)),
+                ('thumbnail_url', models.TextField(blank=True)),
+                ('transcript', models.TextField(blank=True)),
+                ('summary', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'clip_contents',
+                'managed': True,
+                'unique_together': {('platform', 'platform_video_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ClipContentTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.ForeignKey(db_column='content_id', on_delete=django.db.models.deletion.CASCADE, to='api.clipcontent')),
+                ('tag', models.ForeignKey(db_column='tag_id', on_delete=django.db.models.deletion.CASCADE, to='api.tag')),
+            ],
+            options={
+                'db_table': 'clip_content_tags',
+                'managed': True,
+                'unique_together': {('content', 'tag')},
+            },
+        ),
+        migrations.AddField(
+            model_name='clip',
+            name='content',
+            field=models.ForeignKey(blank=True, db_column='content_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='clips', to='api.clipcontent'),
+        ),
+        migrations.AlterField(
+            model_name='clipembedding',
+            name='clip',
+            field=models.ForeignKey(blank=True, db_column='clip_id', null=True, on_delete=django.db.models.deletion.CASCADE, to='api.clip'),
+        ),
+        migrations.AddField(
+            model_name='clipembedding',
+            name='content',
+            field=models.ForeignKey(db_column='content_id', null=True, on_delete=django.db.models.deletion.CASCADE, to='api.clipcontent'),
+        ),
+        migrations.AddIndex(
+            model_name='clipembedding',
+            index=models.Index(fields=['content_id'], name='clip_embedd_content_2fcf01_idx'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
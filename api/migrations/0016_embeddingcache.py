@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2025-07-14 09:27
+
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_clipcontent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingCache',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=100)),
+                ('text_hash', models.CharField(max_length=64)),
+                ('embedding', pgvector.django.vector.VectorField(dimensions=1536)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'embedding_cache',
+                'managed': True,
+                'unique_together': {('model', 'text_hash')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2025-07-16 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_embeddingcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clipprocessingtask',
+            name='timestamp_map',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clipprocessingtask',
+            name='transcript_segments',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clipcontent',
+            name='transcript_segments',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='clipembedding',
+            name='start_seconds',
+            field=models.FloatField(null=True),
+        ),
+    ]
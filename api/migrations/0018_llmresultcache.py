@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2025-07-17 11:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_clipprocessingtask_timestamp_map'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMResultCache',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('cache_key', models.CharField(max_length=64, unique=True)),
+                ('model', models.CharField(max_length=100)),
+                ('result', models.JSONField()),
+                ('hits', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'llm_result_cache',
+                'managed': True,
+                'indexes': [models.Index(fields=['last_used_at'], name='llm_result__last_us_7e24e6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.3 on 2025-07-22 15:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_llmresultcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clipembedding',
+            name='chunk_hash',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.RunSQL(
+            "UPDATE clip_embeddings SET chunk_hash = encode(sha256(convert_to(text_chunk, 'UTF8')), 'hex');",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
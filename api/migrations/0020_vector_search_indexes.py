@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2025-07-24 10:19
+
+import pgvector.django.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0019_clipembedding_chunk_hash'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='clip',
+            index=models.Index(fields=['user_id', 'content_id'], name='clips_user_id_be1739_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='clipembedding',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='clip_embeddings_hnsw_idx', opclasses=['vector_cosine_ops']),
+        ),
+    ]
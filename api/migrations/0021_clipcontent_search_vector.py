@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2025-07-28 09:42
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('api', '0020_vector_search_indexes'),
+    ]
+
+    operations = [
+        # Stored generated column, kept current by Postgres on every write;
+        # not on the model, so the ORM never writes to it. Title and summary
+        # weigh more than description and transcript in ts_rank_cd.
+        migrations.RunSQL(
+            sql="""
+                ALTER TABLE clip_contents ADD COLUMN IF NOT EXISTS search_vector tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A')
+                    || setweight(to_tsvector('english'::regconfig, coalesce(summary, '')), 'B')
+                    || setweight(to_tsvector('english'::regconfig, coalesce(description, '')), 'C')
+                    || setweight(to_tsvector('english'::regconfig, coalesce(transcript, '')), 'D')
+                ) STORED
+            """,
+            reverse_sql="ALTER TABLE clip_contents DROP COLUMN IF EXISTS search_vector",
+        ),
+        migrations.RunSQL(
+            sql="CREATE INDEX CONCURRENTLY IF NOT EXISTS clip_contents_search_gin_idx ON clip_contents USING gin (search_vector)",
+            reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS clip_contents_search_gin_idx",
+        ),
+    ]
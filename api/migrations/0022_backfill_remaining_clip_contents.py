@@ -0,0 +1,80 @@
+# Generated by Django 5.2.3 on 2025-07-29 14:20
+
+from django.db import migrations
+
+
+# 0015 only moved clips with a platform_video_id, a transcript and a summary
+# onto shared content; search joins through clips.content_id, so every other
+# clip with data (embeddings, transcript or summary) is linked here too.
+# Clips without a platform_video_id get content keyed on 'url:' || url, as
+# api.utils.content_video_key does at runtime (content the pipeline already
+# created under the bare URL is re-keyed to match). Once linked, a clip's
+# own transcript / summary / description copies are cleared: they are read
+# through clip_contents. Idempotent.
+BACKFILL_SQL = """
+UPDATE clip_contents cc SET platform_video_id = 'url:' || cc.platform_video_id
+WHERE cc.platform_video_id ~ '^https?://'
+  AND NOT EXISTS (
+      SELECT 1 FROM clip_contents o
+      WHERE o.platform = cc.platform AND o.platform_video_id = 'url:' || cc.platform_video_id
+  );
+
+CREATE TEMPORARY TABLE unlinked_clips ON COMMIT DROP AS
+SELECT c.id, c.platform, coalesce(c.platform_video_id, 'url:' || btrim(c.url)) AS video_key
+FROM clips c
+WHERE c.content_id IS NULL
+  AND (c.transcript <> '' OR c.summary <> ''
+       OR EXISTS (SELECT 1 FROM clip_embeddings e WHERE e.clip_id = c.id));
+
+INSERT INTO clip_contents
+    (id, platform, platform_video_id, title, description, thumbnail_url,
+     transcript, summary, created_at, updated_at)
+SELECT DISTINCT ON (u.platform, u.video_key)
+    gen_random_uuid(), u.platform, u.video_key, c.title, c.description,
+    c.thumbnail_url, c.transcript, c.summary, c.created_at, now()
+FROM unlinked_clips u JOIN clips c ON c.id = u.id
+ORDER BY u.platform, u.video_key, (c.summary <> '') DESC, c.created_at DESC
+ON CONFLICT (platform, platform_video_id) DO NOTHING;
+
+UPDATE clips c SET content_id = cc.id
+FROM unlinked_clips u, clip_contents cc
+WHERE c.id = u.id
+  AND cc.platform = u.platform
+  AND cc.platform_video_id = u.video_key;
+
+INSERT INTO clip_content_tags (content_id, tag_id)
+SELECT DISTINCT c.content_id, ct.tag_id
+FROM clip_tags ct JOIN clips c ON c.id = ct.clip_id
+WHERE c.content_id IS NOT NULL
+ON CONFLICT (content_id, tag_id) DO NOTHING;
+
+-- One clip's embedding set moves to contents that have none yet; the
+-- remaining clip-scoped rows of linked clips are duplicates.
+WITH source AS (
+    SELECT DISTINCT ON (c.content_id) c.content_id, e.clip_id
+    FROM clip_embeddings e JOIN clips c ON c.id = e.clip_id
+    WHERE c.content_id IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM clip_embeddings ce WHERE ce.content_id = c.content_id)
+    ORDER BY c.content_id, e.clip_id
+)
+UPDATE clip_embeddings e SET content_id = source.content_id, clip_id = NULL
+FROM source WHERE e.clip_id = source.clip_id;
+
+DELETE FROM clip_embeddings e USING clips c
+WHERE e.clip_id = c.id AND c.content_id IS NOT NULL;
+
+UPDATE clips SET transcript = '', summary = '', description = ''
+WHERE content_id IS NOT NULL
+  AND (transcript <> '' OR summary <> '' OR description <> '');
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_clipcontent_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -4,7 +4,7 @@ from django.db import models
 from django.contrib.postgres.fields import ArrayField
 from django.db.models import CompositePrimaryKey
 import uuid
-from pgvector.django import VectorField
+from pgvector.django import HnswIndex, VectorField
 
 
 class Profile(models.Model):
@@ -56,10 +56,35 @@ class Curio(models.Model):
         db_table = 'curios'
         managed = False
 
+class ClipContent(models.Model):
+    """
+    Video-level artifacts (transcript, AI summary, tags, embeddings), stored
+    once per (platform, platform_video_id) and shared by every user's Clip.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    platform = models.CharField(max_length=20)
+    platform_video_id = models.TextField()
+    title = models.TextField(blank=True)
+    description = models.TextField(blank=True)
+    thumbnail_url = models.TextField(blank=True)
+    transcript = models.TextField(blank=True)
+    # [char_start, char_end, start_seconds, end_seconds] per transcribed
+    # segment, in the original audio's time (None for caption transcripts)
+    transcript_segments = models.JSONField(blank=True, null=True)
+    summary = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'clip_contents'
+        managed = False
+        unique_together = (('platform', 'platform_video_id'),)
+
 class Clip(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(Profile, db_column='user_id', on_delete=models.DO_NOTHING)
     curio = models.ForeignKey(Curio, db_column='curio_id', null=True, blank=True, on_delete=models.SET_NULL)
+    content = models.ForeignKey(ClipContent, db_column='content_id', null=True, blank=True, on_delete=models.SET_NULL, related_name='clips')
     platform = models.CharField(max_length=20, choices=[
         ('tiktok', 'TikTok'),
         ('instagram', 'Instagram'),
@@ -79,6 +104,16 @@ class Clip(models.Model):
     class Meta:
         db_table = 'clips'
         managed = False
+        indexes = [models.Index(fields=['user_id', 'content_id'])]
+
+    def shared(self, field):
+        """
+        Reads a video-level field through the shared ClipContent; clips that
+        aren't linked to one yet fall back to their own column.
+        """
+        if self.content_id is not None:
+            return getattr(self.content, field)
+        return getattr(self, field)
 
 class Tag(models.Model):
     id = models.AutoField(primary_key=True)
@@ -97,6 +132,15 @@ class ClipTag(models.Model):
         managed = False
         unique_together = (('clip', 'tag'),)
 
+class ClipContentTag(models.Model):
+    content = models.ForeignKey(ClipContent, db_column='content_id', on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, db_column='tag_id', on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'clip_content_tags'
+        managed = False
+        unique_together = (('content', 'tag'),)
+
 class CurioRating(models.Model):
     curio = models.ForeignKey(Curio, db_column='curio_id', on_delete=models.CASCADE)
     user = models.ForeignKey(Profile, db_column='user_id', on_delete=models.CASCADE)
@@ -150,6 +194,16 @@ class ClipProcessingTask(models.Model):
     celery_task_id = models.CharField(max_length=100)
     status = models.CharField(max_length=20, default='pending') # 'pending', 'processing', 'completed', 'failed'
     error = models.TextField(blank=True, null=True)
+    # Pipeline checkpoints: the last completed stage plus each stage's output,
+    # so retries and resumes pick up at the first incomplete stage.
+    stage = models.CharField(max_length=20, blank=True, default='')
+    audio_path = models.TextField(blank=True, null=True)
+    metadata = models.JSONField(blank=True, null=True)
+    # [trimmed_start, original_start, duration] spans kept by the VAD trim
+    timestamp_map = models.JSONField(blank=True, null=True)
+    transcript = models.TextField(blank=True, null=True)
+    transcript_segments = models.JSONField(blank=True, null=True)
+    llm_result = models.JSONField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -159,10 +213,14 @@ class ClipProcessingTask(models.Model):
 
 class ClipEmbedding(models.Model):
     id = models.AutoField(primary_key=True)
-    clip = models.ForeignKey(Clip, db_column='clip_id', on_delete=models.CASCADE)
+    # Legacy per-clip rows; embeddings are now stored once per ClipContent.
+    clip = models.ForeignKey(Clip, db_column='clip_id', null=True, blank=True, on_delete=models.CASCADE)
+    content = models.ForeignKey(ClipContent, db_column='content_id', null=True, on_delete=models.CASCADE)
     field = models.CharField(max_length=20)  # 'transcript', 'title', 'summary'
     chunk_index = models.IntegerField(null=True)  # 0 for title/summary, or chunk number
     text_chunk = models.TextField()
+    chunk_hash = models.CharField(max_length=64, null=True)  # sha256(text_chunk)
+    start_seconds = models.FloatField(null=True)  # where a transcript chunk starts in the video
     embedding = VectorField(dimensions=1536)  # OpenAI output
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -171,5 +229,50 @@ class ClipEmbedding(models.Model):
         managed = False
         indexes = [
             models.Index(fields=['clip_id']),
+            models.Index(fields=['content_id']),
             models.Index(fields=['field']),
-        ]
\ No newline at end of file
+            # Created by migration 0020; `vector_index drop full` retires it
+            # once a compressed VECTOR_INDEX_MODE has its own index
+            HnswIndex(
+                name='clip_embeddings_hnsw_idx',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+        ]
+
+class EmbeddingCache(models.Model):
+    """
+    Content-addressed embeddings: one row per (model, sha256(text)), so the
+    same text is only ever sent to the embeddings API once.
+    """
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=100)
+    text_hash = models.CharField(max_length=64)
+    embedding = VectorField(dimensions=1536)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'embedding_cache'
+        managed = False
+        unique_together = (('model', 'text_hash'),)
+
+
+class LLMResultCache(models.Model):
+    """
+    Parsed summarize_and_categorize_clip results, keyed by
+    sha256(normalized transcript, sorted curio names, model, prompt version).
+    """
+    id = models.BigAutoField(primary_key=True)
+    cache_key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    result = models.JSONField()
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'llm_result_cache'
+        managed = False
+        indexes = [models.Index(fields=['last_used_at'])]
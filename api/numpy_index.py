@@ -0,0 +1,299 @@
+"""
+In-process vector search over per-user memory-mapped NumPy matrices
+(VECTOR_SEARCH_ENGINE = "numpy").
+
+Each user has a directory under VECTOR_NUMPY_INDEX_DIR holding, for the
+chunk embeddings of every ClipContent the user has a clip of:
+  vectors-<dtype>.<gen>  raw (N, 1536) L2-normalized float32, or int8 (x127)
+  contents.<gen>  raw (N, 16) content UUID bytes
+  ids.<gen>       raw (N,) int64 clip_embeddings ids
+  deleted.<gen>   raw int64 ids removed since the last compaction
+  gen             current generation number
+New rows are appended (ids last, so a reader only ever sees complete rows:
+N is the shortest of the three files). Removed rows are tombstoned and
+dropped by compaction, which writes a new generation and then switches
+`gen` atomically. Writers serialize on a per-user flock.
+
+search() mirrors vector_search_user_clips exactly: the top
+top_n * VECTOR_SEARCH_CANDIDATE_FACTOR chunks above the threshold, the best
+chunk per clip, top_n clips by cosine similarity. With int8 storage the
+candidates are rescored with the full-precision vectors from Postgres.
+"""
+import os
+import uuid
+import fcntl
+import logging
+import numpy as np
+from contextlib import contextmanager
+from .models import Clip, ClipEmbedding
+from .constants import (
+    EMBEDDING_DIMENSIONS, VECTOR_NUMPY_INDEX_DIR, VECTOR_NUMPY_DTYPE,
+    VECTOR_NUMPY_BLOCK_ROWS, VECTOR_SEARCH_CANDIDATE_FACTOR,
+)
+
+logger = logging.getLogger(__name__)
+
+# Compact once this share of the rows is tombstoned.
+COMPACT_DELETED_RATIO = 0.2
+
+INT8_SCALE = 127.0
+
+
+def _user_dir(user_id):
+    return os.path.join(VECTOR_NUMPY_INDEX_DIR, str(user_id))
+
+
+def _path(user_id, name, gen):
+    if name == "vectors":
+        # Switching VECTOR_NUMPY_DTYPE finds no file and rebuilds
+        name = f"vectors-{VECTOR_NUMPY_DTYPE}"
+    return os.path.join(_user_dir(user_id), f"{name}.{gen}")
+
+
+def _generation(user_id):
+    try:
+        with open(os.path.join(_user_dir(user_id), "gen")) as f:
+            return int(f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+@contextmanager
+def _user_lock(user_id):
+    os.makedirs(_user_dir(user_id), exist_ok=True)
+    with open(os.path.join(_user_dir(user_id), "lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _dtype():
+    return np.int8 if VECTOR_NUMPY_DTYPE == "int8" else np.float32
+
+
+def _encode(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, EMBEDDING_DIMENSIONS)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    if _dtype() == np.int8:
+        return np.clip(np.rint(vectors * INT8_SCALE), -127, 127).astype(np.int8)
+    return vectors.astype(np.float32)
+
+
+def _rows_for_contents(content_ids):
+    """(ids, content uuid bytes, vectors) of the stored chunk embeddings of `content_ids`."""
+    rows = list(
+        ClipEmbedding.objects.filter(content_id__in=content_ids)
+        .order_by("id")
+        .values_list("id", "content_id", "embedding")
+    )
+    if not rows:
+        return np.empty(0, np.int64), np.empty((0, 16), np.uint8), np.empty((0, EMBEDDING_DIMENSIONS), _dtype())
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    contents = np.frombuffer(b"".join(r[1].bytes for r in rows), dtype=np.uint8).reshape(-1, 16)
+    vectors = _encode(np.stack([np.asarray(r[2], dtype=np.float32) for r in rows]))
+    return ids, contents, vectors
+
+
+def _write_generation(user_id, gen, ids, contents, vectors):
+    for name, array in (("vectors", vectors), ("contents", contents), ("ids", ids)):
+        array.tofile(_path(user_id, name, gen))
+    open(_path(user_id, "deleted", gen), "wb").close()
+    tmp = os.path.join(_user_dir(user_id), "gen.tmp")
+    with open(tmp, "w") as f:
+        f.write(str(gen))
+    os.replace(tmp, os.path.join(_user_dir(user_id), "gen"))
+    for name in ("vectors", "contents", "ids", "deleted"):
+        old = _path(user_id, name, gen - 1)
+        if gen > 0 and os.path.exists(old):
+            # Open memmaps of the old generation stay valid after unlink
+            os.remove(old)
+
+
+def build_user_index(user_id):
+    """(Re)builds a user's index from Postgres."""
+    content_ids = Clip.objects.filter(user_id=user_id, content__isnull=False).values("content_id")
+    ids, contents, vectors = _rows_for_contents(content_ids)
+    with _user_lock(user_id):
+        gen = _generation(user_id)
+        _write_generation(user_id, 0 if gen is None else gen + 1, ids, contents, vectors)
+    logger.info(f"Built vector index for user {user_id}: {len(ids)} rows")
+
+
+def _row_count(user_id, gen):
+    """Rows complete in all three files."""
+    return min(
+        os.path.getsize(_path(user_id, "ids", gen)) // 8,
+        os.path.getsize(_path(user_id, "vectors", gen)) // (EMBEDDING_DIMENSIONS * np.dtype(_dtype()).itemsize),
+        os.path.getsize(_path(user_id, "contents", gen)) // 16,
+    )
+
+
+def _load(user_id):
+    """(ids, contents, vectors, deleted ids) memory-mapped from the current generation, or None."""
+    for _ in range(2):
+        gen = _generation(user_id)
+        if gen is None:
+            return None
+        try:
+            n = _row_count(user_id, gen)
+            ids = np.fromfile(_path(user_id, "ids", gen), dtype=np.int64, count=n)
+            deleted = np.fromfile(_path(user_id, "deleted", gen), dtype=np.int64)
+            if n == 0:
+                return ids[:0], np.empty((0, 16), np.uint8), np.empty((0, EMBEDDING_DIMENSIONS), _dtype()), deleted
+            vectors = np.memmap(_path(user_id, "vectors", gen), dtype=_dtype(), mode="r",
+                                shape=(n, EMBEDDING_DIMENSIONS))
+            contents = np.memmap(_path(user_id, "contents", gen), dtype=np.uint8, mode="r", shape=(n, 16))
+            return ids[:n], contents, vectors, deleted
+        except FileNotFoundError:
+            # Compaction switched generations under us; read the new one
+            continue
+    return None
+
+
+def add_contents(user_id, content_ids):
+    """Appends the chunk embeddings of `content_ids` to the user's index (if it exists)."""
+    if _generation(user_id) is None:
+        return
+    ids, contents, vectors = _rows_for_contents(content_ids)
+    with _user_lock(user_id):
+        gen = _generation(user_id)
+        n = _row_count(user_id, gen)
+        new = ~np.isin(ids, np.fromfile(_path(user_id, "ids", gen), dtype=np.int64, count=n))
+        if not new.any():
+            return
+        for name, array in (("vectors", vectors[new]), ("contents", contents[new]), ("ids", ids[new])):
+            with open(_path(user_id, name, gen), "ab") as f:
+                # Drop a partial row left by an interrupted append first
+                f.truncate(n * array[0].nbytes)
+                array.tofile(f)
+
+
+def remove_rows(user_id, embedding_ids):
+    """Tombstones rows of the user's index; compacts when enough are dead."""
+    if _generation(user_id) is None or not len(embedding_ids):
+        return
+    with _user_lock(user_id):
+        gen = _generation(user_id)
+        with open(_path(user_id, "deleted", gen), "ab") as f:
+            np.asarray(embedding_ids, dtype=np.int64).tofile(f)
+        ids = np.fromfile(_path(user_id, "ids", gen), dtype=np.int64, count=_row_count(user_id, gen))
+        deleted = np.fromfile(_path(user_id, "deleted", gen), dtype=np.int64)
+        if len(ids) and np.isin(ids, deleted).mean() < COMPACT_DELETED_RATIO:
+            return
+        ids, contents, vectors, deleted = _load(user_id)
+        live = ~np.isin(ids, deleted)
+        _write_generation(user_id, gen + 1, ids[live], np.array(contents[live]), np.array(vectors[live]))
+
+
+def on_content_embeddings_changed(content_id, added_ids, removed_ids):
+    """Keeps the indexes of every user with a clip of `content_id` in step with clip_embeddings."""
+    user_ids = set(Clip.objects.filter(content_id=content_id).values_list("user_id", flat=True))
+    for user_id in user_ids:
+        remove_rows(user_id, removed_ids)
+        if added_ids:
+            add_contents(user_id, [content_id])
+
+
+def _top_candidates(vectors, live, query, count, min_score):
+    """Blockwise scoring with argpartition: (row indexes, scores) of the best `count` live rows."""
+    best_rows = np.empty(0, dtype=np.int64)
+    best_scores = np.empty(0, dtype=np.float32)
+    for start in range(0, len(live), VECTOR_NUMPY_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + VECTOR_NUMPY_BLOCK_ROWS], dtype=np.float32)
+        scores = block @ query
+        if _dtype() == np.int8:
+            scores /= INT8_SCALE
+        keep = (scores >= min_score) & live[start:start + len(block)]
+        rows = np.flatnonzero(keep) + start
+        rows_scores = scores[keep]
+        best_rows = np.concatenate([best_rows, rows])
+        best_scores = np.concatenate([best_scores, rows_scores])
+        if len(best_rows) > count:
+            top = np.argpartition(-best_scores, count - 1)[:count]
+            best_rows, best_scores = best_rows[top], best_scores[top]
+    order = np.argsort(-best_scores, kind="stable")
+    return best_rows[order], best_scores[order]
+
+
+def search(query_embedding, user_id, top_n=30, threshold=0.7):
+    """Same contract and results as vector_search_user_clips (see module docstring)."""
+    loaded = _load(user_id)
+    if loaded is None:
+        build_user_index(user_id)
+        loaded = _load(user_id)
+    ids, contents, vectors, deleted = loaded
+
+    # Only rows of contents the user still has a clip of, as in the SQL path
+    clips_by_content = {}
+    for clip_id, content_id in Clip.objects.filter(
+        user_id=user_id, content__isnull=False
+    ).values_list("id", "content_id"):
+        clips_by_content.setdefault(content_id, []).append(clip_id)
+    if not len(ids) or not clips_by_content:
+        return []
+    uuid_dtype = np.dtype((np.void, 16))
+    owned = np.array([c.bytes for c in clips_by_content], dtype=uuid_dtype)
+    live = np.isin(np.ascontiguousarray(contents).view(uuid_dtype).ravel(), owned)
+    if len(deleted):
+        live &= ~np.isin(ids, deleted)
+
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1)
+    count = top_n * VECTOR_SEARCH_CANDIDATE_FACTOR
+    # int8 scores are approximate: keep a margin, rescore below
+    margin = 0.02 if _dtype() == np.int8 else 0.0
+    rows, scores = _top_candidates(vectors, live, query, count, threshold - margin)
+
+    candidate_ids = ids[rows]
+    if _dtype() == np.int8 and len(rows):
+        exact = dict(
+            (row_id, float(np.dot(_encode_float(vector), query)))
+            for row_id, vector in ClipEmbedding.objects.filter(id__in=candidate_ids.tolist())
+            .values_list("id", "embedding")
+        )
+        scores = np.array([exact.get(int(i), -1.0) for i in candidate_ids], dtype=np.float32)
+        keep = scores >= threshold
+        order = np.argsort(-scores[keep], kind="stable")
+        rows, candidate_ids, scores = rows[keep][order], candidate_ids[keep][order], scores[keep][order]
+
+    # Best chunk per content (rows are sorted by score)
+    best = {}
+    for row, embedding_id, score in zip(rows, candidate_ids, scores):
+        content_id = uuid.UUID(bytes=bytes(contents[row]))
+        best.setdefault(content_id, (int(embedding_id), float(score)))
+    hits = sorted(
+        (
+            (score, clip_id, content_id, embedding_id)
+            for content_id, (embedding_id, score) in best.items()
+            for clip_id in clips_by_content.get(content_id, [])
+        ),
+        key=lambda hit: -hit[0],
+    )[:top_n]
+
+    chunks = {
+        row["id"]: row
+        for row in ClipEmbedding.objects.filter(id__in=[h[3] for h in hits])
+        .values("id", "field", "chunk_index", "text_chunk", "start_seconds")
+    }
+    return [
+        {
+            "clip_id": clip_id,
+            "content_id": content_id,
+            "embedding_id": embedding_id,
+            "percent_match": round(score * 100, 2),
+            "field": chunks[embedding_id]["field"],
+            "chunk_index": chunks[embedding_id]["chunk_index"],
+            "text_chunk": chunks[embedding_id]["text_chunk"],
+            "start_seconds": chunks[embedding_id]["start_seconds"],
+        }
+        for score, clip_id, content_id, embedding_id in hits
+        if embedding_id in chunks
+    ]
+
+
+def _encode_float(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1)
@@ -1,5 +1,6 @@
 from .models import Curio, Clip, Tag
 from rest_framework import serializers
+from .utils import get_clip_tag_names
 
 class CurioCreateSerializer(serializers.ModelSerializer):
     # user_id = serializers.UUIDField(write_only=True)
@@ -20,22 +21,44 @@ class ClipListSerializer(serializers.ModelSerializer):
     tags = serializers.SerializerMethodField()
     curio_name = serializers.CharField(source="curio.name", read_only=True)
     percent_match = serializers.SerializerMethodField()
+    snippet = serializers.SerializerMethodField()
+    snippet_start_seconds = serializers.SerializerMethodField()
 
     class Meta:
         model = Clip
         fields = [
             "id", "platform_video_id", "url", "title", "summary", "transcript", "thumbnail_url", "platform",
-            "created_at", "is_favorite", "curio", "curio_name", "description", "tags", "percent_match"
+            "created_at", "is_favorite", "curio", "curio_name", "description", "tags", "percent_match", "snippet",
+            "snippet_start_seconds"
         ]
 
+    # Video-level fields are read through the shared ClipContent.
+    SHARED_FIELDS = ("title", "summary", "transcript", "description", "thumbnail_url")
+
+    def to_representation(self, obj):
+        data = super().to_representation(obj)
+        for field in self.SHARED_FIELDS:
+            data[field] = obj.shared(field)
+        return data
+
     def get_tags(self, obj):
-        return list(obj.cliptag_set.values_list('tag__name', flat=True))
+        return get_clip_tag_names(obj)
     
     def get_percent_match(self, obj):
         # Get from serializer context if available
         percent_map = self.context.get("percent_match_map", {})
         return percent_map.get(str(obj.id), None)
 
+    def get_snippet(self, obj):
+        # Best-matching chunk of a search hit
+        snippet_map = self.context.get("snippet_map", {})
+        return snippet_map.get(str(obj.id), None)
+
+    def get_snippet_start_seconds(self, obj):
+        # Where the snippet is spoken in the video (transcript chunks only)
+        start_map = self.context.get("snippet_start_map", {})
+        return start_map.get(str(obj.id), None)
+
 class CurioFeedSerializer(serializers.ModelSerializer):
     owner_name = serializers.CharField(source="user.display_name", read_only=True)
     average_rating = serializers.FloatField(read_only=True)
@@ -1,4 +1,9 @@
-from celery import shared_task
+from functools import wraps
+from contextlib import nullcontext
+from celery import shared_task, chain
+from celery.exceptions import Retry
+from celery.utils.time import get_exponential_backoff_interval
+from django.utils import timezone
 from .models import Clip, Curio, ClipProcessingTask
 from .utils import (
     fetch_audio_and_metadata,
@@ -8,142 +13,464 @@ from .utils import (
     process_clip_embeddings,
     upload_image_to_supabase,
     compress_image,
-    handle_thumbnail_upload
+    handle_thumbnail_upload,
+    UnitOfWork,
+    link_content_tags,
+    canonicalize_clip_url,
+    single_flight_key,
+    acquire_single_flight,
+    refresh_single_flight,
+    single_flight_heartbeat,
+    single_flight_owner,
+    release_single_flight,
+    get_clip_content,
+    content_video_key,
+    content_is_ready,
+    link_clip_to_content,
 )
 from .constants import (
     OPENAI_API_KEY,
     OPENROUTER_API_KEY,
     SUPABASE_URL,
-    SUPABASE_KEY
+    SUPABASE_KEY,
+    CLIP_STAGE_MAX_RETRIES,
+    CLIP_STAGE_RETRY_BACKOFF,
+    CLIP_STAGE_RETRY_BACKOFF_MAX,
+    CLIP_SINGLE_FLIGHT_TTL,
+    CLIP_SINGLE_FLIGHT_POLL,
+    VAD_ENABLED,
+    VAD_MIN_REMOVED_SECONDS,
+    VAD_MIN_KEPT_FRACTION,
+    CLIP_AUDIO_PROFILE,
+    CLIP_AUDIO_PROFILES,
 )
+from . import audio, llm
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task(bind=True)
+# The pipeline is split into stages so each one can be routed to its own queue
+# (see CELERY_TASK_ROUTES in settings) and scaled independently:
+#   download -> fetch_clip_media_task      (network-bound)
+#   images   -> process_thumbnail_task, trim_audio_task (CPU-bound)
+#   ai       -> transcribe / categorize / embed (API-bound)
+# Each stage checkpoints its output on ClipProcessingTask, retries with
+# exponential backoff, and is skipped when a previous attempt already did it.
+# Only one chain runs per video at a time (see process_clip_task); the chain
+# carries the single-flight lock in `state` and releases it when it finishes.
+PIPELINE_STAGES = ['fetch', 'thumbnail', 'trim', 'transcribe', 'categorize', 'embed']
+
+
+def _remove_files(*paths):
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+def _mark_failed(task_entry_id, clip_id, error):
+    logger.error(f"Error processing clip {clip_id}: {str(error)}")
+    ClipProcessingTask.objects.filter(id=task_entry_id).update(
+        status='failed', error=str(error), updated_at=timezone.now()
+    )
+
+
+def _release_flight(state):
+    if state.get("flight_key"):
+        release_single_flight(state["flight_key"], state["flight_token"])
+
+
+def _hand_off_flight(state, wait=0):
+    """
+    Renews the lock as the next stage (or a retry `wait` seconds out) is
+    enqueued, so it outlives the time the message spends in the queue.
+    """
+    if state.get("flight_key"):
+        refresh_single_flight(state["flight_key"], state["flight_token"], CLIP_SINGLE_FLIGHT_TTL + wait)
+
+
+def _stage_done(task_entry, stage):
+    if task_entry.stage not in PIPELINE_STAGES:
+        return False
+    return PIPELINE_STAGES.index(task_entry.stage) >= PIPELINE_STAGES.index(stage)
+
+
+def pipeline_stage(stage):
+    """
+    Turns `func(self, task_entry, clip, uow)` into a resumable pipeline stage.
+    Skips the stage if it's already checkpointed, records it as the last
+    completed stage on success, and retries with backoff on error. Once the
+    retries are exhausted the task is marked failed; the checkpoints are kept
+    so `resume_clip_task` can pick up from the same stage.
+
+    Stages record field changes on `uow` instead of calling save(); they are
+    written together with the stage checkpoint when the stage finishes.
+    A stage may return a later stage name to mark everything up to it done.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, state):
+            task_entry = ClipProcessingTask.objects.get(id=state["task_entry_id"])
+            if _stage_done(task_entry, stage):
+                logger.info(f"Stage '{stage}' already done for clip {state['clip_id']}, skipping")
+                if stage == PIPELINE_STAGES[-1]:
+                    _release_flight(state)
+                else:
+                    _hand_off_flight(state)
+                return state
+            if state.get("flight_key"):
+                # Renewed for as long as the stage runs, however long that is
+                heartbeat = single_flight_heartbeat(state["flight_key"], state["flight_token"], CLIP_SINGLE_FLIGHT_TTL)
+            else:
+                heartbeat = nullcontext()
+            uow = UnitOfWork()
+            try:
+                clip = Clip.objects.select_related('content').get(id=state["clip_id"])
+                with heartbeat:
+                    done_stage = func(self, task_entry, clip, uow) or stage
+            except Exception as e:
+                if self.request.retries < CLIP_STAGE_MAX_RETRIES:
+                    countdown = get_exponential_backoff_interval(
+                        factor=CLIP_STAGE_RETRY_BACKOFF,
+                        retries=self.request.retries,
+                        maximum=CLIP_STAGE_RETRY_BACKOFF_MAX,
+                        full_jitter=True,
+                    )
+                    logger.warning(
+                        f"Stage '{stage}' failed for clip {state['clip_id']}, "
+                        f"retrying in {countdown}s: {e}"
+                    )
+                    ClipProcessingTask.objects.filter(id=task_entry.id).update(
+                        error=str(e), updated_at=timezone.now()
+                    )
+                    _hand_off_flight(state, wait=countdown)
+                    raise self.retry(exc=e, countdown=countdown)
+                _mark_failed(task_entry.id, state["clip_id"], e)
+                _remove_files((task_entry.metadata or {}).get("thumbnail_path"))
+                _release_flight(state)
+                raise
+            uow.set(task_entry, stage=done_stage)
+            uow.flush()
+            if done_stage == PIPELINE_STAGES[-1]:
+                _release_flight(state)
+            else:
+                _hand_off_flight(state)
+            return state
+        return wrapper
+    return decorator
+
+
+def start_pipeline(task_entry, flight_key=None, flight_token=None):
+    """Chains the stages that haven't been checkpointed yet for this task."""
+    state = {
+        "task_entry_id": task_entry.id,
+        "clip_id": str(task_entry.clip_id),
+        "flight_key": flight_key,
+        "flight_token": flight_token,
+    }
+    stage_tasks = {
+        'fetch': fetch_clip_media_task,
+        'thumbnail': process_thumbnail_task,
+        'trim': trim_audio_task,
+        'transcribe': transcribe_clip_task,
+        'categorize': categorize_clip_task,
+        'embed': embed_clip_task,
+    }
+    remaining = [s for s in PIPELINE_STAGES if not _stage_done(task_entry, s)]
+    if not remaining:
+        return None
+    signatures = [stage_tasks[remaining[0]].s(state)]
+    signatures += [stage_tasks[s].s() for s in remaining[1:]]
+    return chain(*signatures).apply_async()
+
+
+# max_retries=None: the only retry is the single-flight poll below, which
+# must not give up while another task holds the lock (the lock expires
+# CLIP_SINGLE_FLIGHT_TTL seconds after its holder stops heartbeating).
+@shared_task(bind=True, max_retries=None)
 def process_clip_task(self, clip_id):
     task_entry = ClipProcessingTask.objects.get(celery_task_id=self.request.id)
-    audio_path = None  # Initialize audio_path as None
+    flight_key = flight_token = None
     try:
-        task_entry.status = 'processing'
-        task_entry.save()
+        if task_entry.status != 'processing':
+            task_entry.status = 'processing'
+            task_entry.save(update_fields=['status', 'updated_at'])
         clip = Clip.objects.get(id=clip_id)
 
+        if task_entry.stage:
+            # Redelivered after the chain already started; continue it unless
+            # it's still running.
+            if not _claim_pipeline(self, task_entry, clip):
+                return
+            start_pipeline(task_entry, single_flight_key(clip.url), str(task_entry.id))
+            return
+
+        # Link the clip to the shared content for its canonical video id up
+        # front, so every URL of the same video (youtu.be, /shorts, ?si=...)
+        # lands on the same transcript, summary and embeddings.
+        platform, video_id = canonicalize_clip_url(clip.url)
+        if video_id:
+            uow = UnitOfWork()
+            uow.set(
+                clip,
+                platform=platform,
+                platform_video_id=video_id,
+                content=get_clip_content(platform, video_id),
+            )
+            uow.flush()
+
+        # Single-flight: if another task is already processing this video,
+        # wait for it to finish and then reuse its result.
+        key = single_flight_key(clip.url)
+        if not acquire_single_flight(key, str(task_entry.id), CLIP_SINGLE_FLIGHT_TTL):
+            logger.info(f"Clip {clip_id} is being processed by another task, waiting")
+            raise self.retry(countdown=CLIP_SINGLE_FLIGHT_POLL)
+        flight_key, flight_token = key, str(task_entry.id)
+
         reused = reuse_clip_if_exists(clip, OPENAI_API_KEY, SUPABASE_URL, SUPABASE_KEY)
         if reused:
             logger.info("Clip already exists, skipping processing!")
+            release_single_flight(flight_key, flight_token)
             task_entry.status = 'completed'
-            task_entry.save()
+            task_entry.save(update_fields=['status', 'updated_at'])
             return
 
-        # 1. Fetch audio + metadata
-        data = fetch_audio_and_metadata(clip.url)
-        logger.info(f"Fetched data for clip {clip_id}: {data}")
-        audio_path = data['filepath']
-        thumbnail_path = data.get('thumbnail_path')
-        public_url = None
+        start_pipeline(task_entry, flight_key, flight_token)
+    except Retry:
+        raise
+    except Exception as e:
+        _mark_failed(task_entry.id, clip_id, e)
+        if flight_key:
+            release_single_flight(flight_key, flight_token)
+
 
-        if thumbnail_path and os.path.exists(thumbnail_path):
-            compressed_path = thumbnail_path.replace(".jpg", "_compressed.jpg")
-            try:
-                compress_image(thumbnail_path, compressed_path, max_size=(320, 320), quality=60)
-                storage_path = f"{clip.id}.jpg"
-                public_url = upload_image_to_supabase(
-                    compressed_path, storage_path, SUPABASE_URL, SUPABASE_KEY, bucket="thumbnails"
-                )
-                clip.thumbnail_url = public_url
-                clip.save()
-            finally:
-                if os.path.exists(thumbnail_path):
-                    os.remove(thumbnail_path)
-                if os.path.exists(compressed_path):
-                    os.remove(compressed_path)
-        else:
-            if data.get('thumbnail'):
-                public_url = handle_thumbnail_upload(
-                    data['thumbnail'],
-                    clip.id,
-                    SUPABASE_URL,
-                    SUPABASE_KEY,
-                    max_size=(320, 320),
-                    quality=60,
-                    bucket="thumbnails"
-                )
-            clip.thumbnail_url = public_url
-            clip.save()
-
-        clip.title = data['title']
-        clip.platform = data['platform']
-        clip.platform_video_id = data.get('platform_video_id')
-        clip.save()
-
-
-        # 2. Transcribe audio
-        transcript = transcribe_audio_with_openai(audio_path, OPENAI_API_KEY)
-        logger.info(f"Transcript for {clip_id}: {transcript}")
-        clip.transcript = transcript
-        clip.save()
-
-
-        # 3. Fetch only the user's Curios for categorization
+def _claim_pipeline(task, task_entry, clip):
+    """
+    Takes the single-flight lock for restarting `task_entry`'s chain. False
+    when the entry's own chain still holds it (nothing to restart); retries
+    `task` later while another task's chain holds it.
+    """
+    key, token = single_flight_key(clip.url), str(task_entry.id)
+    if single_flight_owner(key) == token:
+        logger.info(f"Pipeline for clip {clip.id} is still running, not restarting it")
+        return False
+    if not acquire_single_flight(key, token, CLIP_SINGLE_FLIGHT_TTL):
+        logger.info(f"Clip {clip.id} is being processed by another task, waiting")
+        raise task.retry(countdown=CLIP_SINGLE_FLIGHT_POLL)
+    return True
+
+
+@shared_task(bind=True, max_retries=None)
+def resume_clip_task(self, task_entry_id):
+    """Restart a failed task from its first incomplete stage."""
+    task_entry = ClipProcessingTask.objects.get(id=task_entry_id)
+    clip = Clip.objects.get(id=task_entry.clip_id)
+    if not _claim_pipeline(self, task_entry, clip):
+        return
+    task_entry.status = 'processing'
+    task_entry.error = None
+    task_entry.save(update_fields=['status', 'error', 'updated_at'])
+    start_pipeline(task_entry, single_flight_key(clip.url), str(task_entry.id))
+
+
+@shared_task
+def evict_llm_cache_task():
+    """Periodic (celery beat): drop expired and least recently used LLM results."""
+    return llm.evict_llm_cache()
+
+
+@shared_task(bind=True, max_retries=CLIP_STAGE_MAX_RETRIES)
+@pipeline_stage('fetch')
+def fetch_clip_media_task(self, task_entry, clip, uow):
+    """1. Fetch audio + metadata (and the raw thumbnail image)."""
+    data = fetch_audio_and_metadata(clip.url)
+    logger.info(f"Fetched data for clip {clip.id}: {data}")
+    content = clip.content or get_clip_content(
+        data['platform'], content_video_key(data.get('platform_video_id'), clip.url)
+    )
+    if content_is_ready(content):
+        # e.g. a short link that resolved to an already processed video
+        logger.info(f"Content for clip {clip.id} already processed, reusing it")
+        _remove_files(data.get('filepath'), data.get('thumbnail_path'))
+        link_clip_to_content(clip, content, uow)
+        uow.set(task_entry, status='completed', error=None)
+        return PIPELINE_STAGES[-1]
+
+    uow.set(
+        task_entry,
+        audio_path=data['filepath'],
+        timestamp_map=None,
+        # Captions, when available, stand in for the Whisper transcript
+        transcript=data.get('transcript'),
+        transcript_segments=None,
+        metadata={
+            key: data.get(key)
+            for key in (
+                'title', 'duration', 'uploader', 'thumbnail',
+                'thumbnail_path', 'platform', 'platform_video_id',
+            )
+        },
+    )
+    uow.set(
+        clip,
+        content=content,
+        platform=data['platform'],
+        platform_video_id=data.get('platform_video_id'),
+    )
+    uow.set(content, title=data['title'] or "")
+
+
+@shared_task(bind=True, max_retries=CLIP_STAGE_MAX_RETRIES)
+@pipeline_stage('thumbnail')
+def process_thumbnail_task(self, task_entry, clip, uow):
+    """Compress the thumbnail and upload it to Supabase storage (once per video)."""
+    content = clip.content
+    metadata = task_entry.metadata or {}
+    thumbnail_path = metadata.get('thumbnail_path')
+    if content.thumbnail_url:
+        _remove_files(thumbnail_path)
+        return
+
+    public_url = None
+    if thumbnail_path and os.path.exists(thumbnail_path):
+        compressed_path = thumbnail_path.replace(".jpg", "_compressed.jpg")
+        try:
+            compress_image(thumbnail_path, compressed_path, max_size=(320, 320), quality=60)
+            storage_path = f"{content.id}.jpg"
+            public_url = upload_image_to_supabase(
+                compressed_path, storage_path, SUPABASE_URL, SUPABASE_KEY, bucket="thumbnails"
+            )
+        finally:
+            _remove_files(compressed_path)
+        _remove_files(thumbnail_path)
+    elif metadata.get('thumbnail'):
+        public_url = handle_thumbnail_upload(
+            metadata['thumbnail'],
+            content.id,
+            SUPABASE_URL,
+            SUPABASE_KEY,
+            max_size=(320, 320),
+            quality=60,
+            bucket="thumbnails"
+        )
+    uow.set(content, thumbnail_url=public_url or "")
+
+
+@shared_task(bind=True, max_retries=CLIP_STAGE_MAX_RETRIES)
+@pipeline_stage('trim')
+def trim_audio_task(self, task_entry, clip, uow):
+    """Cut silence / non-speech out of the audio before it's uploaded for transcription."""
+    audio_path = task_entry.audio_path
+    if not VAD_ENABLED or task_entry.transcript is not None:
+        return
+    if not audio_path or not os.path.exists(audio_path):
+        # The transcribe stage downloads it again and sends it untrimmed
+        return
+
+    trimmed_path, timestamp_map, stats = audio.trim_to_speech(
+        audio_path, bitrate=CLIP_AUDIO_PROFILES[CLIP_AUDIO_PROFILE]["bitrate"]
+    )
+    removed = stats["original_seconds"] - stats["kept_seconds"]
+    logger.info(
+        f"VAD for clip {clip.id}: removed {removed:.1f}s of "
+        f"{stats['original_seconds']:.1f}s, {stats['original_bytes']} -> {stats['trimmed_bytes']} bytes"
+    )
+    if (
+        removed < VAD_MIN_REMOVED_SECONDS
+        or stats["trimmed_bytes"] >= stats["original_bytes"]
+        # Little or no speech found (music, ASMR, steady noise): let Whisper
+        # have the original rather than an empty or near-empty file
+        or stats["kept_seconds"] < VAD_MIN_KEPT_FRACTION * stats["original_seconds"]
+    ):
+        _remove_files(trimmed_path)
+        return
+    # Point the checkpoint at the trimmed file before the original is deleted;
+    # the map turns transcript times back into times in the video
+    uow.set(task_entry, audio_path=trimmed_path, timestamp_map=timestamp_map)
+    uow.flush()
+    _remove_files(audio_path)
+
+
+@shared_task(bind=True, max_retries=CLIP_STAGE_MAX_RETRIES)
+@pipeline_stage('transcribe')
+def transcribe_clip_task(self, task_entry, clip, uow):
+    """2. Transcribe audio."""
+    if task_entry.transcript is None:
+        audio_path = task_entry.audio_path
+        if not audio_path or not os.path.exists(audio_path):
+            # Scratch file is gone (worker restart, failed run cleaned up):
+            # download the audio again, but keep every other checkpoint.
+            data = fetch_audio_and_metadata(clip.url, prefer_subtitles=False)
+            _remove_files(data.get('thumbnail_path'))
+            audio_path = data['filepath']
+            # The new download is untrimmed
+            uow.set(task_entry, audio_path=audio_path, timestamp_map=None)
+            uow.flush()
+        transcript, segments = transcribe_audio_with_openai(audio_path, OPENAI_API_KEY, task_entry.timestamp_map)
+        logger.info(f"Transcript for {clip.id}: {transcript}")
+        # Checkpoint right away: the Whisper call is the expensive part.
+        uow.set(task_entry, transcript=transcript, transcript_segments=segments)
+        uow.flush()
+
+    _remove_files(task_entry.audio_path)
+    uow.set(task_entry, audio_path=None)
+    uow.set(clip.content, transcript=task_entry.transcript, transcript_segments=task_entry.transcript_segments)
+
+
+@shared_task(bind=True, max_retries=CLIP_STAGE_MAX_RETRIES)
+@pipeline_stage('categorize')
+def categorize_clip_task(self, task_entry, clip, uow):
+    """3-5. Summarize, tag and assign a Curio using the user's Curios."""
+    if task_entry.llm_result is None:
+        # Fetch only the user's Curios for categorization
         curio_names = list(
             Curio.objects.filter(user_id=clip.user_id).values_list('name', flat=True)
         )
         logger.info(f"Existing curios: {curio_names}")
 
-        # 4. Summarize & categorize
-        summary_data = summarize_and_categorize_clip(transcript, curio_names, OPENROUTER_API_KEY)
+        summary_data = summarize_and_categorize_clip(task_entry.transcript, curio_names, OPENROUTER_API_KEY)
         logger.info(f"AI response: {summary_data}")
-        clip.summary = summary_data.get("one_line_summary", "")
-        clip.save()
-
-        # Tags: Save as Tag and ClipTag relationships
-        from .models import Tag, ClipTag
-        tags = summary_data.get("tags", [])
-        for tag_name in tags:
-            tag, _ = Tag.objects.get_or_create(name=tag_name)
-            ClipTag.objects.get_or_create(clip=clip, tag=tag)
-
-        # Assign or suggest Curio (category)
-        assigned_curio_name = summary_data.get("assigned_curio")
-        suggested_curio_name = summary_data.get("suggested_curio")
-
-        if suggested_curio_name:
-            new_curio, created = Curio.objects.get_or_create(
-                 name=suggested_curio_name,
-                 user_id=clip.user_id,
-                 defaults={
-                    "description": f"Created by AI suggestion based on video content.",
-                    "is_public": False,
-                 }
-            )
-            clip.curio = new_curio
-            clip.save()
-        elif assigned_curio_name and assigned_curio_name != "Other":
-            try:
-                assigned_curio = Curio.objects.get(name=assigned_curio_name)
-                clip.curio = assigned_curio
-                clip.save()
-            except Curio.DoesNotExist as e:
-                logger.info(f"Error during fetching curio: {e}")
-                pass
-        
-        # 5. Save full description as well
-        clip.description = summary_data.get("description", "")
-        clip.save()
-
-        process_clip_embeddings(clip, OPENAI_API_KEY)
-
-        task_entry.status = 'completed'
-        task_entry.save()
-    except Exception as e:
-        logger.error(f"Error processing clip {clip_id}: {str(e)}")
-        task_entry.status = 'failed'
-        task_entry.error = str(e)
-        task_entry.save()
-    finally:
-        if audio_path and os.path.exists(audio_path):
-            os.remove(audio_path)
-        
\ No newline at end of file
+        uow.set(task_entry, llm_result=summary_data)
+        uow.flush()
+    summary_data = task_entry.llm_result
+
+    # Tags are video-level: stored once on the shared content
+    link_content_tags(clip.content, summary_data.get("tags", []))
+
+    # Assign or suggest Curio (category)
+    assigned_curio_name = summary_data.get("assigned_curio")
+    suggested_curio_name = summary_data.get("suggested_curio")
+
+    if suggested_curio_name:
+        new_curio, created = Curio.objects.get_or_create(
+             name=suggested_curio_name,
+             user_id=clip.user_id,
+             defaults={
+                "description": f"Created by AI suggestion based on video content.",
+                "is_public": False,
+             }
+        )
+        uow.set(clip, curio=new_curio)
+    elif assigned_curio_name and assigned_curio_name != "Other":
+        try:
+            assigned_curio = Curio.objects.get(name=assigned_curio_name)
+            uow.set(clip, curio=assigned_curio)
+        except Curio.DoesNotExist as e:
+            logger.info(f"Error during fetching curio: {e}")
+            pass
+
+    uow.set(
+        clip.content,
+        summary=summary_data.get("one_line_summary", ""),
+        description=summary_data.get("description", ""),
+    )
+
+
+@shared_task(bind=True, max_retries=CLIP_STAGE_MAX_RETRIES)
+@pipeline_stage('embed')
+def embed_clip_task(self, task_entry, clip, uow):
+    """6. Embed title/summary/description/transcript and finish the task."""
+    # replace=True: a previous attempt may have written rows before failing.
+    process_clip_embeddings(clip.content, OPENAI_API_KEY, replace=True)
+    uow.set(task_entry, status='completed', error=None)
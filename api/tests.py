@@ -1,3 +1,580 @@
-from django.test import TestCase
+import os
+import tempfile
+import uuid
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase
+from . import audio, chunking, llm, numpy_index, utils
+from .batcher import MicroBatcher
+from .models import Clip, ClipContent
+from .utils import (
+    UnitOfWork, canonicalize_clip_url, content_video_key, subtitles_to_text, _pick_subtitle_track,
+)
 
-# Create your tests here.
+
+class UnitOfWorkTests(SimpleTestCase):
+    def flush(self, uow, model):
+        with mock.patch.object(model, "save", autospec=True) as save, \
+                mock.patch("api.utils.transaction.atomic"):
+            uow.flush()
+        return save
+
+    def test_writes_only_changed_fields_once(self):
+        clip = Clip(title="a", platform="youtube")
+        uow = UnitOfWork()
+        uow.set(clip, title="a", platform="tiktok")
+        uow.set(clip, description="d")
+        save = self.flush(uow, Clip)
+        save.assert_called_once_with(clip, update_fields=["description", "platform"])
+
+    def test_unchanged_relation_is_compared_by_id(self):
+        content = ClipContent(id=uuid.uuid4())
+        clip = Clip(content_id=content.id)
+        uow = UnitOfWork()
+        uow.set(clip, content=content)
+        save = self.flush(uow, Clip)
+        save.assert_not_called()
+
+    def test_second_instance_with_same_pk_is_saved(self):
+        clip_id = uuid.uuid4()
+        first, second = Clip(id=clip_id, title="a"), Clip(id=clip_id, title="a")
+        uow = UnitOfWork()
+        uow.set(first, title="x")
+        uow.set(second, platform="tiktok")
+        save = self.flush(uow, Clip)
+        save.assert_called_once_with(first, update_fields=["platform", "title"])
+        self.assertEqual(first.platform, "tiktok")
+        self.assertEqual(second.platform, "tiktok")
+
+    def test_auto_now_fields_are_bumped(self):
+        content = ClipContent(id=uuid.uuid4(), summary="")
+        uow = UnitOfWork()
+        uow.set(content, summary="s")
+        save = self.flush(uow, ClipContent)
+        save.assert_called_once_with(content, update_fields=["summary", "updated_at"])
+
+
+class CanonicalizeClipUrlTests(SimpleTestCase):
+    def test_youtube_variants_share_one_key(self):
+        for url in (
+            "https://youtu.be/dQw4w9WgXcQ?si=abc",
+            "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=10s",
+            "youtube.com/shorts/dQw4w9WgXcQ",
+            "https://m.youtube.com/embed/dQw4w9WgXcQ",
+        ):
+            self.assertEqual(canonicalize_clip_url(url), ("youtube", "dQw4w9WgXcQ"), url)
+
+    def test_tiktok_and_instagram_ids(self):
+        self.assertEqual(
+            canonicalize_clip_url("https://www.tiktok.com/@user/video/7301234567890?lang=en"),
+            ("tiktok", "7301234567890"),
+        )
+        self.assertEqual(canonicalize_clip_url("https://www.instagram.com/reel/Cx1AbC/"), ("instagram", "Cx1AbC"))
+
+    def test_short_links_have_no_id(self):
+        self.assertEqual(canonicalize_clip_url("https://vm.tiktok.com/ZMabc123/"), ("tiktok", None))
+
+    def test_content_key_falls_back_to_the_url(self):
+        self.assertEqual(content_video_key("abc", "https://x.test/v"), "abc")
+        self.assertEqual(content_video_key(None, " https://x.test/v "), "url:https://x.test/v")
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_duplicate_submission_waits_for_the_first_and_reuses_it(self):
+        from . import tasks
+
+        url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+        clips = {str(c.id): c for c in (Clip(id=uuid.uuid4(), url=url), Clip(id=uuid.uuid4(), url=url + "&si=x"))}
+        entries = {
+            task_id: mock.Mock(id=n, stage="", status="pending")
+            for n, task_id in enumerate(("first", "second"))
+        }
+        lock, polls = {}, []
+
+        def acquire(key, token, ttl):
+            if lock.setdefault(key, token) == token:
+                return True
+            polls.append(token)
+            if len(polls) == 5:
+                # The first task finishes while the second one polls
+                del lock[key]
+            return False
+
+        with mock.patch.object(tasks.ClipProcessingTask, "objects") as task_objects, \
+                mock.patch.object(tasks.Clip, "objects") as clip_objects, \
+                mock.patch.object(tasks, "acquire_single_flight", side_effect=acquire), \
+                mock.patch.object(tasks, "release_single_flight"), \
+                mock.patch.object(tasks, "get_clip_content"), \
+                mock.patch.object(tasks, "UnitOfWork"), \
+                mock.patch.object(tasks, "reuse_clip_if_exists", side_effect=[False, True]), \
+                mock.patch.object(tasks, "start_pipeline") as start_pipeline, \
+                mock.patch.object(tasks, "_mark_failed") as mark_failed:
+            task_objects.get.side_effect = lambda celery_task_id: entries[celery_task_id]
+            clip_objects.get.side_effect = lambda id: clips[id]
+            first_id, second_id = clips
+            tasks.process_clip_task.apply(args=[first_id], task_id="first")
+            tasks.process_clip_task.apply(args=[second_id], task_id="second")
+
+        # More polls than Celery's default max_retries (3)
+        self.assertEqual(len(polls), 5)
+        mark_failed.assert_not_called()
+        start_pipeline.assert_called_once()
+        self.assertEqual(entries["second"].status, "completed")
+
+    def test_resume_takes_the_lock_and_skips_a_running_chain(self):
+        from . import tasks
+
+        clip = Clip(id=uuid.uuid4(), url="https://youtu.be/dQw4w9WgXcQ")
+        entry = mock.Mock(id=7, clip_id=clip.id)
+        with mock.patch.object(tasks.ClipProcessingTask, "objects") as task_objects, \
+                mock.patch.object(tasks.Clip, "objects") as clip_objects, \
+                mock.patch.object(tasks, "single_flight_owner", side_effect=["7", None]), \
+                mock.patch.object(tasks, "acquire_single_flight", return_value=True) as acquire, \
+                mock.patch.object(tasks, "start_pipeline") as start_pipeline:
+            task_objects.get.return_value = entry
+            clip_objects.get.return_value = clip
+            # The entry's own chain still holds the lock: nothing to restart
+            tasks.resume_clip_task.apply(args=[entry.id])
+            start_pipeline.assert_not_called()
+            tasks.resume_clip_task.apply(args=[entry.id])
+
+        acquire.assert_called_once()
+        start_pipeline.assert_called_once_with(entry, "clip:inflight:youtube:dQw4w9WgXcQ", "7")
+
+
+def _tracks(*keys):
+    return {key: [{"ext": "srt", "url": f"{key}.srt"}, {"ext": "vtt", "url": f"{key}.vtt"}] for key in keys}
+
+
+class SubtitleTests(SimpleTestCase):
+    def test_subtitles_to_text_strips_cues_and_rolling_repeats(self):
+        raw = (
+            "WEBVTT\nKind: captions\nLanguage: en\n\n"
+            "NOTE this block is skipped\nstill skipped\n\n"
+            "1\n00:00:00.000 --> 00:00:02.000\n<c>Hello</c> [Music] there\n\n"
+            "00:00:02.000 --> 00:00:04.000\nHello there\nand &amp; welcome\n"
+        )
+        self.assertEqual(subtitles_to_text(raw), "Hello there and & welcome")
+
+    def test_manual_subtitles_win_in_the_videos_language(self):
+        info = {"language": "de", "subtitles": _tracks("en", "de"), "automatic_captions": _tracks("de-orig")}
+        self.assertEqual(_pick_subtitle_track(info), "de.vtt")
+
+    def test_translated_automatic_captions_are_ignored(self):
+        # A German video without a known language: "en" is a machine translation
+        info = {"language": None, "automatic_captions": _tracks("en", "fr", "de-orig", "de")}
+        self.assertEqual(_pick_subtitle_track(info), "de-orig.vtt")
+        info = {"language": None, "automatic_captions": _tracks("en", "fr")}
+        self.assertIsNone(_pick_subtitle_track(info))
+
+    def test_automatic_captions_in_the_spoken_language(self):
+        info = {"language": "en", "automatic_captions": _tracks("de", "en-orig", "en")}
+        self.assertEqual(_pick_subtitle_track(info), "en-orig.vtt")
+        info = {"language": None, "automatic_captions": _tracks("en")}
+        self.assertEqual(_pick_subtitle_track(info), "en.vtt")
+
+
+def _speech(seconds, sample_rate=16000, seed=0):
+    # A 220 Hz tone with a little noise stands in for voiced speech
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    rng = np.random.default_rng(seed)
+    return (8000 * np.sin(2 * np.pi * 220 * t) + rng.normal(0, 200, t.size)).astype(np.int16)
+
+
+def _silence(seconds, sample_rate=16000, seed=1):
+    return np.random.default_rng(seed).normal(0, 20, int(seconds * sample_rate)).astype(np.int16)
+
+
+class SegmentTests(SimpleTestCase):
+    def test_cuts_go_to_the_nearest_silence(self):
+        self.assertEqual(audio.plan_segments(100, [(58, 60)], 60, 2), [(0.0, 61.0), (59.0, 100)])
+        self.assertEqual(audio.plan_segments(70, [(30, 31)], 60, 2), [(0.0, 70)])
+
+    def test_hard_cuts_without_silences_overlap(self):
+        self.assertEqual(
+            audio.plan_segments(200, [], 60, 2),
+            [(0.0, 62.0), (60.0, 122.0), (120.0, 182.0), (180.0, 200)],
+        )
+
+    def test_stitching_drops_the_repeated_overlap(self):
+        text, spans = audio.stitch_transcripts([
+            "Hello there, my friend. How are",
+            "how are you doing today?",
+            "Today?",  # a single repeated word is not treated as overlap
+            "Fine, thanks. Bye now",
+            "bye now.",  # all overlap
+        ])
+        self.assertEqual(text, "Hello there, my friend. How are you doing today? Today? Fine, thanks. Bye now")
+        self.assertEqual(
+            [text[start:end] for start, end in spans],
+            ["Hello there, my friend. How are", "you doing today?", "Today?", "Fine, thanks. Bye now", ""],
+        )
+
+
+class VadTests(SimpleTestCase):
+    def test_detect_speech_finds_the_spoken_spans(self):
+        samples = np.concatenate([_silence(2), _speech(3), _silence(4), _speech(2), _silence(1)])
+        spans = audio.detect_speech(samples, padding_ms=0)
+        self.assertEqual(len(spans), 2)
+        for (start, end), (expected_start, expected_end) in zip(spans, [(2, 5), (9, 11)]):
+            self.assertAlmostEqual(start, expected_start, delta=0.1)
+            self.assertAlmostEqual(end, expected_end, delta=0.1)
+
+    def test_trim_keeps_speech_and_maps_times_back(self):
+        samples = np.concatenate([_silence(2), _speech(3), _silence(4), _speech(2), _silence(1)])
+
+        def encode(kept, out_path, sample_rate=16000, bitrate=32):
+            with open(out_path, "wb") as f:
+                f.write(kept.tobytes())
+            return out_path
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "clip.m4a")
+            with open(path, "wb") as f:
+                f.write(samples.tobytes())
+            with mock.patch.object(audio, "decode_pcm", return_value=samples), \
+                    mock.patch.object(audio, "encode_pcm", side_effect=encode):
+                out_path, timestamp_map, stats = audio.trim_to_speech(path, padding_ms=0)
+            self.assertTrue(os.path.exists(out_path))
+
+        self.assertEqual(len(timestamp_map), 2)
+        self.assertAlmostEqual(stats["kept_seconds"], 5, delta=0.2)
+        self.assertLess(stats["trimmed_bytes"], stats["original_bytes"])
+        # One second into the second kept span is 10s into the original
+        second_start = timestamp_map[1][0]
+        self.assertAlmostEqual(audio.to_original_time(second_start + 1, timestamp_map), 10, delta=0.1)
+        self.assertAlmostEqual(audio.to_original_time(1, timestamp_map), 3, delta=0.1)
+        self.assertEqual(audio.to_original_time(4.0, None), 4.0)
+
+    def test_segment_offsets_are_in_original_time(self):
+        timestamp_map = [[0.0, 10.0, 5.0], [5.0, 30.0, 5.0]]
+        segments = audio.transcript_segments([(0, 20), (20, 40)], [(0.0, 6.0), (4.0, 10.0)], timestamp_map)
+        # The second segment's overlap (4-6s, dropped when stitching) isn't counted twice
+        self.assertEqual(segments, [[0, 20, 10.0, 31.0], [20, 40, 31.0, 35.0]])
+        self.assertEqual(audio.transcript_time(0, segments), 10.0)
+        self.assertEqual(audio.transcript_time(30, segments), 33.0)
+        self.assertEqual(audio.transcript_time(99, segments), 35.0)
+        self.assertIsNone(audio.transcript_time(5, None))
+
+
+class OrderModelsTests(SimpleTestCase):
+    def order(self, stats, now=1000.0):
+        full = {
+            model: {"latency_ewma": None, "opened_until": 0, **values}
+            for model, values in stats.items()
+        }
+        with mock.patch.object(llm, "get_model_stats", return_value=full):
+            return llm.order_models(list(stats), now=now)
+
+    def test_sampled_models_are_sorted_in_their_own_slots(self):
+        ordered = self.order({
+            "slow": {"latency_ewma": 9.0},
+            "new": {},
+            "fast": {"latency_ewma": 1.0},
+        })
+        self.assertEqual(ordered, [("fast", False), ("new", False), ("slow", False)])
+
+    def test_open_breakers_are_skipped_and_half_open_ones_go_last(self):
+        ordered = self.order({
+            "probe": {"latency_ewma": 0.5, "opened_until": 900.0},
+            "open": {"opened_until": 2000.0},
+            "ok": {"latency_ewma": 3.0},
+        })
+        self.assertEqual(ordered, [("ok", False), ("probe", True)])
+
+    def test_all_open_tries_the_one_reopening_first(self):
+        ordered = self.order({
+            "later": {"opened_until": 3000.0},
+            "sooner": {"opened_until": 2000.0},
+        })
+        self.assertEqual(ordered, [("sooner", False)])
+
+
+class LLMCacheTouchTests(SimpleTestCase):
+    def test_redis_hits_refresh_last_used_at_once_per_interval(self):
+        touched = set()
+
+        class FakeRedis:
+            def mget(self, keys):
+                return [b'{"summary": "s"}' for _ in keys]
+
+            def set(self, key, value, nx=False, ex=None):
+                if nx and key in touched:
+                    return None
+                touched.add(key)
+                return True
+
+            def hincrby(self, *args):
+                pass
+
+        with mock.patch.object(llm, "LLM_CACHE_ENABLED", True), \
+                mock.patch.object(llm, "_redis", return_value=FakeRedis()), \
+                mock.patch.object(llm.LLMResultCache, "objects") as objects:
+            for _ in range(3):
+                result, model = llm.get_cached_result("transcript", [], models=["m"])
+                self.assertEqual((result, model), ({"summary": "s"}, "m"))
+
+        objects.filter.assert_called_once_with(cache_key=llm.llm_cache_key("transcript", [], "m"))
+        objects.filter.return_value.update.assert_called_once()
+
+
+def _feed_pieces(text, size, required=None):
+    parser = llm.IncrementalJSONObject()
+    for i in range(0, len(text), size):
+        parser = llm._feed(parser, text[i:i + size], required or {})
+    return parser
+
+
+class IncrementalJSONTests(SimpleTestCase):
+    ANSWER = '```json\n{"summary": "A {braced}, \\"quoted\\" talk", "tags": ["a", "b"], "meta": {"n": [1, 2]}}\n```'
+
+    def test_pairs_are_decoded_as_they_end_at_any_split(self):
+        for size in (1, 3, 7, len(self.ANSWER)):
+            parser = _feed_pieces(self.ANSWER, size)
+            self.assertTrue(parser.complete, size)
+            self.assertEqual(parser.values, {
+                "summary": 'A {braced}, "quoted" talk', "tags": ["a", "b"], "meta": {"n": [1, 2]},
+            })
+
+    def test_values_are_available_before_the_object_ends(self):
+        parser = llm.IncrementalJSONObject()
+        self.assertEqual(parser.feed('Sure! {"summary": "s", "tags": ["x"'), "")
+        self.assertEqual(parser.values, {"summary": "s"})
+        self.assertFalse(parser.complete)
+        self.assertEqual(parser.feed(']} trailing'), " trailing")
+        self.assertEqual(parser.values, {"summary": "s", "tags": ["x"]})
+
+    def test_objects_without_the_required_keys_are_skipped(self):
+        required = {"summary": str, "tags": list}
+        text = 'For example {"summary": ""} -- answer: {"summary": "real", "tags": ["t"]}'
+        for size in (1, 5, len(text)):
+            parser = _feed_pieces(text, size, required)
+            self.assertTrue(parser.complete, size)
+            self.assertEqual(parser.values["summary"], "real")
+
+    def test_has_required_keys_checks_types_and_emptiness(self):
+        required = {"summary": str, "tags": list, "assigned_curio": (str, type(None))}
+        self.assertTrue(llm.has_required_keys({"summary": "s", "tags": ["t"], "assigned_curio": None}, required))
+        self.assertFalse(llm.has_required_keys({"summary": "s", "tags": [], "assigned_curio": None}, required))
+        self.assertFalse(llm.has_required_keys({"summary": 1, "tags": ["t"], "assigned_curio": None}, required))
+        self.assertFalse(llm.has_required_keys({"summary": "s", "tags": ["t"]}, required))
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def make(self, **options):
+        calls = []
+
+        def send(key, items):
+            calls.append((key, list(items)))
+            return [f"{key}:{item}" for item in items]
+
+        return MicroBatcher(send, **options), calls
+
+    def test_concurrent_callers_share_one_request(self):
+        batcher, calls = self.make(max_wait=0.2)
+        futures = [batcher.submit(["a", "b"], key="k"), batcher.submit(["c"], key="k")]
+        self.assertEqual([f.result(5) for f in futures], [["k:a", "k:b"], ["k:c"]])
+        self.assertEqual(calls, [("k", ["a", "b", "c"])])
+
+    def test_batches_split_by_key_and_size(self):
+        batcher, calls = self.make(max_wait=0.2, max_items=3, max_weight=4, weight=len)
+        futures = [
+            batcher.submit(["x"], key="one"),
+            batcher.submit(["y"], key="two"),
+            batcher.submit(["aa", "b"], key="one"),
+            batcher.submit(["cc"], key="one"),  # over max_weight with the others
+        ]
+        self.assertEqual(futures[2].result(5), ["one:aa", "one:b"])
+        for f in futures:
+            f.result(5)
+        self.assertCountEqual(calls, [("one", ["x", "aa", "b"]), ("two", ["y"]), ("one", ["cc"])])
+
+    def test_errors_reach_every_caller_in_the_batch(self):
+        def send(key, items):
+            raise RuntimeError("boom")
+
+        batcher = MicroBatcher(send, max_wait=0.1)
+        futures = [batcher.submit([1]), batcher.submit([2])]
+        for f in futures:
+            with self.assertRaisesRegex(RuntimeError, "boom"):
+                f.result(5)
+        self.assertEqual(batcher.submit([]).result(1), [])
+
+
+class _WordEncoding:
+    # One token per word: keeps the test independent of tiktoken's download
+    def encode_ordinary(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class ChunkingTests(SimpleTestCase):
+    WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu".split()
+
+    def sentences(self, n):
+        return [
+            f"S{i} " + " ".join(self.WORDS[(i * 7 + j) % 12] for j in range(3 + i % 9)) + "."
+            for i in range(n)
+        ]
+
+    def chunks(self, sentences):
+        with mock.patch.object(chunking, "get_encoding", return_value=_WordEncoding()):
+            return chunking.chunk_spans(" ".join(sentences), 60, 10)
+
+    def test_chunks_are_slices_within_the_token_limits(self):
+        sentences = self.sentences(300)
+        text = " ".join(sentences)
+        chunks = self.chunks(sentences)
+        self.assertEqual(chunks[0].start, 0)
+        self.assertEqual(chunks[-1].end, len(text))
+        for chunk in chunks:
+            self.assertEqual(chunk.text, text[chunk.start:chunk.end])
+            # 2x the target, plus the overlap prefix
+            self.assertLessEqual(chunk.tokens, 120 + 10)
+            self.assertEqual(chunk.hash, chunking.chunk_hash(chunk.text))
+
+    def test_boundaries_stay_put_when_text_is_inserted(self):
+        sentences = self.sentences(300)
+        inserted = "Something entirely new was said here."
+        before = self.chunks(sentences)
+        after = self.chunks(sentences[:150] + [inserted] + sentences[150:])
+
+        changed = set(c.hash for c in before) ^ set(c.hash for c in after)
+        # Only the chunk(s) around the insertion are re-embedded
+        self.assertLessEqual(len(changed), 4)
+        self.assertTrue(any(inserted in c.text for c in after))
+        offset = len(" ".join(sentences[:150])) + 1
+        shift = len(inserted) + 1
+        unchanged = {c.hash: c for c in after}
+        for chunk in before:
+            if chunk.hash in unchanged:
+                moved = unchanged[chunk.hash]
+                self.assertEqual(moved.start, chunk.start + (shift if chunk.start >= offset else 0))
+
+
+class VectorSearchModeTests(SimpleTestCase):
+    def search(self, chunk_count):
+        from . import utils
+
+        with mock.patch.object(utils, "VECTOR_SEARCH_ENGINE", "pgvector"), \
+                mock.patch.object(utils, "VECTOR_INDEX_MODE", "full"), \
+                mock.patch.object(utils, "_user_chunk_count", return_value=chunk_count), \
+                mock.patch.object(utils.transaction, "atomic"), \
+                mock.patch.object(utils, "connection") as connection:
+            cursor = connection.cursor.return_value.__enter__.return_value
+            cursor.fetchall.return_value = []
+            utils.vector_search_user_clips([0.1] * 1536, "user", top_n=5, threshold=0.5)
+        return cursor.execute.call_args_list[-1].args[0]
+
+    def test_small_corpora_are_scanned_exactly(self):
+        with mock.patch("api.utils.VECTOR_SEARCH_EXACT_MAX_ROWS", 1000):
+            self.assertIn("user_rows AS MATERIALIZED", self.search(999))
+            self.assertNotIn("user_rows", self.search(1000))
+
+
+class _Rows:
+    """Just enough of a queryset over in-memory clip_embeddings rows for numpy_index."""
+
+    def __init__(self, rows):
+        self.rows = rows  # [{"id", "content_id", "embedding", ...}]
+
+    def filter(self, content_id__in=None, id__in=None):
+        if content_id__in is not None:
+            return _Rows([r for r in self.rows if r["content_id"] in content_id__in])
+        return _Rows([r for r in self.rows if r["id"] in set(id__in)])
+
+    def order_by(self, field):
+        return _Rows(sorted(self.rows, key=lambda r: r[field]))
+
+    def values_list(self, *fields):
+        return [tuple(r[f] for f in fields) for r in self.rows]
+
+    def values(self, *fields):
+        return [{f: r[f] for f in fields} for r in self.rows]
+
+
+class NumpyIndexTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.contents = [uuid.uuid4() for _ in range(4)]
+        # The user has two clips of the first content and none of the last
+        self.clips = [(uuid.uuid4(), self.contents[0]), (uuid.uuid4(), self.contents[0]),
+                      (uuid.uuid4(), self.contents[1]), (uuid.uuid4(), self.contents[2])]
+        self.rows = [
+            {
+                "id": i + 1, "content_id": self.contents[i % 4], "embedding": rng.normal(size=1536),
+                "field": "transcript", "chunk_index": i // 4, "text_chunk": f"chunk {i + 1}", "start_seconds": None,
+            }
+            for i in range(60)
+        ]
+        self.query = rng.normal(size=1536)
+        self.query += 3 * self.rows[10]["embedding"]  # one clear best match
+
+    def brute_force(self, top_n, threshold):
+        owned = {content for _, content in self.clips}
+        query = self.query / np.linalg.norm(self.query)
+        scored = sorted(
+            (
+                (float(np.dot(r["embedding"] / np.linalg.norm(r["embedding"]), query)), r)
+                for r in self.rows if r["content_id"] in owned
+            ),
+            key=lambda hit: -hit[0],
+        )
+        candidates = [hit for hit in scored if hit[0] >= threshold][:top_n * 10]
+        best = {}
+        for score, row in candidates:
+            best.setdefault(row["content_id"], (score, row["id"]))
+        hits = sorted(
+            ((score, clip_id, embedding_id) for content, (score, embedding_id) in best.items()
+             for clip_id, clip_content in self.clips if clip_content == content),
+            key=lambda hit: -hit[0],
+        )[:top_n]
+        return [(clip_id, embedding_id, round(score * 100, 2)) for score, clip_id, embedding_id in hits]
+
+    def search(self, dtype, top_n, threshold):
+        clip_objects = mock.Mock()
+        clip_objects.filter.return_value.values.return_value = self.contents
+        clip_objects.filter.return_value.values_list.return_value = self.clips
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(numpy_index, "VECTOR_NUMPY_INDEX_DIR", tmp), \
+                mock.patch.object(numpy_index, "VECTOR_NUMPY_DTYPE", dtype), \
+                mock.patch.object(numpy_index, "VECTOR_NUMPY_BLOCK_ROWS", 7), \
+                mock.patch.object(numpy_index, "VECTOR_SEARCH_CANDIDATE_FACTOR", 10), \
+                mock.patch.object(numpy_index.Clip, "objects", clip_objects), \
+                mock.patch.object(numpy_index.ClipEmbedding, "objects", _Rows(self.rows)):
+            results = numpy_index.search(self.query, "user", top_n=top_n, threshold=threshold)
+        return [(r["clip_id"], r["embedding_id"], r["percent_match"]) for r in results]
+
+    def test_float32_matches_brute_force(self):
+        for top_n, threshold in ((2, -1.0), (10, -1.0), (10, 0.0), (10, 0.5)):
+            self.assertEqual(self.search("float32", top_n, threshold), self.brute_force(top_n, threshold))
+
+    def test_int8_is_rescored_at_full_precision(self):
+        expected = self.brute_force(10, 0.0)
+        results = self.search("int8", 10, 0.0)
+        self.assertEqual(results[0], expected[0])
+        self.assertEqual(set(results), set(expected))
+
+
+class HybridSearchTests(SimpleTestCase):
+    def test_reciprocal_rank_fusion(self):
+        semantic = [{"clip_id": "a"}, {"clip_id": "b"}, {"clip_id": "c"}]
+        lexical = [{"clip_id": "c"}, {"clip_id": "d"}]
+        fused = utils.reciprocal_rank_fusion([semantic, lexical], k=60)
+        self.assertEqual([clip_id for clip_id, _, _ in fused], ["c", "a", "b", "d"])
+        clip_id, score, found = fused[0]
+        self.assertAlmostEqual(score, 1 / 63 + 1 / 61)
+        self.assertEqual(found, [semantic[2], lexical[0]])
+        self.assertEqual(fused[-1][2], [None, lexical[1]])
+        self.assertEqual(utils.reciprocal_rank_fusion([[], []]), [])
+
+    def test_short_keyword_queries_with_hits_skip_the_embedding(self):
+        lexical = [{"clip_id": "a", "content_id": "x", "rank": 0.5, "text_chunk": "<b>cats</b>"}]
+        with mock.patch.object(utils, "lexical_search_user_clips", return_value=lexical), \
+                mock.patch.object(utils, "embed_query") as embed_query:
+            results = utils.search_user_clips("cats", "user", "key", mode="hybrid")
+        embed_query.assert_not_called()
+        self.assertEqual(results[0]["snippet"], "<b>cats</b>")
+        self.assertIsNone(results[0]["percent_match"])
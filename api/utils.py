@@ -1,20 +1,47 @@
 import re
 import jwt
+import asyncio
+import threading
+import unicodedata
+import base64
+import hashlib
+import html
 import os
 import tempfile
 import openai
 import requests
+import redis
+from urllib.parse import urlparse, parse_qs
 from supabase import create_client
 from PIL import Image
-from django.db import connection
+from django.db import connection, transaction, IntegrityError
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+from django.utils import timezone
 from yt_dlp import YoutubeDL
 import json_repair
+import numpy as np
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from .models import Clip, Tag, ClipTag, Curio, ClipEmbedding, Profile
+from . import aio, audio, batcher, chunking, llm, numpy_index, vector_index
+from .models import ClipContent, ClipContentTag, Tag, Curio, ClipEmbedding, EmbeddingCache, Profile
 from .constants import (
-    EMBEDDING_MODEL, TRANSCRIPTION_MODEL, AI_MODELS,
+    EMBEDDING_MODEL, TRANSCRIPTION_MODEL,
     SUPABASE_JWT_SECRET, COOKIE_STORAGE_PATH, COOKIE_LOCAL_PATH,
-    SUPABASE_URL, SUPABASE_KEY
+    SUPABASE_URL, SUPABASE_KEY, CLIP_WORK_DIR, REDIS_URL,
+    EMBEDDING_CACHE_REDIS_TTL, SUBTITLES_FIRST, SUBTITLE_LANGUAGES,
+    CLIP_AUDIO_PROFILE, CLIP_AUDIO_PROFILES,
+    TRANSCRIPTION_SEGMENT_SECONDS, TRANSCRIPTION_SEGMENT_OVERLAP,
+    TRANSCRIPTION_MAX_WORKERS, TRANSCRIPTION_MAX_UPLOAD_BYTES,
+    LLM_MAP_REDUCE_THRESHOLD_TOKENS, LLM_MAP_CHUNK_TOKENS, LLM_MAP_MAX_WORKERS,
+    ASYNC_IO_ENABLED, EMBEDDING_BATCHING, EMBEDDING_BATCH_WAIT_MS,
+    EMBEDDING_BATCH_MAX_INPUTS, EMBEDDING_BATCH_MAX_TOKENS,
+    QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL,
+    EMBEDDING_CHUNK_TOKENS, EMBEDDING_CHUNK_OVERLAP_TOKENS,
+    VECTOR_SEARCH_EF_SEARCH, VECTOR_SEARCH_ITERATIVE_SCAN, VECTOR_SEARCH_CANDIDATE_FACTOR,
+    VECTOR_SEARCH_EXACT_MAX_ROWS, VECTOR_INDEX_MODE, VECTOR_RERANK_FACTOR, VECTOR_SEARCH_ENGINE,
+    SEARCH_MODE, SEARCH_RRF_K, SEARCH_LEXICAL_MAX_WORDS, SEARCH_HEADLINE_MAX_CHARS,
 )
 import logging
 
@@ -39,6 +66,53 @@ def generate_test_jwt_token(user_id, email=None):
     return token
 
 
+class UnitOfWork:
+    """
+    Collects field changes on model instances and writes them with as few
+    `update_fields`-scoped UPDATEs as possible (one per instance) on flush().
+    Fields set to the value they already hold are not written.
+
+        uow = UnitOfWork()
+        uow.set(clip, title="...", platform="youtube")
+        uow.set(task_entry, stage="fetch")
+        uow.flush()
+    """
+
+    def __init__(self):
+        self._pending = {}
+
+    def set(self, instance, **fields):
+        key = (type(instance), instance.pk)
+        # A second object for the same row: changes go to the first one,
+        # which is what flush() saves
+        stored, dirty = self._pending.setdefault(key, (instance, set()))
+        for name, value in fields.items():
+            # Compare FKs by id so an unchanged relation costs no query
+            field = stored._meta.get_field(name)
+            current = getattr(stored, field.attname)
+            compared = value.pk if field.is_relation and value is not None else value
+            if name not in dirty and current == compared:
+                continue
+            setattr(stored, name, value)
+            if instance is not stored:
+                setattr(instance, name, value)
+            dirty.add(name)
+
+    def flush(self):
+        pending = [(i, f) for i, f in self._pending.values() if f]
+        self._pending = {}
+        if not pending:
+            return
+        with transaction.atomic():
+            for instance, fields in pending:
+                # auto_now fields (e.g. updated_at) are only bumped when listed
+                fields |= {
+                    f.name for f in instance._meta.concrete_fields
+                    if getattr(f, "auto_now", False)
+                }
+                instance.save(update_fields=sorted(fields))
+
+
 def detect_platform(url):
     if "youtube.com" in url or "youtu.be" in url:
         return "youtube"
@@ -64,43 +138,277 @@ def get_platform_video_id(info, url, platform):
     else:
         return info.get("id")
 
-def fetch_audio_and_metadata(url):
+def canonicalize_clip_url(url):
+    """
+    Maps a clip URL to its (platform, platform_video_id) key without any
+    network calls, so youtu.be/x, youtube.com/watch?v=x&si=... and
+    youtube.com/shorts/x all become ("youtube", "x"). The id matches what
+    get_platform_video_id reads from yt-dlp. Returns (platform, None) when the
+    URL doesn't carry the id (e.g. vm.tiktok.com short links).
+    """
+    platform = detect_platform(url)
+    url = url.strip()
+    parsed = urlparse(url if "://" in url else f"https://{url}")
+    host = (parsed.hostname or "").lower()
+    parts = [p for p in parsed.path.split("/") if p]
+
+    def _after(*markers):
+        for i, part in enumerate(parts[:-1]):
+            if part in markers:
+                return parts[i + 1]
+        return None
+
+    video_id = None
+    if platform == "youtube":
+        if host.endswith("youtu.be"):
+            video_id = parts[0] if parts else None
+        else:
+            video_id = _after("shorts", "embed", "live", "v") or parse_qs(parsed.query).get("v", [None])[0]
+    elif platform == "tiktok":
+        video_id = _after("video", "photo", "v")
+        if video_id:
+            video_id = video_id.split(".")[0]
+    elif platform == "instagram":
+        video_id = _after("reel", "reels", "p", "tv")
+    return platform, video_id or None
+
+
+def get_redis():
+    """Shared Redis client (same server as the Celery broker)."""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+_redis_client = None
+
+# Compare-and-delete / compare-and-expire, so only the lock owner can touch it.
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end
+return 0
+"""
+_REFRESH_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('expire', KEYS[1], ARGV[2]) end
+return 0
+"""
+
+
+def single_flight_key(url):
+    """Redis key shared by every task processing the same video."""
+    platform, video_id = canonicalize_clip_url(url)
+    if video_id:
+        return f"clip:inflight:{platform}:{video_id}"
+    return f"clip:inflight:url:{url.strip()}"
+
+
+def acquire_single_flight(key, token, ttl):
+    """True if `token` now owns `key` (or already did)."""
+    r = get_redis()
+    if r.set(key, token, nx=True, ex=ttl):
+        return True
+    owner = r.get(key)
+    return owner is not None and owner.decode() == token
+
+
+def single_flight_owner(key):
+    """Token currently holding `key`, or None."""
+    owner = get_redis().get(key)
+    return owner.decode() if owner is not None else None
+
+
+def refresh_single_flight(key, token, ttl):
+    get_redis().eval(_REFRESH_LOCK_SCRIPT, 1, key, token, ttl)
+
+
+def release_single_flight(key, token):
+    get_redis().eval(_RELEASE_LOCK_SCRIPT, 1, key, token)
+
+
+@contextmanager
+def single_flight_heartbeat(key, token, ttl):
+    """
+    Keeps `token`'s lock on `key` alive while the block runs, refreshing it
+    every ttl/3 seconds from a background thread, so a stage that outlasts
+    the TTL doesn't let a second worker in. If the worker dies the refreshes
+    stop and the lock still expires after `ttl`.
+    """
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(ttl / 3):
+            try:
+                refresh_single_flight(key, token, ttl)
+            except redis.RedisError as e:
+                logger.warning(f"Could not refresh single-flight lock {key}: {e}")
+
+    refresh_single_flight(key, token, ttl)
+    threading.Thread(target=beat, name="single-flight-heartbeat", daemon=True).start()
+    try:
+        yield
+    finally:
+        stop.set()
+
+
+_SUBTITLE_TIMESTAMP_RE = re.compile(r"^\s*(\d+:)?\d+:\d+[.,]\d+\s*-->")
+_SUBTITLE_TAG_RE = re.compile(r"<[^>]+>|\{\\[^}]*\}")
+_SUBTITLE_ANNOTATION_RE = re.compile(r"\[[^\]]*\]|\([^)]*music[^)]*\)", re.IGNORECASE)
+SUBTITLE_MIN_WORDS = 5
+
+
+def subtitles_to_text(raw):
+    """
+    Converts a WebVTT or SRT document to plain transcript text: drops headers,
+    cue numbers, timestamps, styling tags and [Music]-style annotations, and
+    collapses the repeated lines of rolling auto-captions.
+    """
+    lines = []
+    skip_block = False
+    for line in raw.splitlines():
+        line = line.strip()
+        if not line:
+            skip_block = False
+            continue
+        if skip_block or line.isdigit() or _SUBTITLE_TIMESTAMP_RE.match(line):
+            continue
+        if line.startswith(("WEBVTT", "Kind:", "Language:")):
+            continue
+        if line.startswith(("NOTE", "STYLE", "REGION")):
+            skip_block = True
+            continue
+        line = html.unescape(_SUBTITLE_TAG_RE.sub("", line))
+        line = " ".join(_SUBTITLE_ANNOTATION_RE.sub("", line).split())
+        if line and (not lines or lines[-1] != line):
+            lines.append(line)
+    return " ".join(lines)
+
+
+def _language_keys(tracks, lang):
+    """Track keys for `lang` ("en", "en-orig", "en-US", ...), "-orig" first, then the bare code."""
+    keys = [key for key in tracks if key == lang or key.startswith(f"{lang}-")]
+    return sorted(keys, key=lambda k: (k != f"{lang}-orig", k != lang))
+
+
+def _track_url(tracks, keys):
+    for key in keys:
+        for ext in ("vtt", "srt"):
+            for fmt in tracks[key]:
+                if fmt.get("ext") == ext and fmt.get("url"):
+                    return fmt["url"]
+    return None
+
+
+def _pick_subtitle_track(info):
+    """
+    Best caption track URL from yt-dlp info, VTT preferred over SRT. Manual
+    subtitles come first: the video's own language, then SUBTITLE_LANGUAGES.
+    Automatic captions only count in the spoken language: YouTube also
+    lists machine translations of them, so only "<lang>-orig" tracks, the
+    video's own language, or a platform's single track qualify. None means
+    the audio is transcribed with Whisper instead.
+    """
+    language = info.get("language")
+    manual = info.get("subtitles") or {}
+    languages = [lang for lang in [language] + list(SUBTITLE_LANGUAGES) if lang]
+    url = _track_url(manual, [key for lang in languages for key in _language_keys(manual, lang)])
+    if url:
+        return url
+
+    automatic = info.get("automatic_captions") or {}
+    keys = _language_keys(automatic, language) if language else []
+    keys += sorted(key for key in automatic if key.endswith("-orig") and key not in keys)
+    if not keys and not language and len(automatic) == 1:
+        keys = list(automatic)
+    return _track_url(automatic, keys)
+
+
+def fetch_subtitle_transcript(ydl, info):
+    """Transcript text from the video's captions, or None if none are usable."""
+    track_url = _pick_subtitle_track(info)
+    if not track_url:
+        return None
+    try:
+        raw = ydl.urlopen(track_url).read().decode("utf-8", errors="replace")
+    except Exception as e:
+        logger.info(f"Could not download subtitles: {e}")
+        return None
+    text = subtitles_to_text(raw)
+    if len(text.split()) < SUBTITLE_MIN_WORDS:
+        return None
+    return text
+
+
+def audio_ydl_options(profile=None):
+    """
+    yt-dlp options for an audio profile from CLIP_AUDIO_PROFILES: which
+    stream to download and how FFmpeg transcodes it for transcription.
+    """
+    profile = CLIP_AUDIO_PROFILES[profile or CLIP_AUDIO_PROFILE]
+    ffmpeg_args = []
+    if profile.get("channels"):
+        ffmpeg_args += ["-ac", str(profile["channels"])]
+    if profile.get("sample_rate"):
+        ffmpeg_args += ["-ar", str(profile["sample_rate"])]
+    options = {
+        'format': profile["format"],
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': profile["codec"],
+            'preferredquality': str(profile["bitrate"]),
+        }],
+    }
+    if ffmpeg_args:
+        options['postprocessor_args'] = {'extractaudio': ffmpeg_args}
+    return options
+
+
+def fetch_audio_and_metadata(url, prefer_subtitles=SUBTITLES_FIRST, audio_profile=None):
+    """
+    Fetches metadata and thumbnail for a clip plus either its transcript
+    (from captions, when prefer_subtitles and the video has usable ones) or
+    its audio, encoded per `audio_profile` (default CLIP_AUDIO_PROFILE).
+    With captions no audio is downloaded and `filepath` is None; otherwise
+    `transcript` is None and the audio needs transcribing.
+    """
     platform = detect_platform(url)
     cookiefile = ensure_cookie_file()
     ydl_opts = {
-        'format': 'bestaudio/best',
-        'outtmpl': tempfile.mktemp(suffix='.%(ext)s'),
+        'outtmpl': tempfile.mktemp(suffix='.%(ext)s', dir=CLIP_WORK_DIR),
         'quiet': True,
         'nocheckcertificate': True,
         'noplaylist': True,
         'ignoreerrors': False,
         'restrictfilenames': True,
         'cookiefile': cookiefile,
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
+        **audio_ydl_options(audio_profile),
     }
     with YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=True)
+        info = ydl.extract_info(url, download=False)
         if info is None:
             raise ValueError("Could not extract info from URL.")
 
-        # The downloaded file is stored in 'filepath'
-        if 'requested_downloads' in info and len(info['requested_downloads']) > 0:
-            filepath = info['requested_downloads'][0]['filepath']
+        transcript = fetch_subtitle_transcript(ydl, info) if prefer_subtitles else None
+        filepath = None
+        if transcript is None:
+            info = ydl.process_ie_result(info, download=True)
+
+            # The downloaded file is stored in 'filepath'
+            if 'requested_downloads' in info and len(info['requested_downloads']) > 0:
+                filepath = info['requested_downloads'][0]['filepath']
+            else:
+                # Fallback (works for most YouTube videos)
+                codec = ydl_opts['postprocessors'][0]['preferredcodec']
+                filepath = os.path.splitext(ydl.prepare_filename(info))[0] + f".{codec}"
         else:
-            # Fallback (works for most YouTube videos)
-            filepath = ydl.prepare_filename(info).replace('.webm', '.mp3').replace('.m4a', '.mp3')
-        
+            logger.info(f"Using captions as transcript for {url}")
+
         # Download thumbnail image locally for further upload
         thumbnail_url = info.get('thumbnail')
         thumbnail_path = None
         if thumbnail_url:
             _, ext = os.path.splitext(thumbnail_url.split("?")[0])
             ext = ext if ext in [".jpg", ".jpeg", ".png"] else ".jpg"
-            thumbnail_path = tempfile.mktemp(suffix=ext)
+            thumbnail_path = tempfile.mktemp(suffix=ext, dir=CLIP_WORK_DIR)
             try:
                 download_image(thumbnail_url, thumbnail_path)
             except Exception as e:
@@ -117,19 +425,75 @@ def fetch_audio_and_metadata(url):
             'thumbnail_path': thumbnail_path,
             'platform': platform,
             'filepath': filepath,
+            'transcript': transcript,
             'platform_video_id': platform_video_id,
         }
         return metadata
-    
-def transcribe_audio_with_openai(audio_path, openai_api_key):
-    openai.api_key = openai_api_key
+
+def _transcribe_file(audio_path):
     with open(audio_path, "rb") as audio_file:
-        transcript = openai.audio.transcriptions.create(
+        return openai.audio.transcriptions.create(
             model=TRANSCRIPTION_MODEL,
             file=audio_file,
-            response_format="text" 
+            response_format="text"
         )
-    return transcript
+
+
+async def _transcribe_files_async(audio_paths, openai_api_key):
+    client = aio.client("openai", openai_api_key)
+
+    async def transcribe(path):
+        async with aio.limit("openai"):
+            with open(path, "rb") as audio_file:
+                return await client.audio.transcriptions.create(
+                    model=TRANSCRIPTION_MODEL,
+                    file=audio_file,
+                    response_format="text"
+                )
+
+    return await asyncio.gather(*(transcribe(path) for path in audio_paths))
+
+
+def transcribe_audio_with_openai(audio_path, openai_api_key, timestamp_map=None):
+    """
+    Transcribes an audio file. Audio longer than TRANSCRIPTION_SEGMENT_SECONDS
+    (or too big for one upload) is split into overlapping segments, cut at
+    silences where possible, which are transcribed concurrently and stitched
+    back together, so wall time follows segment length, not video length.
+    Returns (transcript, segments): segments lists [char_start, char_end,
+    start_seconds, end_seconds] per transcribed piece, with times mapped
+    through `timestamp_map` (see audio.trim_to_speech) to the original audio.
+    """
+    openai.api_key = openai_api_key
+    duration = audio.probe_duration(audio_path)
+    if (
+        duration <= TRANSCRIPTION_SEGMENT_SECONDS
+        and os.path.getsize(audio_path) <= TRANSCRIPTION_MAX_UPLOAD_BYTES
+    ):
+        if ASYNC_IO_ENABLED:
+            text = aio.run(_transcribe_files_async([audio_path], openai_api_key))[0]
+        else:
+            text = _transcribe_file(audio_path)
+        return text, audio.transcript_segments([(0, len(text))], [(0.0, duration)], timestamp_map)
+
+    # Keep each segment under the upload limit even for high-bitrate audio
+    seconds_per_byte = duration / os.path.getsize(audio_path)
+    target = min(TRANSCRIPTION_SEGMENT_SECONDS, TRANSCRIPTION_MAX_UPLOAD_BYTES * seconds_per_byte * 0.9)
+    segments = audio.plan_segments(
+        duration, audio.detect_silences(audio_path), target, TRANSCRIPTION_SEGMENT_OVERLAP
+    )
+    logger.info(f"Transcribing {duration:.0f}s of audio in {len(segments)} segments")
+    segment_paths = audio.split_audio(audio_path, segments)
+    try:
+        if ASYNC_IO_ENABLED:
+            texts = aio.run(_transcribe_files_async(segment_paths, openai_api_key))
+        else:
+            with ThreadPoolExecutor(max_workers=TRANSCRIPTION_MAX_WORKERS) as pool:
+                texts = list(pool.map(_transcribe_file, segment_paths))
+    finally:
+        audio.remove_files(segment_paths)
+    text, spans = audio.stitch_transcripts(texts)
+    return text, audio.transcript_segments(spans, segments, timestamp_map)
 
 
 def summarize_transcript(transcript, openai_api_key):
@@ -178,29 +542,24 @@ def parse_openai_response(response_content):
         raise ValueError(f"JSON parsing error: {e}\n model_response: {response_content}")
     
 
-def summarize_and_categorize_clip(transcript, curio_names, openai_api_key):
-    prompt = f"""
+# Prompts start with the static instructions and end with the per-clip input,
+# so repeated calls share a prefix that providers can cache.
+SUMMARY_INSTRUCTIONS = """
 You are an AI assistant helping users organize and summarize social video clips.
 
-Below is the transcript of a video:
-
---- BEGIN TRANSCRIPT ---
-{transcript}
---- END TRANSCRIPT ---
-
-Here is a list of allowed Curio names (categories):
-{curio_names}
+You will be given a video transcript (or summaries of consecutive parts of a
+long transcript) and a list of allowed Curio names (categories).
 
-Please analyze the transcript and respond ONLY with valid JSON in the following format:
+Please analyze the video and respond ONLY with valid JSON in the following format:
 
-{{
+{
   "one_line_summary": "<A concise one-sentence summary of the video>",
   "main_tip_or_product": "<The main hack, tip, or product featured in the video>",
   "tags": ["tag1", "tag2", "tag3"],
   "assigned_curio": "<The best matching Curio from the allowed list, or 'Other'>",
   "suggested_curio": "<Suggest a new Curio name if none from the allowed list fit, otherwise null>",
   "description": "<A short (2-3 sentences) description of the video's content>"
-}}
+}
 
 Rules:
 - Use ONLY the provided Curio names for "assigned_curio". If none fit, set "assigned_curio" to "Other" and provide a value for "suggested_curio".
@@ -208,27 +567,114 @@ Rules:
 - "tags" should be 3 to 5 relevant words or short phrases.
 - Only output valid JSON.
 """
-    client = openai.OpenAI(
-         base_url="https://openrouter.ai/api/v1",
-         api_key=openai_api_key
+
+# Keys the pipeline needs; a streamed answer is cut off once they're complete.
+SUMMARY_REQUIRED_KEYS = {
+    "one_line_summary": str,
+    "tags": list,
+    "assigned_curio": str,
+    "suggested_curio": (str, type(None)),
+    "description": str,
+}
+
+PART_SUMMARY_REQUIRED_KEYS = {"summary": str, "tips_or_products": list, "tags": list}
+
+PART_SUMMARY_INSTRUCTIONS = """
+You are an AI assistant summarizing one part of a long social video transcript.
+The summaries of all parts will later be combined into a summary of the whole video.
+
+Respond ONLY with valid JSON in the following format:
+
+{
+  "summary": "<3-5 sentences covering what happens in this part>",
+  "tips_or_products": ["<each hack, tip, or product mentioned>"],
+  "tags": ["tag1", "tag2", "tag3"]
+}
+"""
+
+
+def _summary_prompt(curio_names, body):
+    return f"""{SUMMARY_INSTRUCTIONS}
+Here is the list of allowed Curio names (categories):
+{curio_names}
+
+{body}
+"""
+
+
+def _summarize_part(part, index, total, openai_api_key):
+    prompt = f"""{PART_SUMMARY_INSTRUCTIONS}
+--- BEGIN PART {index} OF {total} ---
+{part}
+--- END PART {index} OF {total} ---
+"""
+    data, _ = llm.hedged_completion(
+        [{"role": "user", "content": prompt}],
+        parse_openai_response,
+        openai_api_key,
+        stream_until=PART_SUMMARY_REQUIRED_KEYS,
+        temperature=0.2,
     )
-    last_exception = None
-    for model in AI_MODELS:
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2,
-            )
-            ai_content = response.choices[0].message.content.strip()
-            logging.info(f"ai content:  {ai_content}")
-            summary_data = parse_openai_response(ai_content)
-            return summary_data
-        except Exception as e:
-            logger.info(f"{model} is busy.. {e}")
-            last_exception = e
-            continue
-    raise last_exception if last_exception else RuntimeError("All model calls failed.")
+    return data
+
+
+def _map_transcript(transcript, openai_api_key):
+    """
+    Map step: summarizes ~LLM_MAP_CHUNK_TOKENS parts of the transcript in
+    parallel. Repeats on the joined part summaries until they fit in
+    LLM_MAP_REDUCE_THRESHOLD_TOKENS, so the reduce prompt stays bounded.
+    """
+    text = transcript
+    while llm.estimate_tokens(text) > LLM_MAP_REDUCE_THRESHOLD_TOKENS:
+        parts = llm.split_by_tokens(text, LLM_MAP_CHUNK_TOKENS)
+        logger.info(f"Map-reduce summary: {len(parts)} parts of ~{LLM_MAP_CHUNK_TOKENS} tokens")
+        with ThreadPoolExecutor(max_workers=min(LLM_MAP_MAX_WORKERS, len(parts))) as pool:
+            summaries = list(pool.map(
+                lambda args: _summarize_part(*args, len(parts), openai_api_key),
+                [(part, i) for i, part in enumerate(parts, start=1)],
+            ))
+        previous_tokens = llm.estimate_tokens(text)
+        text = "\n\n".join(
+            f"Part {i}: {s.get('summary', '')}\n"
+            f"Tips/products: {', '.join(s.get('tips_or_products') or [])}\n"
+            f"Tags: {', '.join(s.get('tags') or [])}"
+            for i, s in enumerate(summaries, start=1)
+        )
+        if llm.estimate_tokens(text) >= previous_tokens:
+            break
+    return text
+
+
+def summarize_and_categorize_clip(transcript, curio_names, openai_api_key):
+    # Sorted so the prompt only depends on what the cache key depends on
+    curio_names = sorted(curio_names)
+    summary_data, model = llm.get_cached_result(transcript, curio_names)
+    if summary_data is not None:
+        logger.info(f"Summary from cache ({model})")
+        return summary_data
+
+    if llm.estimate_tokens(transcript) <= LLM_MAP_REDUCE_THRESHOLD_TOKENS:
+        body = f"""--- BEGIN TRANSCRIPT ---
+{transcript}
+--- END TRANSCRIPT ---"""
+    else:
+        # Reduce step: the final JSON from the part summaries
+        body = f"""The transcript is long, so here are summaries of its consecutive parts:
+
+--- BEGIN PART SUMMARIES ---
+{_map_transcript(transcript, openai_api_key)}
+--- END PART SUMMARIES ---"""
+
+    summary_data, model = llm.hedged_completion(
+        [{"role": "user", "content": _summary_prompt(curio_names, body)}],
+        parse_openai_response,
+        openai_api_key,
+        stream_until=SUMMARY_REQUIRED_KEYS,
+        temperature=0.2,
+    )
+    logger.info(f"Summary from {model}")
+    llm.store_cached_result(transcript, curio_names, model, summary_data)
+    return summary_data
 
 
 def handle_thumbnail_upload(source_url, clip_id, supabase_url, supabase_key, max_size=(320,320), quality=60, bucket="thumbnails"):
@@ -256,193 +702,740 @@ def handle_thumbnail_upload(source_url, clip_id, supabase_url, supabase_key, max
             if os.path.exists(p):
                 os.remove(p)
 
-def reuse_clip_if_exists(clip, OPENAI_API_KEY, SUPABASE_URL, SUPABASE_KEY):
+TAG_NAME_MAX_LENGTH = Tag._meta.get_field("name").max_length
+TAG_ID_CACHE_SIZE = 10000
+
+# Process-local name -> id cache of hot tags (LRU). Tags are never renamed,
+# so entries only go stale if a tag is deleted; link_content_tags handles that.
+_tag_id_cache = OrderedDict()
+_tag_id_lock = threading.Lock()
+
+
+def normalize_tag_names(names):
     """
-    Checks if the given clip's URL was already processed for any other user.
-    If so, clones the results (title, transcript, summary, tags) into this clip.
-    Only copies the curio if one wasn't specified in the original request.
-    Returns True if reused, False if not.
+    Collapses whitespace, truncates to the column width and drops empty or
+    duplicate (case-insensitive) names, keeping the first spelling seen.
     """
-    existing_clip = (
-        Clip.objects
-        .filter(
-            url=clip.url
+    normalized = {}
+    for name in names or []:
+        if not isinstance(name, str):
+            continue
+        name = " ".join(name.split())[:TAG_NAME_MAX_LENGTH].strip()
+        if name:
+            normalized.setdefault(name.casefold(), name)
+    return list(normalized.values())
+
+
+def resolve_tag_ids(names):
+    """
+    Returns {name: tag_id} for already-normalized names. Cached names cost
+    nothing; the rest are created/looked up with a single INSERT ... ON CONFLICT.
+    """
+    tag_ids = {}
+    missing = []
+    with _tag_id_lock:
+        for name in names:
+            tag_id = _tag_id_cache.get(name)
+            if tag_id is None:
+                missing.append(name)
+            else:
+                _tag_id_cache.move_to_end(name)
+                tag_ids[name] = tag_id
+    if not missing:
+        return tag_ids
+
+    sql = """
+        WITH input(name) AS (SELECT unnest(%s::text[])),
+        inserted AS (
+            INSERT INTO tags (name) SELECT name FROM input
+            ON CONFLICT (name) DO NOTHING
+            RETURNING id, name
         )
-        # must have summary *and* transcript
-        .exclude(summary__in=[None, ""])
-        .exclude(transcript__in=[None, ""])
+        SELECT id, name FROM inserted
+        UNION ALL
+        SELECT t.id, t.name FROM tags t JOIN input i ON i.name = t.name;
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [missing])
+        rows = cursor.fetchall()
+        found = {name for _, name in rows}
+        unresolved = [name for name in missing if name not in found]
+        if unresolved:
+            # Inserted by a concurrent transaction that committed after our
+            # snapshot was taken; it's visible to a fresh statement.
+            cursor.execute("SELECT id, name FROM tags WHERE name = ANY(%s);", [unresolved])
+            rows += cursor.fetchall()
+
+    with _tag_id_lock:
+        for tag_id, name in rows:
+            tag_ids[name] = tag_id
+            _tag_id_cache[name] = tag_id
+        while len(_tag_id_cache) > TAG_ID_CACHE_SIZE:
+            _tag_id_cache.popitem(last=False)
+    return tag_ids
+
+
+def link_content_tags(content, tag_names):
+    """
+    Attaches AI-generated tags to a ClipContent with one tag upsert and one
+    bulk clip_content_tags insert. Returns the normalized tag names.
+    """
+    names = normalize_tag_names(tag_names)
+    if not names:
+        return names
+    for attempt in range(2):
+        tag_ids = resolve_tag_ids(names)
+        try:
+            with transaction.atomic():
+                ClipContentTag.objects.bulk_create(
+                    [ClipContentTag(content=content, tag_id=tag_ids[n]) for n in names if n in tag_ids],
+                    ignore_conflicts=True
+                )
+            return names
+        except IntegrityError:
+            # A cached tag was deleted; forget these names and look them up again.
+            if attempt:
+                raise
+            with _tag_id_lock:
+                for name in names:
+                    _tag_id_cache.pop(name, None)
+
+
+def get_clip_tag_names(clip):
+    """Tag names for a clip, read through its shared content when linked."""
+    if clip.content_id is not None:
+        return [ct.tag.name for ct in clip.content.clipcontenttag_set.all()]
+    return list(clip.cliptag_set.values_list('tag__name', flat=True))
+
+
+def content_video_key(platform_video_id, url):
+    """
+    The platform_video_id a ClipContent is stored under: the video id, or
+    'url:' + the URL for videos the platform gives no id for (migration
+    0022 keys backfilled content the same way).
+    """
+    return platform_video_id or f"url:{url.strip()}"
+
+
+def get_clip_content(platform, platform_video_id):
+    """The shared ClipContent row for a video, created if needed."""
+    content, _ = ClipContent.objects.get_or_create(
+        platform=platform, platform_video_id=platform_video_id
+    )
+    return content
+
+
+def content_is_ready(content):
+    """True once a video's transcript, summary and embeddings are all stored."""
+    return bool(
+        content
+        and content.transcript
+        and content.summary
+        and ClipEmbedding.objects.filter(content=content).exists()
+    )
+
+
+def link_clip_to_content(clip, content, uow):
+    """
+    Points a user's clip at already-processed shared content. Nothing
+    video-level is copied; only the Curio (category) is assigned, and only if
+    one wasn't specified in the original request.
+    """
+    uow.set(
+        clip,
+        content=content,
+        platform=content.platform,
+        platform_video_id=content.platform_video_id,
+    )
+    if VECTOR_SEARCH_ENGINE == "numpy":
+        numpy_index.add_contents(clip.user_id, [content.id])
+    if clip.curio_id:
+        return
+
+    source_clip = (
+        content.clips
+        .exclude(id=clip.id)
+        .exclude(curio=None)
+        .select_related('curio')
         .order_by('-created_at')
         .first()
     )
-    logger.info(f"Existing clip: {existing_clip}")
-    if not existing_clip:
+    logger.info(f"Existing clip Curio: {source_clip.curio if source_clip else None}")
+    if not source_clip:
+        return
+    user_curio = Curio.objects.filter(
+        name=source_clip.curio.name,
+        user_id=clip.user_id
+    ).first()
+    if not user_curio:
+        logger.info("Creating new curio")
+        user_curio, _ = Curio.objects.get_or_create(
+            name=source_clip.curio.name,
+            user_id=clip.user_id,
+            defaults={
+                "description": source_clip.curio.description or "Created automatically for reused clip.",
+                "is_public": False,
+            }
+        )
+    uow.set(clip, curio=user_curio)
+
+
+def reuse_clip_if_exists(clip, OPENAI_API_KEY, SUPABASE_URL, SUPABASE_KEY):
+    """
+    Checks if the clip's video (by canonical platform id) was already
+    processed for any user. If so, links this clip to the shared content
+    instead of processing it again.
+    Returns True if reused, False if not.
+    """
+    content = clip.content
+    logger.info(f"Existing content: {content}")
+    if not content or not content.transcript or not content.summary:
         return False
-    
-    # 1.  Ensure the source clip itself already has embeddings
-    if not ClipEmbedding.objects.filter(clip=existing_clip).exists():
-        process_clip_embeddings(existing_clip, OPENAI_API_KEY)
-
-    # 2.  Copy meta, tags and **embeddings** to the new user's clip
-    clip.title        = existing_clip.title
-    clip.platform     = existing_clip.platform
-    clip.transcript   = existing_clip.transcript
-    clip.summary      = existing_clip.summary
-    clip.platform_video_id = existing_clip.platform_video_id
-    clip.description  = getattr(existing_clip, "description", "")
-    clip.save()
-
-    # --- Thumbnail Handling ---
-    public_url = None
-    if existing_clip.thumbnail_url:
-        public_url = handle_thumbnail_upload(
-            existing_clip.thumbnail_url, clip.id, SUPABASE_URL, SUPABASE_KEY
+
+    # Ensure the shared content itself already has embeddings
+    if not ClipEmbedding.objects.filter(content=content).exists():
+        process_clip_embeddings(content, OPENAI_API_KEY)
+
+    uow = UnitOfWork()
+    link_clip_to_content(clip, content, uow)
+    uow.flush()
+    return True
+
+
+async def _embed_texts_async(text_list, openai_api_key):
+    async with aio.limit("openai"):
+        return await aio.client("openai", openai_api_key).embeddings.create(
+            input=text_list,
+            model=EMBEDDING_MODEL,
+            encoding_format="base64"
         )
-    
-    if not public_url:
-        data = fetch_audio_and_metadata(clip.url)
-        if data.get('thumbnail'):
-            public_url = handle_thumbnail_upload(
-                data['thumbnail'], clip.id, SUPABASE_URL, SUPABASE_KEY
-            )
-    clip.thumbnail_url = public_url
-    clip.save()
-
-    # -- tags
-    tags = Tag.objects.filter(cliptag__clip=existing_clip)
-    ClipTag.objects.bulk_create(
-        [ClipTag(clip=clip, tag=t) for t in tags],
-        ignore_conflicts=True
-    )
 
-    # -- embeddings
-    src_vecs = ClipEmbedding.objects.filter(clip=existing_clip)
-    ClipEmbedding.objects.bulk_create([
-        ClipEmbedding(
-            clip        = clip,
-            field       = v.field,
-            chunk_index = v.chunk_index,
-            text_chunk  = v.text_chunk,
-            embedding   = v.embedding
-        ) for v in src_vecs
+
+def embed_texts(text_list, openai_api_key):
+    """
+    Returns a float32 array of shape (len(text_list), dimensions). Vectors are
+    requested base64-encoded and decoded straight into NumPy, skipping the
+    JSON float lists.
+    """
+    logger.info(f"Creating embedding for: {text_list}")
+    if ASYNC_IO_ENABLED:
+        response = aio.run(_embed_texts_async(text_list, openai_api_key))
+    else:
+        openai.api_key = openai_api_key
+        response = openai.embeddings.create(
+            input=text_list,
+            model=EMBEDDING_MODEL,
+            encoding_format="base64"
+        )
+    return np.stack([
+        np.frombuffer(base64.b64decode(item.embedding), dtype=np.float32)
+        for item in response.data
     ])
 
-    # -- Curio (category) assignment if one wasn't specified in the original request
-    logger.info(f"Existing clip Curio: {existing_clip.curio.name}")
-    if existing_clip.curio and not clip.curio:
-        user_curio = Curio.objects.filter(
-            name=existing_clip.curio.name,
-            user_id=clip.user_id
-        ).first()
-        if not user_curio:
-            logger.info("Creating new curio")
-            user_curio, _ = Curio.objects.get_or_create(
-                name=existing_clip.curio.name,
-                user_id=clip.user_id,
-                defaults={
-                    "description": existing_clip.curio.description or "Created automatically for reused clip.",
-                    "is_public": False,
-                }
-            )
-        clip.curio = user_curio
-        clip.save()
-    return True
 
+def _send_embedding_batch(openai_api_key, texts):
+    # Callers in the same batch often share texts (titles, reposts)
+    unique = list(dict.fromkeys(texts))
+    vectors = dict(zip(unique, embed_texts(unique, openai_api_key)))
+    return [vectors[text] for text in texts]
+
+
+# Embedding requests from concurrent tasks/requests in this process are
+# coalesced into one API call (see api/batcher.py).
+_embedding_batcher = batcher.MicroBatcher(
+    _send_embedding_batch,
+    max_wait=EMBEDDING_BATCH_WAIT_MS / 1000,
+    max_items=EMBEDDING_BATCH_MAX_INPUTS,
+    max_weight=EMBEDDING_BATCH_MAX_TOKENS,
+    weight=llm.estimate_tokens,
+    name="embedding-batcher",
+)
+
+
+def _embedding_cache_key(text_hash):
+    return f"emb:{EMBEDDING_MODEL}:{text_hash}"
+
+
+def embed_texts_cached(text_list, openai_api_key):
+    """
+    Same result as embed_texts, but content-addressed on
+    (EMBEDDING_MODEL, sha256(text)): Redis first, then the embedding_cache
+    table, and only the remaining misses go to the API. New vectors are
+    written back to both tiers. Redis being unavailable only costs speed.
+    """
+    if isinstance(text_list, str):
+        text_list = [text_list]
+    hashes = [hashlib.sha256(t.encode("utf-8")).hexdigest() for t in text_list]
+    texts_by_hash = dict(zip(hashes, text_list))
+    vectors = {}
+
+    # 1. Redis hot tier
+    try:
+        cached = get_redis().mget([_embedding_cache_key(h) for h in texts_by_hash])
+        for text_hash, raw in zip(texts_by_hash, cached):
+            if raw:
+                vectors[text_hash] = np.frombuffer(raw, dtype=np.float32)
+    except redis.RedisError as e:
+        logger.warning(f"Embedding cache (redis) unavailable: {e}")
+
+    # 2. Postgres
+    missing = [h for h in texts_by_hash if h not in vectors]
+    warm = {}
+    if missing:
+        rows = EmbeddingCache.objects.filter(
+            model=EMBEDDING_MODEL, text_hash__in=missing
+        ).values_list("text_hash", "embedding")
+        for text_hash, vector in rows:
+            warm[text_hash] = vectors[text_hash] = np.asarray(vector, dtype=np.float32)
+
+    # 3. Embeddings API for whatever is left
+    missing = [h for h in texts_by_hash if h not in vectors]
+    logger.info(f"Embedding cache: {len(texts_by_hash) - len(missing)} hits, {len(missing)} misses")
+    if missing:
+        if EMBEDDING_BATCHING:
+            fresh = np.stack(_embedding_batcher([texts_by_hash[h] for h in missing], key=openai_api_key))
+        else:
+            fresh = embed_texts([texts_by_hash[h] for h in missing], openai_api_key)
+        EmbeddingCache.objects.bulk_create(
+            [
+                EmbeddingCache(model=EMBEDDING_MODEL, text_hash=h, embedding=v)
+                for h, v in zip(missing, fresh)
+            ],
+            ignore_conflicts=True
+        )
+        for text_hash, vector in zip(missing, fresh):
+            warm[text_hash] = vectors[text_hash] = vector
+
+    if warm:
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            for text_hash, vector in warm.items():
+                pipe.set(_embedding_cache_key(text_hash), vector.tobytes(), ex=EMBEDDING_CACHE_REDIS_TTL)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Embedding cache (redis) unavailable: {e}")
+
+    return np.stack([vectors[h] for h in hashes])
+
+
+# Process-local LRU of normalized search query -> embedding, in front of a
+# shared Redis tier. Queries skip the embedding_cache table: they're short-lived
+# and unbounded, unlike clip text.
+_query_embedding_cache = OrderedDict()
+_query_embedding_lock = threading.Lock()
+
+
+def normalize_query(query):
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+def embed_query(query, openai_api_key):
+    """
+    Embedding of a search query, keyed on its normalized form (NFKC,
+    lowercased, collapsed whitespace): in-process LRU, then Redis
+    (QUERY_EMBEDDING_CACHE_TTL), then the embeddings API.
+    """
+    query = normalize_query(query)
+    with _query_embedding_lock:
+        vector = _query_embedding_cache.get(query)
+        if vector is not None:
+            _query_embedding_cache.move_to_end(query)
+            return vector
+
+    redis_key = f"qemb:{EMBEDDING_MODEL}:{hashlib.sha256(query.encode('utf-8')).hexdigest()}"
+    vector = None
+    try:
+        raw = get_redis().get(redis_key)
+        if raw:
+            vector = np.frombuffer(raw, dtype=np.float32)
+    except redis.RedisError as e:
+        logger.warning(f"Query embedding cache (redis) unavailable: {e}")
 
-def chunk_text(text, chunk_size=300, overlap_ratio=0.2):
-    words = text.split()
-    n = len(words)
-    step = int(chunk_size * (1 - overlap_ratio))
-    if step <= 0:
-        raise ValueError("chunk_size and overlap_ratio combination not valid.")
+    if vector is None:
+        if EMBEDDING_BATCHING:
+            vector = _embedding_batcher([query], key=openai_api_key)[0]
+        else:
+            vector = embed_texts([query], openai_api_key)[0]
+        try:
+            get_redis().set(redis_key, vector.tobytes(), ex=QUERY_EMBEDDING_CACHE_TTL)
+        except redis.RedisError as e:
+            logger.warning(f"Query embedding cache (redis) unavailable: {e}")
+
+    with _query_embedding_lock:
+        _query_embedding_cache[query] = vector
+        while len(_query_embedding_cache) > QUERY_EMBEDDING_CACHE_SIZE:
+            _query_embedding_cache.popitem(last=False)
+    return vector
+
+
+def to_vector_literal(vector):
+    """pgvector text literal ('[x,y,...]') for a list or NumPy vector."""
+    if isinstance(vector, np.ndarray):
+        vector = vector.tolist()
+    if isinstance(vector, (list, tuple)):
+        return "[" + ",".join(str(x) for x in vector) + "]"
+    return str(vector)
+
+
+def bulk_insert_embeddings(rows):
+    """
+    Writes (content_id, field, chunk_index, text_chunk, chunk_hash,
+    start_seconds, vector) rows to clip_embeddings in one round trip: a binary COPY on psycopg 3,
+    otherwise a single multi-row INSERT. Vectors may be float32 NumPy arrays.
+    """
+    if not rows:
+        return
+    if not is_psycopg3:
+        ClipEmbedding.objects.bulk_create([
+            ClipEmbedding(
+                content_id=content_id,
+                field=field,
+                chunk_index=chunk_index,
+                text_chunk=text_chunk,
+                chunk_hash=text_hash,
+                start_seconds=start_seconds,
+                embedding=vector
+            ) for content_id, field, chunk_index, text_chunk, text_hash, start_seconds, vector in rows
+        ])
+        return
 
+    from pgvector.psycopg import register_vector
+
+    connection.ensure_connection()
+    if connection.connection.adapters.types.get("vector") is None:
+        register_vector(connection.connection)
+    created_at = timezone.now()
+    with connection.cursor() as cursor:
+        with cursor.copy(
+            "COPY clip_embeddings (content_id, field, chunk_index, text_chunk, chunk_hash, start_seconds, "
+            "embedding, created_at) FROM STDIN WITH (FORMAT BINARY)"
+        ) as copy:
+            copy.set_types(["uuid", "varchar", "int4", "text", "varchar", "float8", "vector", "timestamptz"])
+            for row in rows:
+                copy.write_row((*row, created_at))
+
+
+def content_chunks(content):
+    """
+    [(field, chunk_index, text, chunk_hash, start_seconds)] to embed for a
+    ClipContent: title/summary/description whole (cut to the model's token
+    limit) and the transcript in content-defined chunks (see
+    api/chunking.py), each with the second it starts at in the video when
+    the content has transcript_segments.
+    """
     chunks = []
-    i = 0
-    while i < n:
-        chunk = words[i:i + chunk_size]
-        if not chunk:
-            break
-        chunks.append(" ".join(chunk))
-        i += step
+    for field in ("title", "summary", "description"):
+        text = getattr(content, field)
+        if text:
+            text = chunking.truncate_to_tokens(text)
+            chunks.append((field, 0, text, chunking.chunk_hash(text), None))
+    for idx, chunk in enumerate(chunking.chunk_spans(
+        content.transcript or "", EMBEDDING_CHUNK_TOKENS, EMBEDDING_CHUNK_OVERLAP_TOKENS
+    )):
+        start_seconds = audio.transcript_time(chunk.start, content.transcript_segments)
+        chunks.append(("transcript", idx, chunk.text, chunk.hash, start_seconds))
     return chunks
 
 
-def embed_texts(text_list, openai_api_key):
-    openai.api_key = openai_api_key
-    logger.info(f"Creating embedding for: {text_list}")
-    response = openai.embeddings.create(
-        input=text_list,
-        model=EMBEDDING_MODEL
-    )
-    return [item.embedding for item in response.data]
+def process_clip_embeddings(content, openai_api_key, replace=False):
+    """
+    Embeds a ClipContent's title/summary/description/transcript chunks and
+    stores them once for every clip that shares it. With replace=True the
+    existing rows are reconciled by chunk hash in one transaction: rows for
+    unchanged chunks are kept (re-indexed if they moved), the rest deleted,
+    and only new chunks are embedded (kept rows get their new chunk_index
+    and start_seconds). The API call happens before the transaction is
+    opened.
+    """
+    chunks = content_chunks(content)
+    existing = {}
+    if replace:
+        for row_id, field, chunk_index, text_hash, start_seconds in ClipEmbedding.objects.filter(
+            content=content
+        ).values_list("id", "field", "chunk_index", "chunk_hash", "start_seconds"):
+            existing.setdefault((field, text_hash), (row_id, chunk_index, start_seconds))
 
+    kept = {}     # row id -> (new chunk_index, start_seconds), or None if unchanged
+    new_chunks = []
+    for field, idx, text, text_hash, start_seconds in chunks:
+        match = existing.pop((field, text_hash), None)
+        if match is None:
+            new_chunks.append((field, idx, text, text_hash, start_seconds))
+        else:
+            kept[match[0]] = (idx, start_seconds) if match[1:] != (idx, start_seconds) else None
+    logger.info(f"Embeddings for content {content.id}: {len(kept)} unchanged, {len(new_chunks)} new")
 
-def process_clip_embeddings(clip, openai_api_key):
-    transcript = clip.transcript or ""
-    transcript_chunks = chunk_text(transcript, chunk_size=300, overlap_ratio=0.2)
-    fields = [
-        ("title", [clip.title] if clip.title else []),
-        ("summary", [clip.summary] if clip.summary else []),
-        ("description", [clip.description] if getattr(clip, "description", None) else []),
-        ("transcript", transcript_chunks)
+    vectors = embed_texts_cached([chunk[2] for chunk in new_chunks], openai_api_key) if new_chunks else []
+    rows = [
+        (content.id, *chunk, vector)
+        for chunk, vector in zip(new_chunks, vectors)
     ]
+    with transaction.atomic():
+        removed_ids = []
+        if replace:
+            stale = ClipEmbedding.objects.filter(content=content).exclude(id__in=list(kept))
+            removed_ids = list(stale.values_list("id", flat=True))
+            stale.delete()
+            moved = [
+                ClipEmbedding(id=row_id, chunk_index=position[0], start_seconds=position[1])
+                for row_id, position in kept.items() if position is not None
+            ]
+            if moved:
+                ClipEmbedding.objects.bulk_update(moved, ["chunk_index", "start_seconds"])
+        bulk_insert_embeddings(rows)
+        if VECTOR_SEARCH_ENGINE == "numpy":
+            transaction.on_commit(lambda: numpy_index.on_content_embeddings_changed(
+                content.id, bool(rows), removed_ids
+            ))
 
-    all_texts = []
-    all_fields = []
-    all_indices = []
-    for field_name, chunks in fields:
-        for idx, chunk in enumerate(chunks):
-            all_texts.append(chunk)
-            all_fields.append(field_name)
-            all_indices.append(idx)
-    
-    # Generate embeddings
-    vectors = embed_texts(all_texts, openai_api_key)
-    # Save each embedding to DB
-    for chunk, field, idx, vector in zip(all_texts, all_fields, all_indices, vectors):
-        ClipEmbedding.objects.create(
-            clip=clip,
-            field=field,
-            chunk_index=idx,
-            text_chunk=chunk,
-            embedding=vector
+
+def _user_chunk_count(user_id, limit):
+    """Number of embedded chunks across the user's clips, counted up to `limit`."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT count(*) FROM (
+                SELECT 1 FROM clip_embeddings
+                WHERE content_id IN (
+                    SELECT content_id FROM clips WHERE user_id = %s AND content_id IS NOT NULL
+                )
+                LIMIT %s
+            ) capped
+            """,
+            [user_id, limit],
         )
+        return cursor.fetchone()[0]
 
 
-def vector_search_clip_ids_with_similarity(query_embedding, top_n=30, threshold=0.7):
+def vector_search_user_clips(query_embedding, user_id, top_n=30, threshold=0.7, mode=None):
     """
-    Returns a list of (clip_id, percent_match, embedding_id) tuples for best matches above threshold.
+    The `user_id`'s top_n clips for a query, best first, one dict per clip
+    (clip_id, content_id, percent_match, and the best-matching chunk:
+    embedding_id, field, chunk_index, text_chunk, start_seconds).
+    Both the user filter and the similarity threshold are applied in SQL, so
+    other users' chunks can't crowd out the results. Embeddings are shared
+    per ClipContent, so the user scope is a join through clips.content_id (a
+    user_id, content_id index backs the lookup) rather than a user_id column
+    on clip_embeddings. Nearest chunks are taken as a candidate set of
+    top_n * VECTOR_SEARCH_CANDIDATE_FACTOR rows, then collapsed to the best
+    chunk per clip (DISTINCT ON) in the database.
+
+    `mode` (default VECTOR_INDEX_MODE) picks the index (see
+    api/vector_index.py). The HNSW indexes span every user's chunks, so an
+    index scan walks the global graph and filters it down to the user's
+    rows: its cost follows the table, not the user. The compressed modes
+    pull VECTOR_RERANK_FACTOR times more candidates from their index and
+    rerank them by the full-precision distance, which is also what the
+    threshold and the returned scores use. "exact" computes the distance
+    for each of the user's rows (found through the content_id index) and
+    sorts them, with no ANN index: exact results (ground truth for
+    benchmarks), and what users with fewer than VECTOR_SEARCH_EXACT_MAX_ROWS
+    chunks get by default, since for them it is cheaper than the graph walk.
+    Without a mode, VECTOR_SEARCH_ENGINE = "numpy" answers from the per-user
+    memory-mapped index instead (api/numpy_index.py).
     """
-    
-    if isinstance(query_embedding, (list, tuple)):
-        query_embedding_str = "[" + ",".join(str(x) for x in query_embedding) + "]"
+    if mode is None and VECTOR_SEARCH_ENGINE == "numpy":
+        return numpy_index.search(query_embedding, user_id, top_n, threshold)
+    if (
+        mode is None and VECTOR_SEARCH_EXACT_MAX_ROWS
+        and _user_chunk_count(user_id, VECTOR_SEARCH_EXACT_MAX_ROWS) < VECTOR_SEARCH_EXACT_MAX_ROWS
+    ):
+        mode = "exact"
+    mode = mode or VECTOR_INDEX_MODE
+    if mode == "exact":
+        # MATERIALIZED: the sort is over computed distances, which no ANN
+        # index can serve
+        candidates_sql = """
+            WITH user_rows AS MATERIALIZED (
+                SELECT e.id, e.content_id, e.field, e.chunk_index, e.text_chunk, e.start_seconds,
+                       e.embedding <=> %(query)s::vector AS distance
+                FROM clip_embeddings e
+                WHERE e.content_id IN (SELECT content_id FROM user_contents)
+            )
+            SELECT * FROM user_rows
+            WHERE distance <= %(max_distance)s
+            ORDER BY distance
+            LIMIT %(candidates)s
+        """
+    elif mode == "full":
+        candidates_sql = """
+            SELECT e.id, e.content_id, e.field, e.chunk_index, e.text_chunk, e.start_seconds,
+                   e.embedding <=> %(query)s::vector AS distance
+            FROM clip_embeddings e
+            WHERE e.content_id IN (SELECT content_id FROM user_contents)
+              AND e.embedding <=> %(query)s::vector <= %(max_distance)s
+            ORDER BY distance
+            LIMIT %(candidates)s
+        """
     else:
-        query_embedding_str = str(query_embedding)
-    sql = """
-        SELECT id, clip_id, field, chunk_index, text_chunk,
-               (1 - (embedding <=> %s::vector)) as percent_match
-        FROM clip_embeddings
-        ORDER BY percent_match DESC
-        LIMIT %s;
+        expression, _, operator = vector_index.index_expression(mode)
+        candidates_sql = f"""
+            SELECT e.id, e.content_id, e.field, e.chunk_index, e.text_chunk, e.start_seconds,
+                   e.embedding <=> %(query)s::vector AS distance
+            FROM (
+                SELECT e.* FROM clip_embeddings e
+                WHERE e.content_id IN (SELECT content_id FROM user_contents)
+                ORDER BY {expression} {operator} {vector_index.query_expression(mode)}
+                LIMIT %(pool)s
+            ) e
+            WHERE e.embedding <=> %(query)s::vector <= %(max_distance)s
+            ORDER BY distance
+            LIMIT %(candidates)s
+        """
+    sql = f"""
+        WITH user_contents AS (
+            SELECT DISTINCT content_id FROM clips
+            WHERE user_id = %(user_id)s AND content_id IS NOT NULL
+        ),
+        candidates AS ({candidates_sql}),
+        best AS (
+            SELECT DISTINCT ON (c.id)
+                   c.id AS clip_id, m.content_id, m.id, m.field, m.chunk_index, m.text_chunk,
+                   m.start_seconds, m.distance
+            FROM candidates m
+            JOIN clips c ON c.content_id = m.content_id AND c.user_id = %(user_id)s
+            ORDER BY c.id, m.distance
+        )
+        SELECT clip_id, content_id, id, field, chunk_index, text_chunk, start_seconds, 1 - distance
+        FROM best
+        ORDER BY distance
+        LIMIT %(top_n)s;
     """
-    with connection.cursor() as cursor:
-        cursor.execute(sql, [query_embedding_str, top_n])
+    params = {
+        "query": to_vector_literal(query_embedding),
+        "user_id": user_id,
+        "max_distance": 1 - threshold,
+        "top_n": top_n,
+        "candidates": top_n * VECTOR_SEARCH_CANDIDATE_FACTOR,
+        "pool": top_n * VECTOR_SEARCH_CANDIDATE_FACTOR * VECTOR_RERANK_FACTOR,
+    }
+    if mode == "reduced":
+        params["query_reduced"] = to_vector_literal(vector_index.reduce_vector(query_embedding))
+    with transaction.atomic(), connection.cursor() as cursor:
+        # HNSW: a larger candidate list, and (pgvector >= 0.8) keep scanning
+        # the index until enough rows pass the user filter.
+        if VECTOR_SEARCH_EF_SEARCH:
+            cursor.execute("SELECT set_config('hnsw.ef_search', %s, true)", [str(VECTOR_SEARCH_EF_SEARCH)])
+        if VECTOR_SEARCH_ITERATIVE_SCAN:
+            cursor.execute("SELECT set_config('hnsw.iterative_scan', %s, true)", [VECTOR_SEARCH_ITERATIVE_SCAN])
+        cursor.execute(sql, params)
         results = cursor.fetchall()
-    # Results: (embedding_id, clip_id, field, chunk_index, text_chunk, percent_match)
-    filtered = [r for r in results if r[5] >= threshold]
-    # Return as list of dicts
     return [
         {
-            "clip_id": r[1],
-            "embedding_id": r[0],
-            "percent_match": round(r[5] * 100, 2),  # percent as float
-            "field": r[2],
-            "chunk_index": r[3],
-            "text_chunk": r[4],
+            "clip_id": clip_id,
+            "content_id": content_id,
+            "embedding_id": embedding_id,
+            "percent_match": round(similarity * 100, 2),  # percent as float
+            "field": field,
+            "chunk_index": chunk_index,
+            "text_chunk": text_chunk,
+            "start_seconds": start_seconds,
         }
-        for r in filtered
+        for clip_id, content_id, embedding_id, field, chunk_index, text_chunk, start_seconds, similarity in results
+    ]
+
+
+def lexical_search_user_clips(query, user_id, top_n=30):
+    """
+    The `user_id`'s top_n clips for a full-text query, best first, one dict
+    per clip (clip_id, content_id, rank, text_chunk: a highlighted fragment of
+    the transcript, or the summary). The query uses websearch syntax
+    ("quoted phrases", -excluded, or) against clip_contents.search_vector
+    (GIN-indexed; title and summary weigh most).
+    """
+    # Rank and limit first (MATERIALIZED keeps the planner from inlining
+    # it), then build headlines for the final page only: ts_headline
+    # re-parses its input, so it gets the summary when that matches and at
+    # most SEARCH_HEADLINE_MAX_CHARS of the transcript otherwise.
+    sql = """
+        WITH q AS (SELECT websearch_to_tsquery('english', %(query)s) AS query),
+        hits AS MATERIALIZED (
+            SELECT c.id AS clip_id, c.content_id, ts_rank_cd(cc.search_vector, q.query) AS rank
+            FROM clips c
+            JOIN clip_contents cc ON cc.id = c.content_id
+            CROSS JOIN q
+            WHERE c.user_id = %(user_id)s AND cc.search_vector @@ q.query
+            ORDER BY rank DESC
+            LIMIT %(top_n)s
+        )
+        SELECT h.clip_id, h.content_id, h.rank,
+               ts_headline(
+                   'english',
+                   CASE WHEN to_tsvector('english', cc.summary) @@ q.query OR cc.transcript = ''
+                        THEN cc.summary
+                        ELSE left(cc.transcript, %(max_chars)s) END,
+                   q.query,
+                   'MaxWords=35, MinWords=15, MaxFragments=1'
+               )
+        FROM hits h
+        JOIN clip_contents cc ON cc.id = h.content_id
+        CROSS JOIN q
+        ORDER BY h.rank DESC
+    """
+    params = {"query": query, "user_id": user_id, "top_n": top_n, "max_chars": SEARCH_HEADLINE_MAX_CHARS}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        results = cursor.fetchall()
+    return [
+        {"clip_id": clip_id, "content_id": content_id, "rank": rank, "text_chunk": text_chunk}
+        for clip_id, content_id, rank, text_chunk in results
     ]
 
 
+def reciprocal_rank_fusion(rankings, k=SEARCH_RRF_K):
+    """
+    Fuses ranked lists of result dicts (keyed by clip_id) by reciprocal rank:
+    score = sum over lists of 1 / (k + rank). Returns (clip_id, score, dicts)
+    best first, where dicts holds the clip's result from each list it is in
+    (None elsewhere).
+    """
+    fused = {}
+    for position, ranking in enumerate(rankings):
+        for rank, match in enumerate(ranking, start=1):
+            entry = fused.setdefault(match["clip_id"], [0.0, [None] * len(rankings)])
+            entry[0] += 1 / (k + rank)
+            entry[1][position] = match
+    return sorted(
+        ((clip_id, score, found) for clip_id, (score, found) in fused.items()),
+        key=lambda item: -item[1],
+    )
+
+
+def search_user_clips(query, user_id, openai_api_key, top_n=30, threshold=0.15, mode=None):
+    """
+    Clip search for ClipSearchView: the `user_id`'s top_n clips, best first,
+    as dicts (clip_id, percent_match: vector similarity or None for
+    full-text-only hits, snippet, start_seconds: where a transcript snippet
+    starts in the video, else None). `mode` (default SEARCH_MODE) is "hybrid",
+    "semantic" or "lexical"; see SEARCH_MODE in settings.
+    """
+    mode = mode or SEARCH_MODE
+    lexical = []
+    if mode in ("hybrid", "lexical"):
+        lexical = lexical_search_user_clips(query, user_id, top_n)
+    # Short keyword queries: exact matches are what's wanted, and found
+    # without an embedding call
+    if mode == "hybrid" and lexical and len(query.split()) <= SEARCH_LEXICAL_MAX_WORDS:
+        mode = "lexical"
+    semantic = []
+    if mode in ("hybrid", "semantic"):
+        query_embedding = embed_query(query, openai_api_key)
+        semantic = vector_search_user_clips(query_embedding, user_id, top_n=top_n, threshold=threshold)
+
+    results = []
+    for clip_id, score, (vector_match, lexical_match) in reciprocal_rank_fusion([semantic, lexical])[:top_n]:
+        # Prefer the semantic chunk; a full-text fragment shows the matched words
+        snippet_match = vector_match or lexical_match
+        results.append({
+            "clip_id": clip_id,
+            "percent_match": vector_match["percent_match"] if vector_match else None,
+            "snippet": snippet_match["text_chunk"],
+            "start_seconds": snippet_match.get("start_seconds"),
+            "score": score,
+        })
+    return results
+
+
 def download_image(url, out_path):
     r = requests.get(url, stream=True, timeout=10)
     if r.status_code == 200:
@@ -0,0 +1,81 @@
+"""
+ANN index variants for clip_embeddings (VECTOR_INDEX_MODE).
+
+Every variant indexes an expression over the full-precision `embedding`
+column, so no second copy of the vectors is stored and switching modes
+needs no backfill:
+  full     -> embedding                                   (vector, 6 KB/row)
+  halfvec  -> embedding::halfvec(1536)                    (half precision, 2x smaller)
+  binary   -> binary_quantize(embedding)::bit(1536)       (1 bit/dim, 32x smaller)
+  reduced  -> l2_normalize(subvector(embedding, 1, D))    (first D dims)
+text-embedding-3 vectors are trained so that their first D dimensions,
+re-normalized, are what the API returns for `dimensions=D`, so "reduced"
+matches the model's dimensions parameter without re-embedding anything.
+
+Searches in the compressed modes fetch a larger candidate pool from the
+index and rerank it with the full-precision distance.
+"""
+import numpy as np
+from .constants import EMBEDDING_DIMENSIONS, VECTOR_INDEX_DIMENSIONS
+
+MODES = ("full", "halfvec", "binary", "reduced")
+
+
+def index_name(mode, dimensions=VECTOR_INDEX_DIMENSIONS):
+    if mode == "full":
+        return "clip_embeddings_hnsw_idx"
+    if mode == "reduced":
+        return f"clip_embeddings_reduced{dimensions}_hnsw_idx"
+    return f"clip_embeddings_{mode}_hnsw_idx"
+
+
+def index_expression(mode, dimensions=VECTOR_INDEX_DIMENSIONS):
+    """(indexed expression over clip_embeddings e, operator class, distance operator)."""
+    if mode == "full":
+        return "e.embedding", "vector_cosine_ops", "<=>"
+    if mode == "halfvec":
+        return f"(e.embedding::halfvec({EMBEDDING_DIMENSIONS}))", "halfvec_cosine_ops", "<=>"
+    if mode == "binary":
+        return f"(binary_quantize(e.embedding)::bit({EMBEDDING_DIMENSIONS}))", "bit_hamming_ops", "<~>"
+    if mode == "reduced":
+        return (
+            f"(l2_normalize(subvector(e.embedding, 1, {dimensions}))::vector({dimensions}))",
+            "vector_cosine_ops",
+            "<=>",
+        )
+    raise ValueError(f"Unknown vector index mode: {mode}")
+
+
+def query_expression(mode, dimensions=VECTOR_INDEX_DIMENSIONS):
+    """SQL for the query vector in the index's space; uses the %(query)s / %(query_reduced)s params."""
+    if mode == "full":
+        return "%(query)s::vector"
+    if mode == "halfvec":
+        return f"%(query)s::halfvec({EMBEDDING_DIMENSIONS})"
+    if mode == "binary":
+        return f"binary_quantize(%(query)s::vector)::bit({EMBEDDING_DIMENSIONS})"
+    if mode == "reduced":
+        return f"%(query_reduced)s::vector({dimensions})"
+    raise ValueError(f"Unknown vector index mode: {mode}")
+
+
+def reduce_vector(vector, dimensions=VECTOR_INDEX_DIMENSIONS):
+    """First `dimensions` components, L2-normalized (same as the index expression)."""
+    head = np.asarray(vector, dtype=np.float32)[:dimensions]
+    norm = np.linalg.norm(head)
+    return head / norm if norm else head
+
+
+def create_index_sql(mode, dimensions=VECTOR_INDEX_DIMENSIONS, m=16, ef_construction=64):
+    expression, opclass, _ = index_expression(mode, dimensions)
+    # The expression is written against alias "e"; indexes reference the column directly
+    expression = expression.replace("e.embedding", "embedding")
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name(mode, dimensions)} "
+        f"ON clip_embeddings USING hnsw ({expression} {opclass}) "
+        f"WITH (m = {m}, ef_construction = {ef_construction})"
+    )
+
+
+def drop_index_sql(mode, dimensions=VECTOR_INDEX_DIMENSIONS):
+    return f"DROP INDEX CONCURRENTLY IF EXISTS {index_name(mode, dimensions)}"
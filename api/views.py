@@ -5,7 +5,7 @@ from rest_framework.permissions import IsAuthenticated
 from django.db.models import Count, Q, Case, When, Value, FloatField
 from .models import Curio, Clip, Tag, ClipProcessingTask
 from .serializers import CurioCreateSerializer, ClipCreateSerializer, ClipListSerializer, CurioFeedSerializer
-from .utils import embed_texts, vector_search_clip_ids_with_similarity
+from .utils import search_user_clips, get_clip_tag_names
 from .tasks import process_clip_task 
 from .constants import OPENAI_API_KEY
 import os
@@ -55,26 +55,38 @@ class ClipSearchView(ListAPIView):
 
     def get(self, request, *args, **kwargs):
         # Prepare base queryset (user's clips)
-        queryset = Clip.objects.filter(user_id=request.user.id)
-        clips = list(queryset)  # Always initialize clips
+        queryset = (
+            Clip.objects.filter(user_id=request.user.id)
+            .select_related('content', 'curio')
+            .prefetch_related('content__clipcontenttag_set__tag')
+        )
 
-        # Semantic search if keyword query
+        # Hybrid full-text + semantic search if keyword query
         q = request.query_params.get('q')
         percent_by_clip = {}
+        snippet_by_clip = {}
+        start_by_clip = {}
+        rank_by_clip = {}
         if q:
-            query_embedding = embed_texts(q, OPENAI_API_KEY)[0]
-            matches = vector_search_clip_ids_with_similarity(query_embedding, top_n=30, threshold=0.15)
-            matched_clip_ids = [m["clip_id"] for m in matches]
-            percent_by_clip = {str(m["clip_id"]): m["percent_match"] for m in matches}
-            queryset = queryset.filter(id__in=matched_clip_ids)
-            clips = list(queryset)  # Update clips if semantic search is used
+            mode = request.query_params.get('mode')
+            if mode not in (None, 'hybrid', 'semantic', 'lexical'):
+                return Response({'error': 'mode must be hybrid, semantic or lexical.'}, status=status.HTTP_400_BAD_REQUEST)
+            # One row per clip, with its best-matching snippet
+            matches = search_user_clips(q, request.user.id, OPENAI_API_KEY, top_n=30, threshold=0.15, mode=mode)
+            for rank, m in enumerate(matches):
+                percent_by_clip[str(m["clip_id"])] = m["percent_match"]
+                snippet_by_clip[str(m["clip_id"])] = m["snippet"]
+                start_by_clip[str(m["clip_id"])] = m["start_seconds"]
+                rank_by_clip[str(m["clip_id"])] = rank
+            queryset = queryset.filter(id__in=list(rank_by_clip))
+        clips = list(queryset)
         
         # Tag filter
         tags_param = request.query_params.get('tags')
         if tags_param:
             tags = [t.strip() for t in tags_param.split(",") if t.strip()]
             if tags:
-                clips = [c for c in clips if set(tags).intersection(set([t for t in c.cliptag_set.values_list('tag__name', flat=True)]))]
+                clips = [c for c in clips if set(tags).intersection(get_clip_tag_names(c))]
 
         # Platform filter
         platform_param = request.query_params.get('platform')
@@ -96,7 +108,9 @@ class ClipSearchView(ListAPIView):
 
         # Sorting
         sort = request.query_params.get('sort', 'recent')
-        if sort == "recent":
+        if sort == "relevance" and q:
+            clips.sort(key=lambda c: rank_by_clip[str(c.id)])
+        elif sort == "recent":
             clips.sort(key=lambda c: c.created_at, reverse=True)
         elif sort == "favorites":
             clips = [c for c in clips if c.is_favorite]
@@ -107,7 +121,7 @@ class ClipSearchView(ListAPIView):
 
         # Paginate if desired, or slice manually
         page = self.paginate_queryset(clips)
-        serializer = self.get_serializer(page if page is not None else clips, many=True, context={"percent_match_map": percent_by_clip})
+        serializer = self.get_serializer(page if page is not None else clips, many=True, context={"percent_match_map": percent_by_clip, "snippet_map": snippet_by_clip, "snippet_start_map": start_by_clip})
         if page is not None:
             return self.get_paginated_response(serializer.data)
         return Response(serializer.data)
@@ -152,7 +166,11 @@ class ClipDetailView(generics.RetrieveAPIView):
 
     def get_queryset(self):
         # Only allow access to the user's own clips
-        return Clip.objects.filter(user_id=self.request.user.id)
+        return (
+            Clip.objects.filter(user_id=self.request.user.id)
+            .select_related('content', 'curio')
+            .prefetch_related('content__clipcontenttag_set__tag')
+        )
 
     def retrieve(self, request, *args, **kwargs):
         response = super().retrieve(request, *args, **kwargs)
@@ -166,8 +184,8 @@ class CurioListView(ListAPIView):
         curios = Curio.objects.filter(user_id=request.user.id)
         data = []
         for curio in curios:
-            clips = list(Clip.objects.filter(curio=curio))
-            thumbnails = [c.thumbnail_url for c in clips if c.thumbnail_url]
+            clips = list(Clip.objects.filter(curio=curio).select_related('content'))
+            thumbnails = [c.shared('thumbnail_url') for c in clips if c.shared('thumbnail_url')]
             # Pick up to 4 random thumbnails
             thumbnails = sample(thumbnails, min(4, len(thumbnails))) if thumbnails else []
             data.append({
@@ -202,8 +220,8 @@ class CurioFeedView(ListAPIView):
         data = []
         for curio in queryset:
             # Get up to 4 thumbnails from this curio's clips
-            clips = Clip.objects.filter(curio=curio)
-            thumbnails = [c.thumbnail_url for c in clips if c.thumbnail_url]
+            clips = Clip.objects.filter(curio=curio).select_related('content')
+            thumbnails = [c.shared('thumbnail_url') for c in clips if c.shared('thumbnail_url')]
             thumbnails = sample(thumbnails, min(4, len(thumbnails))) if thumbnails else []
             # Use serializer to get base data
             serializer = self.get_serializer(curio)
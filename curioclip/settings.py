@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import environ
 import os
+import tempfile
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -22,13 +23,209 @@ env.read_env(os.path.join(BASE_DIR, '.env')) if os.path.exists(os.path.join(BASE
 
 CELERY_REDIS_HOST=env("CELERY_REDIS_HOST", default="dummy-redis-host")
 
-CELERY_BROKER_URL = env("REDIS_URL", default=None)
-CELERY_RESULT_BACKEND = env("REDIS_URL", default=None)
+REDIS_URL = env("REDIS_URL", default=None)
+
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+CELERY_BEAT_SCHEDULE = {
+    'evict-llm-cache': {
+        'task': 'api.tasks.evict_llm_cache_task',
+        'schedule': 3600,
+    },
+}
+
+# Clip pipeline stages run on dedicated queues so each can be scaled with its
+# own worker concurrency (see docker-compose.yml).
+CELERY_TASK_ROUTES = {
+    'api.tasks.fetch_clip_media_task': {'queue': 'download'},
+    'api.tasks.process_thumbnail_task': {'queue': 'images'},
+    'api.tasks.trim_audio_task': {'queue': 'images'},
+    'api.tasks.transcribe_clip_task': {'queue': 'ai'},
+    'api.tasks.categorize_clip_task': {'queue': 'ai'},
+    'api.tasks.embed_clip_task': {'queue': 'ai'},
+}
+# One message per worker process at a time, so a slow stage can't hoard work.
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
+
+# Pipeline stage retries: exponential backoff (with jitter) starting at
+# CLIP_STAGE_RETRY_BACKOFF seconds, capped at CLIP_STAGE_RETRY_BACKOFF_MAX.
+CLIP_STAGE_MAX_RETRIES = env.int("CLIP_STAGE_MAX_RETRIES", default=5)
+CLIP_STAGE_RETRY_BACKOFF = env.int("CLIP_STAGE_RETRY_BACKOFF", default=15)
+CLIP_STAGE_RETRY_BACKOFF_MAX = env.int("CLIP_STAGE_RETRY_BACKOFF_MAX", default=600)
+
+# Single-flight: only one task processes a given video at a time; concurrent
+# tasks for it poll every CLIP_SINGLE_FLIGHT_POLL seconds and then reuse the
+# result. The lock is refreshed every TTL/3 seconds while a stage runs and
+# expires CLIP_SINGLE_FLIGHT_TTL seconds after a worker dies.
+CLIP_SINGLE_FLIGHT_TTL = env.int("CLIP_SINGLE_FLIGHT_TTL", default=900)
+CLIP_SINGLE_FLIGHT_POLL = env.int("CLIP_SINGLE_FLIGHT_POLL", default=5)
+
+# Embedding cache: Postgres (embedding_cache) keeps vectors forever, Redis
+# keeps the hot ones for this many seconds.
+EMBEDDING_CACHE_REDIS_TTL = env.int("EMBEDDING_CACHE_REDIS_TTL", default=7 * 24 * 3600)
+
+# Transcript chunks for embedding: ~EMBEDDING_CHUNK_TOKENS tokens each (between
+# half and twice that), cut at sentence ends chosen by content, each prefixed
+# with up to EMBEDDING_CHUNK_OVERLAP_TOKENS of the preceding sentences.
+EMBEDDING_CHUNK_TOKENS = env.int("EMBEDDING_CHUNK_TOKENS", default=300)
+EMBEDDING_CHUNK_OVERLAP_TOKENS = env.int("EMBEDDING_CHUNK_OVERLAP_TOKENS", default=50)
+
+# Vector search runs on the HNSW index of clip_embeddings. ef_search is the
+# candidate list size; iterative_scan (pgvector >= 0.8: relaxed_order or
+# strict_order, empty to disable) keeps scanning until enough rows pass the
+# per-user filter.
+VECTOR_SEARCH_EF_SEARCH = env.int("VECTOR_SEARCH_EF_SEARCH", default=100)
+VECTOR_SEARCH_ITERATIVE_SCAN = env("VECTOR_SEARCH_ITERATIVE_SCAN", default="relaxed_order")
+# Nearest chunks fetched per requested clip before collapsing to the best
+# chunk per clip.
+VECTOR_SEARCH_CANDIDATE_FACTOR = env.int("VECTOR_SEARCH_CANDIDATE_FACTOR", default=10)
+# Users with fewer chunks than this are searched by an exact scan of their
+# own rows instead of the shared HNSW index (0 always uses the index).
+VECTOR_SEARCH_EXACT_MAX_ROWS = env.int("VECTOR_SEARCH_EXACT_MAX_ROWS", default=20000)
+# Which ANN index the search uses (api/vector_index.py): full, halfvec, binary
+# or reduced (first VECTOR_INDEX_DIMENSIONS dims). The compressed ones fetch
+# VECTOR_RERANK_FACTOR times more candidates and rerank at full precision.
+# Build the index first: `python manage.py vector_index create <mode>`.
+VECTOR_INDEX_MODE = env("VECTOR_INDEX_MODE", default="full")
+VECTOR_INDEX_DIMENSIONS = env.int("VECTOR_INDEX_DIMENSIONS", default=512)
+VECTOR_RERANK_FACTOR = env.int("VECTOR_RERANK_FACTOR", default=4)
+# Search engine: "pgvector" (SQL above) or "numpy", per-user memory-mapped
+# matrices under VECTOR_NUMPY_INDEX_DIR (float32 or int8), scanned in blocks
+# of VECTOR_NUMPY_BLOCK_ROWS. The directory must be shared by web and workers.
+VECTOR_SEARCH_ENGINE = env("VECTOR_SEARCH_ENGINE", default="pgvector")
+VECTOR_NUMPY_DTYPE = env("VECTOR_NUMPY_DTYPE", default="float32")
+VECTOR_NUMPY_BLOCK_ROWS = env.int("VECTOR_NUMPY_BLOCK_ROWS", default=65536)
+
+# Clip search (ClipSearchView): "hybrid" fuses full-text (clip_contents.search_vector)
+# and vector results by reciprocal rank fusion (score = sum of 1 / (SEARCH_RRF_K + rank));
+# "semantic" and "lexical" use one retriever. In hybrid mode, queries of at most
+# SEARCH_LEXICAL_MAX_WORDS words that have full-text hits skip the embedding call.
+SEARCH_MODE = env("SEARCH_MODE", default="hybrid")
+SEARCH_RRF_K = env.int("SEARCH_RRF_K", default=60)
+SEARCH_LEXICAL_MAX_WORDS = env.int("SEARCH_LEXICAL_MAX_WORDS", default=2)
+# Full-text snippets are cut from at most this many transcript characters.
+SEARCH_HEADLINE_MAX_CHARS = env.int("SEARCH_HEADLINE_MAX_CHARS", default=20000)
+
+# Embedding micro-batching: cache misses from concurrent tasks/requests in one
+# process wait up to EMBEDDING_BATCH_WAIT_MS and are sent as a single request
+# of at most EMBEDDING_BATCH_MAX_INPUTS inputs / ~EMBEDDING_BATCH_MAX_TOKENS tokens.
+# The queue is per process, so it only pays off when one process runs many
+# tasks at once: on by default with ASYNC_IO_ENABLED or a threads/gevent
+# AI_WORKER_POOL, off for prefork workers (one task per process, where it
+# would only add the wait).
+EMBEDDING_BATCHING = env.bool(
+    "EMBEDDING_BATCHING",
+    default=env.bool("ASYNC_IO_ENABLED", default=False)
+    or env("AI_WORKER_POOL", default="prefork") in ("threads", "gevent", "eventlet"),
+)
+EMBEDDING_BATCH_WAIT_MS = env.int("EMBEDDING_BATCH_WAIT_MS", default=5)
+EMBEDDING_BATCH_MAX_INPUTS = env.int("EMBEDDING_BATCH_MAX_INPUTS", default=2048)
+EMBEDDING_BATCH_MAX_TOKENS = env.int("EMBEDDING_BATCH_MAX_TOKENS", default=250_000)
+
+# Search query embeddings: per-process LRU of this many entries, plus Redis
+# for QUERY_EMBEDDING_CACHE_TTL seconds.
+QUERY_EMBEDDING_CACHE_SIZE = env.int("QUERY_EMBEDDING_CACHE_SIZE", default=2000)
+QUERY_EMBEDDING_CACHE_TTL = env.int("QUERY_EMBEDDING_CACHE_TTL", default=24 * 3600)
+
+# Use a video's captions (manual, then automatic) as its transcript when it
+# has them, and only download audio for Whisper when it doesn't.
+SUBTITLES_FIRST = env.bool("SUBTITLES_FIRST", default=True)
+SUBTITLE_LANGUAGES = env.list("SUBTITLE_LANGUAGES", default=["en"])
+
+# Audio downloaded for transcription. "speech" takes the smallest adequate
+# stream and transcodes to mono 16 kHz 32 kbps MP3 - all Whisper needs.
+# "legacy" is the original bestaudio -> 192 kbps MP3. Any codec FFmpeg's
+# extractaudio supports works, but keep it to one the transcription API
+# accepts (mp3, m4a, ogg/vorbis, wav, flac). Compare profiles with
+# `python manage.py benchmark_audio_profiles <url> ...`.
+CLIP_AUDIO_PROFILE = env("CLIP_AUDIO_PROFILE", default="speech")
+CLIP_AUDIO_PROFILES = {
+    "legacy": {
+        "format": "bestaudio/best",
+        "codec": "mp3",
+        "bitrate": 192,
+        "sample_rate": None,
+        "channels": None,
+    },
+    "speech": {
+        "format": "worstaudio[abr>=32]/worstaudio/worst",
+        "codec": "mp3",
+        "bitrate": 32,
+        "sample_rate": 16000,
+        "channels": 1,
+    },
+}
+
+# Long audio is transcribed as overlapping ~TRANSCRIPTION_SEGMENT_SECONDS
+# segments (cut at silences), up to TRANSCRIPTION_MAX_WORKERS at a time.
+# Segments also stay under the provider's upload limit.
+TRANSCRIPTION_SEGMENT_SECONDS = env.int("TRANSCRIPTION_SEGMENT_SECONDS", default=300)
+TRANSCRIPTION_SEGMENT_OVERLAP = env.float("TRANSCRIPTION_SEGMENT_OVERLAP", default=2.0)
+TRANSCRIPTION_MAX_WORKERS = env.int("TRANSCRIPTION_MAX_WORKERS", default=4)
+TRANSCRIPTION_MAX_UPLOAD_BYTES = env.int("TRANSCRIPTION_MAX_UPLOAD_BYTES", default=24 * 1024 * 1024)
+
+# Voice-activity trim before transcription: silence and non-speech spans are
+# cut out of the audio; the result is only used if it saves at least
+# VAD_MIN_REMOVED_SECONDS and keeps at least VAD_MIN_KEPT_FRACTION of the audio
+# (less means no speech was found, e.g. music: the original is transcribed).
+# Measure with `python manage.py benchmark_vad <files>`.
+VAD_ENABLED = env.bool("VAD_ENABLED", default=True)
+VAD_MIN_REMOVED_SECONDS = env.float("VAD_MIN_REMOVED_SECONDS", default=3.0)
+VAD_MIN_KEPT_FRACTION = env.float("VAD_MIN_KEPT_FRACTION", default=0.1)
+
+# asyncio mode for the ai queue (api/aio.py): transcription, embedding and LLM
+# requests run as coroutines on one event loop per worker process with pooled
+# connections. Pair it with a threads pool so one process drives many clips:
+# AI_WORKER_POOL=threads AI_WORKER_CONCURRENCY=200 (see docker-compose.yml).
+# ASYNC_PROVIDER_CONCURRENCY caps in-flight requests per provider and process.
+ASYNC_IO_ENABLED = env.bool("ASYNC_IO_ENABLED", default=False)
+ASYNC_PROVIDER_CONCURRENCY = {
+    "openai": env.int("OPENAI_MAX_CONCURRENCY", default=64),
+    "openrouter": env.int("OPENROUTER_MAX_CONCURRENCY", default=32),
+}
+
+# Hedged LLM calls (api/llm.py): the next model in AI_MODELS is started when
+# no answer arrived within LLM_HEDGE_DELAY seconds, up to LLM_MAX_PARALLEL at
+# once. A model's circuit breaker opens after LLM_BREAKER_FAILURES consecutive
+# failures and lets a probe through again after LLM_BREAKER_COOLDOWN seconds.
+LLM_HEDGE_DELAY = env.float("LLM_HEDGE_DELAY", default=8.0)
+LLM_MAX_PARALLEL = env.int("LLM_MAX_PARALLEL", default=2)
+LLM_REQUEST_TIMEOUT = env.float("LLM_REQUEST_TIMEOUT", default=90.0)
+LLM_BREAKER_FAILURES = env.int("LLM_BREAKER_FAILURES", default=3)
+LLM_BREAKER_COOLDOWN = env.int("LLM_BREAKER_COOLDOWN", default=120)
+# Stream completions and stop as soon as the required JSON keys are complete.
+LLM_STREAMING = env.bool("LLM_STREAMING", default=True)
+
+# Transcripts longer than LLM_MAP_REDUCE_THRESHOLD_TOKENS (estimated) are
+# summarized map-reduce style: LLM_MAP_CHUNK_TOKENS parts summarized in
+# parallel (LLM_MAP_MAX_WORKERS at a time), then merged into the final JSON.
+LLM_MAP_REDUCE_THRESHOLD_TOKENS = env.int("LLM_MAP_REDUCE_THRESHOLD_TOKENS", default=6000)
+LLM_MAP_CHUNK_TOKENS = env.int("LLM_MAP_CHUNK_TOKENS", default=3000)
+LLM_MAP_MAX_WORKERS = env.int("LLM_MAP_MAX_WORKERS", default=4)
+
+# Cache of parsed summarize/categorize results (llm_result_cache + Redis).
+# Rows expire after LLM_CACHE_TTL seconds; beyond LLM_CACHE_MAX_ENTRIES the
+# least recently used are evicted by the periodic evict_llm_cache_task.
+# Hit/miss counters: `python manage.py llm_cache_stats`.
+LLM_CACHE_ENABLED = env.bool("LLM_CACHE_ENABLED", default=True)
+LLM_CACHE_TTL = env.int("LLM_CACHE_TTL", default=30 * 24 * 3600)
+LLM_CACHE_REDIS_TTL = env.int("LLM_CACHE_REDIS_TTL", default=24 * 3600)
+LLM_CACHE_MAX_ENTRIES = env.int("LLM_CACHE_MAX_ENTRIES", default=100_000)
+# Redis hits refresh the row's last_used_at (so eviction sees them) at most
+# once per this many seconds per entry
+LLM_CACHE_TOUCH_INTERVAL = env.int("LLM_CACHE_TOUCH_INTERVAL", default=15 * 60)
+
+# Scratch space for downloaded audio/thumbnails. Must be shared between the
+# download, images and ai workers.
+CLIP_WORK_DIR = env("CLIP_WORK_DIR", default=tempfile.gettempdir())
+VECTOR_NUMPY_INDEX_DIR = env("VECTOR_NUMPY_INDEX_DIR", default=os.path.join(CLIP_WORK_DIR, "vector_index"))
+
 # AI API KEYS
 OPENAI_API_KEY = env('OPENAI_API_KEY', default="dummy-openai-key")
 OPENROUTER_API_KEY = env('OPENROUTER_API_KEY', default="dummy-openrouter-key")